@@ -0,0 +1,863 @@
+"""
+Benchmark stages of the file generator.
+
+Usage: python file-gen-bench.py -b <benchmark> -r <repeat> -o <outfile> -c <comparefile>
+
+The benchmark loads functions from file-gen.py and measures them in the current process.
+Every case is run <repeat> times and the best run is reported. Peak memory of Python
+allocations is measured by one more run with tracemalloc.
+
+Benchmarks:
+string measures get_random_string() used for text fields
+text compares random text fields drawn by get_random_string() and cut from text slab by get_random_text()
+invoice measures get_invoice() with json.dumps() for several line counts, and with customers drawn from pool
+content measures get_content() for several document counts, one large invoice built or streamed,
+and documents replayed from corpus, also with MD5 and CRC-32 computed while they are produced
+filename measures get_file_name()
+serializer compares json.dumps() of get_invoice() with get_invoice_json(), after checking both produce the same documents
+schema compares get_invoice_json() with invoice compiled from schemas/invoice.json, after checking both produce the same documents
+endtoend runs main() of the generator with local fake of ObjectStorageClient, the workers cases
+with files in order of dates and biggest first, the retry case with fake rejecting part of
+requests with throttling and transient errors, the partsize case with multipart uploads, and the
+verify case listing objects written with MD5; cases run after checking that full upload queue
+blocks the generator and failed upload is raised with the object name, that the limit of
+concurrent requests grows and is halved once per throttled requests in flight, that only
+connection errors and timeouts are retried without status, with fake rejecting
+every request that requests are retried, retries are counted, concurrency is reduced and the
+status is reported, and that failed multipart upload is aborted
+
+Results are printed as JSON documents, one per case. With <outfile>, results are appended
+to JSON Lines file together with the git commit. With <comparefile>, results are compared
+with the last results of the same cases saved in the file.
+"""
+
+import string
+import time
+import datetime
+import json
+import sys
+import logging
+import getopt
+import importlib.util
+import os
+import random
+import tracemalloc
+import subprocess
+import contextlib
+import io
+import threading
+import tempfile
+import types
+
+
+# ----------------------------------------------------
+# SETUP FUNCTIONS
+# ----------------------------------------------------
+
+# ----------------------------------------------------
+# Load generator
+# ----------------------------------------------------
+def load_generator():
+
+    v_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'file-gen.py')
+    v_spec = importlib.util.spec_from_file_location('file_gen', v_path)
+    v_module = importlib.util.module_from_spec(v_spec)
+    sys.modules['file_gen'] = v_module
+    v_spec.loader.exec_module(v_module)
+
+    return v_module
+
+
+# ----------------------------------------------------
+# Get input parameters
+# ----------------------------------------------------
+def get_input_parameters(p_argv):
+
+   v_usage = '{} -b <benchmark> -r <repeat> -o <outfile> -c <comparefile>'.format(p_argv[0])
+
+   v_params = {
+      'benchmark':   'all',
+      'repeat':      3,
+      'outfile':     None,
+      'comparefile': None
+   }
+
+   v_benchmarks = ('string', 'text', 'invoice', 'content', 'filename', 'serializer', 'schema', 'endtoend', 'all')
+
+   v_help = '''
+   Options:
+   -h, --help             Print help
+   -b, --benchmark        Benchmark to run ({0}) [{1}]
+   -r, --repeat           Number of repetitions, the best one is reported [{2}]
+   -o, --outfile          Append results to JSON Lines file
+   -c, --comparefile      Compare results with the last results saved in JSON Lines file
+   '''.format(', '.join(v_benchmarks), v_params['benchmark'], v_params['repeat'])
+
+   try:
+      (v_opts, v_args) = getopt.getopt(p_argv[1:],"hb:r:o:c:",['help','benchmark=','repeat=','outfile=','comparefile='])
+   except getopt.GetoptError:
+      print (v_usage)
+      sys.exit(2)
+   for v_opt, v_arg in v_opts:
+      if v_opt in ('-h', '--help'):
+         print (v_usage)
+         print (v_help)
+         sys.exit()
+      elif v_opt in ('-b', '--benchmark'):
+         v_params['benchmark'] = v_arg
+      elif v_opt in ('-r', '--repeat'):
+         v_params['repeat'] = int(v_arg)
+      elif v_opt in ('-o', '--outfile'):
+         v_params['outfile'] = v_arg
+      elif v_opt in ('-c', '--comparefile'):
+         v_params['comparefile'] = v_arg
+
+   if v_params['benchmark'] not in v_benchmarks:
+      print ('Parameter "benchmark" must have one of values {}'.format(', '.join(v_benchmarks)))
+      print (v_usage)
+      sys.exit(2)
+   elif v_params['repeat'] < 1:
+      print ('Parameter "repeat" must be at least 1')
+      print (v_usage)
+      sys.exit(2)
+
+   return v_params
+
+
+# ----------------------------------------------------
+# Get generator parameters
+# ----------------------------------------------------
+def get_generator_parameters(p_generator, p_options=[]):
+
+    # parameters of file-gen.py with defaults, as if passed on command line
+    v_argv = ['file-gen.py', '-s', 'json', '-f', '20240901', '-t', '20240901', '-p', 'date=${date}/invoice-${timestamp}-${uuid}.json', '--sink', 'null']
+    return p_generator.get_input_parameters(v_argv + p_options)
+
+
+# ----------------------------------------------------
+# Fake object storage client
+# ----------------------------------------------------
+class FakeObjectStorageClient:
+
+    # local replacement of oci.object_storage.ObjectStorageClient, keeps sizes of objects
+    # and MD5 sent with them, and rejects p_error_rate of requests to write objects
+    # with status 429 or 503; with gate, requests wait until the gate is set
+    def __init__(self, p_error_rate=0.0):
+        self.objects = {}
+        self.md5 = {}
+        self.uploads = {}
+        self.aborted_count = 0
+        self.error_rate = p_error_rate
+        self.random = random.Random(0)
+        self.lock = threading.Lock()
+        self.gate = None
+
+    def reject(self):
+        if self.gate != None:
+            self.gate.wait()
+        with self.lock:
+            v_value = self.random.random()
+        if v_value < self.error_rate:
+            raise FakeServiceError(429 if v_value < self.error_rate / 2 else 503)
+
+    def put_object(self, namespace_name, bucket_name, object_name, put_object_body, content_md5=None, **kwargs):
+        self.reject()
+        with self.lock:
+            self.objects[object_name] = len(put_object_body)
+            self.md5[object_name] = content_md5
+        return None
+
+    def create_multipart_upload(self, namespace_name, bucket_name, create_multipart_upload_details, **kwargs):
+        self.reject()
+        with self.lock:
+            v_upload_id = 'upload-{}'.format(len(self.uploads) + self.aborted_count + 1)
+            self.uploads[v_upload_id] = {}
+        return types.SimpleNamespace(data=types.SimpleNamespace(upload_id=v_upload_id), headers={})
+
+    def upload_part(self, namespace_name, bucket_name, object_name, upload_id, upload_part_num, upload_part_body, **kwargs):
+        self.reject()
+        with self.lock:
+            self.uploads[upload_id][upload_part_num] = len(upload_part_body)
+        return types.SimpleNamespace(data=None, headers={'etag': '{}-{}'.format(upload_id, upload_part_num)})
+
+    def commit_multipart_upload(self, namespace_name, bucket_name, object_name, upload_id, commit_multipart_upload_details, **kwargs):
+        self.reject()
+        with self.lock:
+            v_parts = self.uploads.pop(upload_id)
+            if sorted(v_part.part_num for v_part in commit_multipart_upload_details.parts_to_commit) != sorted(v_parts):
+                raise FakeServiceError(400)
+            # MD5 of multipart object is MD5 of its parts with number of parts
+            self.objects[object_name] = sum(v_parts.values())
+            self.md5[object_name] = 'multipart-{}'.format(len(v_parts))
+        return types.SimpleNamespace(data=None, headers={})
+
+    def abort_multipart_upload(self, namespace_name, bucket_name, object_name, upload_id, **kwargs):
+        with self.lock:
+            self.uploads.pop(upload_id)
+            self.aborted_count = self.aborted_count + 1
+        return None
+
+    def list_objects(self, namespace_name, bucket_name, prefix=None, start=None, limit=1000, fields=None, **kwargs):
+        if (namespace_name, bucket_name) != ('namespace', 'bucket'):
+            raise FakeServiceError(404)
+        with self.lock:
+            v_names = sorted([v_name for v_name in self.objects if v_name.startswith(prefix or '') and (start == None or v_name >= start)])
+        v_objects = [types.SimpleNamespace(name=v_name, size=self.objects[v_name], md5=self.md5[v_name]) for v_name in v_names[0:limit]]
+        return types.SimpleNamespace(data=types.SimpleNamespace(objects=v_objects, next_start_with=v_names[limit] if len(v_names) > limit else None), headers={})
+
+
+# ----------------------------------------------------
+# Fake service error
+# ----------------------------------------------------
+class FakeServiceError(Exception):
+
+    # local replacement of oci.exceptions.ServiceError, the generator retries by status
+    def __init__(self, p_status):
+        super().__init__('Request failed with status {}'.format(p_status))
+        self.status = p_status
+        self.code = 'TooManyRequests' if p_status == 429 else 'ServiceUnavailable'
+        self.message = str(self)
+
+
+# ----------------------------------------------------
+# MEASUREMENT FUNCTIONS
+# ----------------------------------------------------
+
+# ----------------------------------------------------
+# Measure function
+# ----------------------------------------------------
+def measure(p_benchmark, p_case, p_function, p_repeat):
+
+    # best of p_repeat runs, the function returns dictionary with counts of
+    # generated items, lines, documents and bytes
+    v_best_sec = None
+    for v_run in range(p_repeat):
+        v_start = time.perf_counter()
+        v_counts = p_function()
+        v_elapsed_sec = time.perf_counter() - v_start
+        if v_best_sec == None or v_elapsed_sec < v_best_sec:
+            v_best_sec = v_elapsed_sec
+
+    # tracemalloc slows down allocations, so peak memory is measured by separate run
+    tracemalloc.start()
+    try:
+        p_function()
+        v_peak_bytes = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    v_result = {
+        "benchmark": p_benchmark,
+        "case": p_case,
+        "elapsed_sec": round(v_best_sec,6)
+    }
+    for (v_count, v_rate) in (('items', 'items_per_sec'), ('lines', 'lines_per_sec'), ('documents', 'docs_per_sec')):
+        if v_count in v_counts:
+            v_result[v_count] = v_counts[v_count]
+            v_result[v_rate] = round(v_counts[v_count]/v_best_sec,2)
+    v_result['size_bytes'] = v_counts['size_bytes']
+    v_result['mb_per_sec'] = round(v_counts['size_bytes']/v_best_sec/1000000,2)
+    v_result['peak_memory_mb'] = round(v_peak_bytes/1000000,2)
+
+    return v_result
+
+
+# ----------------------------------------------------
+# Get git commit
+# ----------------------------------------------------
+def get_git_commit():
+
+    try:
+        v_directory = os.path.dirname(os.path.abspath(__file__))
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=v_directory, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# ----------------------------------------------------
+# Save results
+# ----------------------------------------------------
+def save_results(p_results, p_outfile):
+
+    v_commit = get_git_commit()
+    v_timestamp = datetime.datetime.now().strftime('%Y/%0m/%0d %H:%M:%S')
+
+    with open(p_outfile, 'a') as v_file:
+        for v_result in p_results:
+            v_record = dict(v_result, commit=v_commit, timestamp=v_timestamp)
+            v_file.write(json.dumps(v_record) + '\n')
+
+
+# ----------------------------------------------------
+# Compare results
+# ----------------------------------------------------
+def compare_results(p_results, p_comparefile):
+
+    # baseline is the last saved result of every case
+    v_baseline = {}
+    with open(p_comparefile) as v_file:
+        for v_line in v_file:
+            if v_line.strip() != '':
+                v_record = json.loads(v_line)
+                v_baseline[(v_record['benchmark'], v_record['case'])] = v_record
+
+    v_comparisons = []
+    for v_result in p_results:
+        v_previous = v_baseline.get((v_result['benchmark'], v_result['case']))
+        if v_previous == None:
+            continue
+        v_comparison = {
+            "benchmark": v_result['benchmark'],
+            "case": v_result['case'],
+            "baseline_commit": v_previous.get('commit'),
+            "mb_per_sec": v_result['mb_per_sec'],
+            "baseline_mb_per_sec": v_previous['mb_per_sec'],
+            "speedup": round(v_previous['elapsed_sec']/v_result['elapsed_sec'],3),
+            "peak_memory_mb": v_result['peak_memory_mb'],
+            "baseline_peak_memory_mb": v_previous['peak_memory_mb']
+        }
+        v_comparisons.append(v_comparison)
+
+    return v_comparisons
+
+
+# ----------------------------------------------------
+# BENCHMARKS
+# ----------------------------------------------------
+
+# ----------------------------------------------------
+# Benchmark random strings
+# ----------------------------------------------------
+def benchmark_string(p_generator, p_params):
+
+    v_field_count = 100000
+
+    def generate():
+        v_size = 0
+        for v_field in range(v_field_count):
+            v_size = v_size + len(p_generator.get_random_string(string.ascii_lowercase+' ',20,200))
+        return {"items": v_field_count, "size_bytes": v_size}
+
+    return [measure('string', 'lowercase', generate, p_params['repeat'])]
+
+
+# ----------------------------------------------------
+# Benchmark text fields
+# ----------------------------------------------------
+def benchmark_text(p_generator, p_params):
+
+    v_field_count = 100000
+    v_results = []
+
+    for v_source in ('random', 'slab'):
+
+        p_generator.initialize_text_source({'textsource': v_source, 'slabsize': 4, 'slabreuse': 4})
+        p_generator.get_random_text(string.ascii_lowercase+' ',20,200)
+
+        def generate():
+            v_size = 0
+            for v_field in range(v_field_count):
+                v_size = v_size + len(p_generator.get_random_text(string.ascii_lowercase+' ',20,200).strip().capitalize())
+            return {"items": v_field_count, "size_bytes": v_size}
+
+        v_results.append(measure('text', v_source, generate, p_params['repeat']))
+
+    p_generator.initialize_text_source({'textsource': 'random', 'slabsize': 4, 'slabreuse': 4})
+
+    return v_results
+
+
+# ----------------------------------------------------
+# Benchmark invoices
+# ----------------------------------------------------
+def benchmark_invoice(p_generator, p_params):
+
+    v_results = []
+
+    for v_line_count in (10, 100, 1000, 5000):
+
+        def generate():
+            (v_invoice, v_lines) = p_generator.get_invoice(datetime.date(2024,9,1), v_line_count, v_line_count)
+            return {"documents": 1, "lines": v_lines, "size_bytes": len(json.dumps(v_invoice))}
+
+        v_results.append(measure('invoice', 'lines={}'.format(v_line_count), generate, p_params['repeat']))
+
+    # invoices with few lines drawing customers from skewed pool
+    p_generator.initialize_reference_data({'products': 2000, 'customers': 10000, 'customerskew': 1.0, 'seed': None})
+
+    def generate():
+        (v_invoice, v_lines) = p_generator.get_invoice(datetime.date(2024,9,1), 10, 10)
+        return {"documents": 1, "lines": v_lines, "size_bytes": len(json.dumps(v_invoice))}
+
+    v_results.append(measure('invoice', 'lines=10 customers=10000', generate, p_params['repeat']))
+
+    p_generator.initialize_reference_data({'products': 2000, 'customers': 0, 'customerskew': 0.0, 'seed': None})
+
+    return v_results
+
+
+# ----------------------------------------------------
+# Benchmark content
+# ----------------------------------------------------
+def benchmark_content(p_generator, p_params):
+
+    v_results = []
+
+    for v_document_count in (1, 10, 100):
+
+        v_generator_params = get_generator_parameters(p_generator, ['-k', str(v_document_count), '-l', str(v_document_count), '-v', '100', '-w', '500'])
+
+        def generate():
+            (v_content, v_counters) = p_generator.get_content(v_generator_params, datetime.date(2024,9,1))
+            return {"documents": v_counters['document_count'], "lines": v_counters['line_count'], "size_bytes": v_counters['size_bytes']}
+
+        v_results.append(measure('content', 'documents={}'.format(v_document_count), generate, p_params['repeat']))
+
+    # one large invoice written in parts, built in memory or streamed
+    for v_stream_lines in (0, 1000):
+
+        v_generator_params = get_generator_parameters(p_generator, ['-v', '20000', '-w', '20000', '--partsize', '8', '--streamlines', str(v_stream_lines)])
+
+        def generate():
+            v_counters = p_generator.get_content_counters()
+            for v_part in p_generator.get_content_parts(v_generator_params, datetime.date(2024,9,1), v_counters):
+                pass
+            return {"documents": v_counters['document_count'], "lines": v_counters['line_count'], "size_bytes": v_counters['size_bytes']}
+
+        v_results.append(measure('content', 'lines=20000 streamlines={}'.format(v_stream_lines), generate, p_params['repeat']))
+
+    # documents replayed from corpus of 100 invoices, built outside of the measurement,
+    # and hashed while they are produced
+    with tempfile.TemporaryDirectory() as v_directory:
+
+        v_corpus_options = ['-k', '100', '-l', '100', '-v', '100', '-w', '500', '--corpus', os.path.join(v_directory, 'invoices.corpus'), '--corpusdocs', '100']
+        p_generator.build_corpus(get_generator_parameters(p_generator, v_corpus_options))
+
+        for (v_case, v_options) in (('documents=100 corpus', []), ('documents=100 corpus md5', ['--md5']), ('documents=100 corpus crc32', ['--hash', 'crc32'])):
+
+            v_generator_params = get_generator_parameters(p_generator, v_corpus_options + v_options)
+
+            def generate():
+                (v_content, v_counters) = p_generator.get_content(v_generator_params, datetime.date(2024,9,1))
+                return {"documents": v_counters['document_count'], "lines": v_counters['line_count'], "size_bytes": v_counters['size_bytes']}
+
+            v_results.append(measure('content', v_case, generate, p_params['repeat']))
+
+    return v_results
+
+
+# ----------------------------------------------------
+# Benchmark file names
+# ----------------------------------------------------
+def benchmark_filename(p_generator, p_params):
+
+    v_name_count = 100000
+    v_generator_params = get_generator_parameters(p_generator)
+
+    def generate():
+        v_size = 0
+        for v_number in range(1,v_name_count+1):
+            v_size = v_size + len(p_generator.get_file_name(v_generator_params, datetime.date(2024,9,1), v_name_count, v_number))
+        return {"items": v_name_count, "size_bytes": v_size}
+
+    return [measure('filename', 'pattern', generate, p_params['repeat'])]
+
+
+# ----------------------------------------------------
+# Check serializer
+# ----------------------------------------------------
+def check_serializer(p_generator, p_engine):
+
+    # both serializers must produce the same document from the same random state;
+    # document_id comes from uuid4() which does not use the random state
+    for v_seed in range(10):
+        random.seed(v_seed)
+        (v_invoice, v_line_count) = p_generator.get_invoice(datetime.date(2024,9,1), 0, 50, p_engine)
+        random.seed(v_seed)
+        (v_invoice_json, v_line_count) = p_generator.get_invoice_json(datetime.date(2024,9,1), 0, 50, p_engine)
+
+        v_expected = json.loads(json.dumps(v_invoice))
+        v_actual = json.loads(v_invoice_json)
+        v_expected['detail'].pop('document_id')
+        v_actual['detail'].pop('document_id')
+        if v_expected != v_actual:
+            raise AssertionError('Serializer "template" differs from "dict" for seed {}'.format(v_seed))
+
+
+# ----------------------------------------------------
+# Benchmark serializers
+# ----------------------------------------------------
+def benchmark_serializer(p_generator, p_params):
+
+    v_line_count = 2000
+    v_results = []
+    p_generator.initialize_text_source({'textsource': 'random', 'slabsize': 4, 'slabreuse': 4})
+
+    # the numpy engine draws from its own generator, so the check runs for the python engine
+    check_serializer(p_generator, 'python')
+
+    # the numpy engine is measured only if numpy is installed
+    v_engines = ['python']
+    if importlib.util.find_spec('numpy') != None:
+        v_engines.append('numpy')
+
+    for (v_engine, v_serializer) in [(v_engine, v_serializer) for v_engine in v_engines for v_serializer in ('dict', 'template')]:
+
+        if v_serializer == 'template':
+            def generate():
+                return {"documents": 1, "lines": v_line_count, "size_bytes": len(p_generator.get_invoice_json(datetime.date(2024,9,1), v_line_count, v_line_count, v_engine)[0])}
+        else:
+            def generate():
+                return {"documents": 1, "lines": v_line_count, "size_bytes": len(json.dumps(p_generator.get_invoice(datetime.date(2024,9,1), v_line_count, v_line_count, v_engine)[0]))}
+
+        v_results.append(measure('serializer', v_engine + '/' + v_serializer, generate, p_params['repeat']))
+
+    return v_results
+
+
+# ----------------------------------------------------
+# Check schema
+# ----------------------------------------------------
+def check_schema(p_generator, p_schema):
+
+    # compiled invoice schema must produce the same bytes from the same random
+    # state, including document_id, which is drawn from the random state in seeded run
+    p_generator.initialize_seed({'seed': 'check'})
+    try:
+        for v_seed in range(10):
+            random.seed(v_seed)
+            (v_invoice_json, v_line_count) = p_generator.get_invoice_json(datetime.date(2024,9,1), 0, 50)
+            random.seed(v_seed)
+            (v_values, v_schema_line_count) = p_schema['generate'](datetime.date(2024,9,1), {'minlines': 0, 'maxlines': 50})
+            if p_schema['serialize'](v_values) != v_invoice_json or v_schema_line_count != v_line_count:
+                raise AssertionError('Schema "invoice" differs from get_invoice_json() for seed {}'.format(v_seed))
+    finally:
+        p_generator.initialize_seed({'seed': None})
+
+
+# ----------------------------------------------------
+# Benchmark schema
+# ----------------------------------------------------
+def benchmark_schema(p_generator, p_params):
+
+    v_line_count = 2000
+    v_results = []
+    p_generator.initialize_text_source({'textsource': 'random', 'slabsize': 4, 'slabreuse': 4})
+
+    v_schema = p_generator.get_compiled_schema(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'schemas', 'invoice.json'))
+    check_schema(p_generator, v_schema)
+
+    for v_case in ('template', 'schema'):
+
+        if v_case == 'template':
+            def generate():
+                return {"documents": 1, "lines": v_line_count, "size_bytes": len(p_generator.get_invoice_json(datetime.date(2024,9,1), v_line_count, v_line_count)[0])}
+        else:
+            def generate():
+                (v_values, v_count) = v_schema['generate'](datetime.date(2024,9,1), {'minlines': v_line_count, 'maxlines': v_line_count})
+                return {"documents": 1, "lines": v_count, "size_bytes": len(v_schema['serialize'](v_values))}
+
+        v_results.append(measure('schema', v_case, generate, p_params['repeat']))
+
+    return v_results
+
+
+# ----------------------------------------------------
+# Check upload pipeline
+# ----------------------------------------------------
+def check_upload_pipeline(p_generator):
+
+    # upload threads write to the oci sink with client replaced by local fake
+    v_client = FakeObjectStorageClient()
+    v_get_object_storage_client = p_generator.get_object_storage_client
+    p_generator.get_object_storage_client = lambda: v_client
+
+    v_params = get_generator_parameters(p_generator, ['--sink', 'oci', '-n', 'namespace', '-b', 'bucket', '--uploaders', '1', '--queuesize', '2', '--retries', '0', '--loglevel', 'CRITICAL'])
+    v_control = p_generator.get_upload_control(v_params)
+
+    def start_pipeline():
+        v_sink = p_generator.open_sink(v_params, v_control)
+        return p_generator.start_upload_pipeline(v_params, v_sink, p_generator.get_metrics(v_params, v_control), p_generator.get_rate_control(v_params), None, None)
+
+    try:
+        # full queue blocks the generator: one file is uploaded, two wait in
+        # the queue and the fourth is submitted only after uploads continue
+        v_client.gate = threading.Event()
+        v_pipeline = start_pipeline()
+        v_submitted = []
+
+        def submit():
+            for v_number in range(1,5):
+                p_generator.submit_upload(v_pipeline, 'invoice-{}.json'.format(v_number), b'{}', 1, {"md5": None})
+                v_submitted.append(v_number)
+
+        v_thread = threading.Thread(target=submit, daemon=True)
+        v_thread.start()
+        time.sleep(0.5)
+        if len(v_submitted) != 3:
+            raise AssertionError('Upload pipeline with queuesize 2 accepted {} files while upload was blocked'.format(len(v_submitted)))
+        v_client.gate.set()
+        v_thread.join()
+        p_generator.stop_upload_pipeline(v_pipeline)
+        if len(v_client.objects) != 4:
+            raise AssertionError('Upload pipeline wrote {} of 4 files'.format(len(v_client.objects)))
+
+        # failed upload is raised with the name of the object
+        v_client.gate = None
+        v_client.error_rate = 1.0
+        v_pipeline = start_pipeline()
+        p_generator.submit_upload(v_pipeline, 'failing-invoice.json', b'{}', 1, {"md5": None})
+        try:
+            p_generator.stop_upload_pipeline(v_pipeline)
+            v_error = None
+        except p_generator.UploadError as e:
+            v_error = e
+        if v_error == None or v_error.object_name != 'failing-invoice.json' or 'failing-invoice.json' not in str(v_error):
+            raise AssertionError('Failed upload was not raised as UploadError with the object name, raised {!r}'.format(v_error))
+    finally:
+        p_generator.get_object_storage_client = v_get_object_storage_client
+
+
+# ----------------------------------------------------
+# Check upload control
+# ----------------------------------------------------
+def check_upload_control(p_generator):
+
+    # limit of 8 threads starts at 4 and grows to 8 with successful requests;
+    # throttling of requests in flight halves it once, and throttling of a
+    # request sent after the decrease halves it again
+    v_control = p_generator.get_upload_control({"partsize": 0, "uploaders": 8, "retries": 0, "retrydelay": 0.0})
+    if v_control['limit'] != 4:
+        raise AssertionError('Limit of concurrent requests did not start at half of threads, limit {}'.format(v_control['limit']))
+
+    for v_request in range(100):
+        p_generator.release_upload_slot(v_control, p_generator.acquire_upload_slot(v_control), False)
+    if v_control['limit'] != 8:
+        raise AssertionError('Limit of concurrent requests did not grow with successful requests, limit {}'.format(v_control['limit']))
+
+    v_requests = [p_generator.acquire_upload_slot(v_control) for v_request in range(8)]
+    for v_request in v_requests:
+        p_generator.release_upload_slot(v_control, v_request, True)
+    if v_control['limit'] != 4:
+        raise AssertionError('Throttling of requests in flight did not halve the limit once, limit {}'.format(v_control['limit']))
+
+    p_generator.release_upload_slot(v_control, p_generator.acquire_upload_slot(v_control), True)
+    if v_control['limit'] != 2 or p_generator.get_upload_statistics(v_control)['min_concurrency'] != 2:
+        raise AssertionError('Throttling after decrease did not halve the limit again, limit {}'.format(v_control['limit']))
+
+    # only connection errors and timeouts are retried without status
+    for (v_error, v_status) in ((ConnectionResetError(), 'transient'), (TimeoutError(), 'transient'), (PermissionError(), None), (OSError(28, 'No space left on device'), None), (FakeServiceError(429), 'throttling')):
+        if p_generator.get_error_status(v_error) != v_status:
+            raise AssertionError('Error {!r} classified as {}, expected {}'.format(v_error, p_generator.get_error_status(v_error), v_status))
+
+
+# ----------------------------------------------------
+# Check retries
+# ----------------------------------------------------
+def check_retries(p_generator):
+
+    # fake rejecting every request with status 429 or 503: every object is
+    # requested retries+1 times, throttling halves the limit of concurrent
+    # requests, and the status is reported once the retries are exhausted
+    v_client = FakeObjectStorageClient(1.0)
+    v_controls = []
+    v_get_object_storage_client = p_generator.get_object_storage_client
+    v_get_upload_control = p_generator.get_upload_control
+
+    def get_upload_control(p_params):
+        v_controls.append(v_get_upload_control(p_params))
+        return v_controls[-1]
+
+    p_generator.get_object_storage_client = lambda: v_client
+    p_generator.get_upload_control = get_upload_control
+
+    v_argv = [
+        'file-gen.py', '-s', 'json', '-f', '20240901', '-t', '20240901', '-x', '4', '-y', '4', '-v', '10', '-w', '10',
+        '-n', 'namespace', '-b', 'bucket', '-p', 'invoice-${number}.json', '--retries', '3', '--retrydelay', '0.001', '--loglevel', 'CRITICAL'
+    ]
+
+    try:
+        for (v_uploaders, v_max_concurrency) in ((0, 1), (4, 4)):
+
+            v_controls.clear()
+            v_error = None
+            try:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    p_generator.main(v_argv + ['--uploaders', str(v_uploaders)])
+            except Exception as e:
+                v_error = e
+
+            # upload thread wraps the error of the request with the object name
+            v_cause = v_error.cause if isinstance(v_error, p_generator.UploadError) else v_error
+            if getattr(v_cause, 'status', None) not in (429, 503) or str(v_cause.status) not in str(v_error):
+                raise AssertionError('Run with uploaders={} did not report status of rejected request, raised {!r}'.format(v_uploaders, v_error))
+
+            # other upload threads finish retries of their objects after the run
+            # failed and then drop remaining files, so counters are read once they settle
+            v_statistics = None
+            while v_statistics != p_generator.get_upload_statistics(v_controls[0]):
+                v_statistics = p_generator.get_upload_statistics(v_controls[0])
+                time.sleep(0.1)
+            if v_statistics['request_count'] == 0 or v_statistics['request_count'] % 4 != 0 or v_statistics['retry_count'] != v_statistics['request_count'] // 4 * 3:
+                raise AssertionError('Run with uploaders={} did not retry every request 3 times, uploads {}'.format(v_uploaders, v_statistics))
+            if v_max_concurrency > 1 and not (v_statistics['min_concurrency'] < v_max_concurrency and v_statistics['concurrency'] == v_statistics['min_concurrency']):
+                raise AssertionError('Run with uploaders={} did not reduce concurrency on throttling, uploads {}'.format(v_uploaders, v_statistics))
+    finally:
+        p_generator.get_object_storage_client = v_get_object_storage_client
+        p_generator.get_upload_control = v_get_upload_control
+
+
+# ----------------------------------------------------
+# Check multipart abort
+# ----------------------------------------------------
+def check_multipart_abort(p_generator):
+
+    # fake rejecting every part: failed multipart upload is aborted, so no
+    # upload is left open and no object is written
+    v_client = FakeObjectStorageClient()
+    v_get_object_storage_client = p_generator.get_object_storage_client
+    p_generator.get_object_storage_client = lambda: v_client
+
+    def upload_part(**p_arguments):
+        raise FakeServiceError(503)
+
+    v_client.upload_part = upload_part
+
+    v_argv = [
+        'file-gen.py', '-s', 'json', '-f', '20240901', '-t', '20240901', '-k', '2', '-l', '2', '-v', '3000', '-w', '3000',
+        '-n', 'namespace', '-b', 'bucket', '-p', 'invoice-${number}.json', '--partsize', '1', '--retries', '0', '--loglevel', 'CRITICAL'
+    ]
+
+    try:
+        v_error = None
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                p_generator.main(v_argv)
+        except Exception as e:
+            v_error = e
+
+        if getattr(v_error, 'status', None) != 503 or v_client.aborted_count != 1 or len(v_client.uploads) > 0 or len(v_client.objects) > 0:
+            raise AssertionError('Failed multipart upload was not aborted, raised {!r}, aborted {}, open uploads {}'.format(v_error, v_client.aborted_count, len(v_client.uploads)))
+    finally:
+        p_generator.get_object_storage_client = v_get_object_storage_client
+
+
+# ----------------------------------------------------
+# Benchmark end to end
+# ----------------------------------------------------
+def benchmark_endtoend(p_generator, p_params):
+
+    check_upload_pipeline(p_generator)
+    check_upload_control(p_generator)
+    check_retries(p_generator)
+    check_multipart_abort(p_generator)
+
+    # main() writes to the oci sink, with client replaced by local fake
+    v_client = FakeObjectStorageClient()
+    v_get_object_storage_client = p_generator.get_object_storage_client
+    p_generator.get_object_storage_client = lambda: v_client
+    v_results = []
+
+    v_argv = [
+        'file-gen.py', '-s', 'json', '-f', '20240901', '-t', '20240903', '-x', '4', '-y', '4', '-k', '2', '-l', '2', '-v', '500', '-w', '1500',
+        '-n', 'namespace', '-b', 'bucket', '-p', 'date=${date}/invoice-${timestamp}-${uuid}.json', '--loglevel', 'WARNING'
+    ]
+
+    try:
+        for (v_case, v_options, v_error_rate) in (
+            ('serial', [], 0.0),
+            ('uploaders=2', ['--uploaders', '2'], 0.0),
+            ('gzip', ['--compress', 'gzip'], 0.0),
+            ('workers=2', ['--workers', '2'], 0.0),
+            ('workers=2 schedule=size', ['--workers', '2', '--schedule', 'size'], 0.0),
+            ('partsize=1', ['--partsize', '1'], 0.0),
+            ('retry', ['--uploaders', '2', '--retrydelay', '0.001'], 0.2)
+        ):
+
+            v_client.error_rate = v_error_rate
+
+            def generate():
+                # same sequence of rejected requests in every run, regardless of earlier cases
+                v_client.objects = {}
+                v_client.random.seed(1)
+                v_output = io.StringIO()
+                with contextlib.redirect_stdout(v_output):
+                    p_generator.main(v_argv + v_options)
+                v_statistics = json.loads(v_output.getvalue().strip().splitlines()[-1])
+                # rejected requests are retried until every object is written
+                if v_error_rate > 0 and (v_statistics['uploads']['retry_count'] == 0 or v_statistics['file_count'] != len(v_client.objects)):
+                    raise AssertionError('Case {} did not retry rejected requests, uploads {}'.format(v_case, v_statistics['uploads']))
+                return {"items": v_statistics['file_count'], "documents": v_statistics['document_count'], "lines": v_statistics['line_count'], "size_bytes": v_statistics['size_bytes']}
+
+            v_results.append(measure('endtoend', v_case, generate, p_params['repeat']))
+
+        # objects written by single and multipart uploads are verified by listing the fake
+        v_client.error_rate = 0.0
+        v_client.objects = {}
+        with tempfile.TemporaryDirectory() as v_directory:
+
+            v_manifest = os.path.join(v_directory, 'manifest.json')
+            with contextlib.redirect_stdout(io.StringIO()):
+                p_generator.main(v_argv + ['--partsize', '1', '--md5', '--manifest', v_manifest])
+
+            def verify():
+                v_output = io.StringIO()
+                with contextlib.redirect_stdout(v_output):
+                    p_generator.verify_manifests([v_manifest])
+                v_statistics = json.loads(v_output.getvalue().strip().splitlines()[-1])
+                if v_statistics['verified_count'] != len(v_client.objects) or v_statistics['checksum_count'] == 0:
+                    raise AssertionError('Verify did not verify all objects, {}'.format(v_statistics))
+                return {"items": v_statistics['object_count'], "size_bytes": sum(v_client.objects.values())}
+
+            v_results.append(measure('endtoend', 'verify', verify, p_params['repeat']))
+    finally:
+        p_generator.get_object_storage_client = v_get_object_storage_client
+
+    return v_results
+
+
+# ----------------------------------------------------
+# MAIN FUNCTION
+# ----------------------------------------------------
+def main(p_argv):
+
+    v_params = get_input_parameters(p_argv)
+    v_generator = load_generator()
+    v_generator.initialize_logging(p_argv[0], 'WARNING')
+
+    v_benchmarks = (
+        ('string', benchmark_string),
+        ('text', benchmark_text),
+        ('invoice', benchmark_invoice),
+        ('content', benchmark_content),
+        ('filename', benchmark_filename),
+        ('serializer', benchmark_serializer),
+        ('schema', benchmark_schema),
+        ('endtoend', benchmark_endtoend)
+    )
+
+    v_results = []
+    for (v_benchmark, v_function) in v_benchmarks:
+        if v_params['benchmark'] in (v_benchmark, 'all'):
+            for v_result in v_function(v_generator, v_params):
+                print(json.dumps(v_result))
+                v_results.append(v_result)
+
+    if v_params['comparefile'] != None:
+        for v_comparison in compare_results(v_results, v_params['comparefile']):
+            print(json.dumps(v_comparison))
+
+    if v_params['outfile'] != None:
+        save_results(v_results, v_params['outfile'])
+
+
+# ----------------------------------------------------
+# Call the main function
+# ----------------------------------------------------
+if __name__ == '__main__':
+    main(sys.argv)
+
+
+# ----------------------------------------------------
+# ----------------------------------------------------
+# ----------------------------------------------------
@@ -1,12 +1,18 @@
 """
-Generate sample invoices as JSON documents and store them in OCI Object Storage bucket.
+Generate sample invoices as JSON Lines, Parquet or change record files and store them in
+OCI Object Storage bucket, in local directory, or discard them.
 
-Usage: python file-gen.py -s <scenario> -f <fromdate> -t <todate> -x <minfiles> -y <maxfiles> -k <mindocs> -l <maxdocs> -e <sleep> -n <namespace> -b <bucket> -p <pattern>
+Usage: python file-gen.py -s <scenario> -f <fromdate> -t <todate> -x <minfiles> -y <maxfiles> -k <mindocs> -l <maxdocs> -e <sleep> -n <namespace> -b <bucket> -p <pattern> [options]
+       python file-gen.py merge <manifest> ...
+       python file-gen.py verify <manifest>
+       python file-gen.py lookup <docindex> <document id>
 
 The generator will loop over dates, starting from <fromdate> and finishing with <todate>.
 For every date, it will generate multiple files. Number of files is random, between <minfiles> and <maxfiles>.
-Every file will have multiple JSON documents (records) separated by newline. Number of documents is random, between <mindocs> and <maxdocs>.
-Size of a single JSON document is primarily determined by number of lines, randomly generated between <minlines> and <maxlines>.
+Every file will have multiple documents (records). Number of documents is random, between <mindocs> and <maxdocs>.
+Size of a single document is primarily determined by number of lines, randomly generated between <minlines> and <maxlines>.
+Files are generated by --workers processes, written by --sink and uploaded by --uploaders threads;
+with --seed the run is reproducible, and with --journal it can be resumed. Run with -h for all options.
 
 Files are named according to <pattern> with the following substitutions:
 ${date} is substituted by date in %Y%0m%0d format
@@ -14,7 +20,7 @@ ${time} is substituted by time in %H%M%S format
 ${microseconds} is substituted by microseconds in %f format
 ${timestamp} is substituted by microseconds in %Y%0m%0d%H%M%S%f format
 ${number} is substituted by the number of file in the day (starting from 1)
-${uuid} is substituted by unique identifier generated as uuid.uuid4()
+${uuid} is substituted by unique identifier generated as uuid.uuid4(), or derived from the seed
 """
 
 import string
@@ -22,24 +28,142 @@ import time
 import datetime
 import random
 import json
-import copy
 import sys
 import logging
-import codecs
+import itertools
+import math
+import zlib
+import struct
+import io
 import uuid
 import os
 import getopt
+import collections
+import multiprocessing
+import threading
+import queue
+import concurrent.futures
+import http.server
+import hashlib
+import ast
+import builtins
+import mmap
+import heapq
+import tempfile
+import importlib.util
+import array
 
-from dateutil.relativedelta import relativedelta
 from base64 import b64encode
+from json.encoder import encode_basestring_ascii
 
-import oci
+
+# numpy module and random generator of the numpy engine, set on first use in every process,
+# and seed of the generator, set for every file when the run is seeded
+g_numpy = None
+g_numpy_random = None
+g_numpy_seed = None
+
+# seed of the run, set by initialize_seed()
+g_seed = None
+
+# pyarrow module of parquet scenario, set on first use
+g_pyarrow = None
+
+# oci module of object storage sink, set by get_oci()
+g_oci = None
+
+# status codes of object storage responses retried after backoff; throttling
+# responses also reduce number of concurrent requests, and maximum backoff in seconds
+g_retry_throttling_statuses = (429, 503)
+g_retry_transient_statuses = (500, 502, 504)
+g_retry_max_delay = 30.0
+
+# compiled schemas of documents by file name, and functions allowed in expressions of schema
+g_schemas = {}
+g_schema_builtins = ('abs', 'all', 'any', 'bool', 'float', 'format', 'int', 'len', 'max', 'min', 'round', 'sorted', 'str', 'sum')
+
+# functions used by compiled code of schema, the only builtins available to it
+g_schema_code_builtins = g_schema_builtins + ('enumerate', 'range', 'tuple')
+
+# parameters recorded in journal, resumed run must use the same values
+g_journal_params = ('scenario', 'sink', 'bucket', 'directory', 'pattern', 'fromdate', 'todate', 'minfiles', 'maxfiles', 'mindocs', 'maxdocs', 'minlines', 'maxlines', 'compress', 'layout', 'targetsize', 'schema', 'corpus', 'docindex', 'updates', 'deletes', 'products', 'customers', 'customerskew', 'execute', 'schedule', 'shard')
+
+# corpus file header with magic, version, number of documents and offset of index,
+# index record with offset, size and line count of document and offsets of replaced
+# fields, and fields replaced in replayed documents
+g_corpus_magic = b'FGCORPUS'
+g_corpus_header = struct.Struct('<8sIQQ')
+g_corpus_record = struct.Struct('<QIIIIIII')
+g_corpus_fields = ('document_id', 'invoice_number', 'invoice_date', 'due_date', 'created_timestamp')
+
+# corpus mapped into memory of the process, set on first use
+g_corpus = None
+
+# document index record with document id, date ordinal, object ordinal, net
+# amount, line count, version and state of the document
+g_document_index_record = struct.Struct('<16sIIdIHBx')
+g_document_index_states = {1: 'live', 2: 'deleted'}
+
+# sorted keys of document index, record with document id and position of the
+# document in the index after header with magic and number of indexed records,
+# and number of records sorted in memory at once when the keys are updated
+g_document_key_magic = b'FGDOCKEY'
+g_document_key_header = struct.Struct('<8sQ')
+g_document_key_record = struct.Struct('<16sQ')
+g_document_key_chunk = 1000000
+
+# document index mapped into memory of the process for sampling, set on first use
+g_document_index = None
+
+# reference data tables and customer pool, set by initialize_reference_data()
+g_reference = None
+
+# random generator of document and line counts of planned file, set by seed_counts()
+g_counts_random = None
+
+# initial estimate of invoice size, bytes without lines and bytes per line
+g_invoice_estimate = {"header_bytes": 2400, "line_bytes": 485.0}
+
+# number of file is packed with its date into one integer by size schedule
+g_schedule_max_files = 1 << 24
+
+# source of random text fields and its slabs, set by initialize_text_source()
+g_text_source = {"type": "random"}
+g_text_slabs = {}
+
+# slabs of seeded run filled from the seed of the run, and seed of the file
+# and number of chunks of the slab refilled from it, set by seed_file()
+g_text_slab_bases = {}
+g_text_slab_seed = None
+g_text_slab_chunks = 16
+
+# stages of file processing measured by metrics, and upper bounds in seconds of their latency histogram buckets
+g_metrics_stages = ('name', 'generate', 'serialize', 'compress', 'upload')
+g_metrics_buckets = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+# number of threads listing or reading objects by the verify command
+g_verify_threads = 32
 
 
 # ----------------------------------------------------
 # SETUP FUNCTIONS
 # ----------------------------------------------------
 
+# ----------------------------------------------------
+# Get size in bytes
+# ----------------------------------------------------
+def get_size_bytes(p_size):
+
+    # size in bytes with optional suffix K, M or G for KiB, MiB or GiB
+    v_multipliers = {'K': 1024, 'M': 1024 * 1024, 'G': 1024 * 1024 * 1024}
+    v_size = p_size.strip().upper()
+
+    if v_size[-1:] in v_multipliers:
+        return int(float(v_size[:-1]) * v_multipliers[v_size[-1]])
+    else:
+        return int(v_size)
+
+
 # ----------------------------------------------------
 # Get input parameters
 # ----------------------------------------------------
@@ -61,13 +185,61 @@ def get_input_parameters(p_argv):
       'namespace':   None,
       'bucket':      None,
       'pattern':     None,
+      'workers':     1,
+      'uploaders':   0,
+      'queuesize':   4,
+      'partsize':    0,
+      'partthreads': 4,
+      'engine':      'python',
+      'textsource':  'random',
+      'slabsize':    4,
+      'slabreuse':   4,
+      'serializer':  'dict',
+      'compress':    'none',
+      'compressthreads': 4,
+      'compressblock': 1,
+      'layout':      'flat',
+      'rowgroupsize': 100000,
+      'sink':        'oci',
+      'directory':   None,
+      'progress':    60,
+      'metricsport': 0,
+      'ratemb':      0,
+      'ratefiles':   0,
+      'ratedocs':    0,
+      'rateburst':   1,
+      'targetsize':  None,
+      'seed':        None,
+      'shard':       (0, 1),
+      'manifest':    None,
+      'journal':     None,
+      'resume':      False,
+      'retries':     5,
+      'retrydelay':  0.2,
+      'schema':      None,
+      'products':    2000,
+      'customers':   0,
+      'customerskew': 0.0,
+      'dimensions':  None,
+      'streamlines': 0,
+      'corpus':      None,
+      'corpusdocs':  1000,
+      'docindex':    None,
+      'updates':     0.0,
+      'deletes':     0.0,
+      'plan':        None,
+      'execute':     False,
+      'calibratelines': 20000,
+      'schedule':    'order',
+      'md5':         False,
+      'hash':        'none',
       'loglevel':    'INFO'
    } 
      
    v_help = '''
    Options:
    -h, --help             Print help
-   -s, --scenario         Scenario (json) [mandatory]
+   -s, --scenario         Scenario (json, parquet, cdc) [mandatory]
    -f, --fromdate         Start date in YYYY-MM-DD format [mandatory]
    -t, --todate           End date in YYYY-MM-DD format [mandatory]
    -x, --minfiles         Minimum number of files in one day [{0}]
@@ -77,14 +249,62 @@ def get_input_parameters(p_argv):
    -v, --minlines         Minimum number of lines in one document[{4}]
    -w, --maxlines         Maximum number of lines in one document[{5}]
    -e, --sleep            Sleep time in seconds between files [{6}]
-   -n, --namespace        Tenancy namespace [mandatory]
-   -b, --bucket           Name of target bucket [mandatory]
+   -n, --namespace        Tenancy namespace [mandatory for oci sink]
+   -b, --bucket           Name of target bucket [mandatory for oci sink]
    -p, --pattern          Object name pattern [mandatory]
-       --loglevel         Log level [DEBUG, INFO, WARNING, ERROR, CRITICAL], default is {7}
-   '''.format(v_params['minfiles'], v_params['maxfiles'], v_params['mindocs'], v_params['maxdocs'], v_params['minlines'], v_params['maxlines'], v_params['sleep'], v_params['loglevel'])
+       --workers          Number of processes generating content in parallel [{7}]
+       --uploaders        Number of threads uploading files in parallel with generation, 0 uploads synchronously [{8}]
+       --queuesize        Maximum number of generated files waiting for upload [{9}]
+       --partsize         Part size in MiB for multipart upload of large files, 0 disables multipart upload [{10}]
+       --partthreads      Number of threads uploading parts of one file in parallel [{11}]
+       --engine           Engine generating invoice lines (python, numpy) [{12}]
+       --textsource       Source of random text fields (random, slab) [{13}]
+       --slabsize         Size of random text slab in MiB, one slab per alphabet [{14}]
+       --slabreuse        Number of times the slab size is served from a slab before it is refilled [{15}]
+       --serializer       Serializer of documents (dict, template) [{16}]
+       --compress         Compression of files (none, gzip, zstd) [{17}]
+       --compressthreads  Number of threads compressing one file in parallel [{18}]
+       --compressblock    Size of block compressed by one thread in MiB [{19}]
+       --layout           Layout of parquet rows, line per row or invoice per row (flat, nested) [{20}]
+       --rowgroupsize     Number of rows in parquet row group [{21}]
+       --sink             Target of generated files, object storage, local directory or none (oci, local, null) [{22}]
+       --directory        Target directory of local sink [mandatory for local sink]
+       --progress         Interval in seconds between progress records, 0 disables progress records [{23}]
+       --metricsport      Local port of HTTP endpoint with metrics in Prometheus format, 0 disables the endpoint [{24}]
+       --ratemb           Target rate of written content in MiB per second, 0 disables the target [{25}]
+       --ratefiles        Target rate of written files per second, 0 disables the target [{26}]
+       --ratedocs         Target rate of written documents per second, 0 disables the target [{27}]
+       --rateburst        Burst allowed above the target rates, in seconds of the target rate [{28}]
+       --targetsize       Exact size of every file as SIZE or range MIN-MAX, in bytes or with suffix K, M or G, for json scenario without compression
+       --seed             Seed making the run reproducible, every file is generated from the seed, date and file number
+       --shard            Shard of files generated by this run as INDEX/COUNT with INDEX from 0, files are assigned to shards round-robin [0/1]
+       --manifest         Local file for manifest with statistics and written objects
+       --journal          Local append-only journal of written objects, makes the run resumable
+       --resume           Continue run recorded in journal, skipping files already written
+       --retries          Number of retries of object storage request failed with throttling or transient error [{29}]
+       --retrydelay       Delay in seconds before the first retry, doubled with every next retry and randomized [{30}]
+       --schema           JSON file with schema of generated documents, like schemas/invoice.json, for json scenario with python engine [built-in invoice]
+       --products         Number of products in product table of invoice lines [{31}]
+       --customers        Number of customers in pool reused by invoices, 0 generates new customer for every invoice [{32}]
+       --customerskew     Skew of customer reuse, customer of rank N is drawn with weight 1/N^SKEW, 0 draws customers uniformly [{33}]
+       --dimensions       Prefix of dimension files with products, taxes, currencies, countries and customers written to the sink
+       --streamlines      Number of lines serialized at once in streamed invoices, which are never held in memory, 0 builds every invoice in memory [{34}]
+       --corpus           Local corpus file of pre-generated invoices replayed with new identifiers and dates, generated if it does not exist
+       --corpusdocs       Number of invoices generated into new corpus [{35}]
+       --docindex         Local directory with index of generated documents, read by cdc scenario for changes of indexed documents
+       --updates          Fraction of indexed documents updated by cdc scenario [{36}]
+       --deletes          Fraction of indexed documents deleted by cdc scenario [{37}]
+       --plan             Local file with plan of the run, written with estimated size and time of the run without generating files
+       --execute          Generate files of the plan written before, with the planned numbers of files, documents and lines
+       --calibratelines   Number of invoice lines generated to calibrate size and time estimates of the plan [{38}]
+       --schedule         Order of generated files, in order of dates and numbers or biggest files first (order, size) [{39}]
+       --md5              Compute MD5 of every object while it is generated, sent with the upload and written to manifest
+       --hash             Faster hash of every object computed while it is generated and written to manifest (none, crc32, xxh3) [{40}]
+       --loglevel         Log level [DEBUG, INFO, WARNING, ERROR, CRITICAL], default is {41}
+   '''.format(v_params['minfiles'], v_params['maxfiles'], v_params['mindocs'], v_params['maxdocs'], v_params['minlines'], v_params['maxlines'], v_params['sleep'], v_params['workers'], v_params['uploaders'], v_params['queuesize'], v_params['partsize'], v_params['partthreads'], v_params['engine'], v_params['textsource'], v_params['slabsize'], v_params['slabreuse'], v_params['serializer'], v_params['compress'], v_params['compressthreads'], v_params['compressblock'], v_params['layout'], v_params['rowgroupsize'], v_params['sink'], v_params['progress'], v_params['metricsport'], v_params['ratemb'], v_params['ratefiles'], v_params['ratedocs'], v_params['rateburst'], v_params['retries'], v_params['retrydelay'], v_params['products'], v_params['customers'], v_params['customerskew'], v_params['streamlines'], v_params['corpusdocs'], v_params['updates'], v_params['deletes'], v_params['calibratelines'], v_params['schedule'], v_params['hash'], v_params['loglevel'])
 
    try:
-      (v_opts, v_args) = getopt.getopt(p_argv[1:],"hs:f:t:x:y:k:l:v:w:e:n:b:p:",['help','scenario=','fromdate=','todate=','minfiles=','maxfiles=','mindocs=','maxdocs=','minlines=','maxlines=','sleep=','namespace=','bucket=','pattern=','loglevel='])
+      (v_opts, v_args) = getopt.getopt(p_argv[1:],"hs:f:t:x:y:k:l:v:w:e:n:b:p:",['help','scenario=','fromdate=','todate=','minfiles=','maxfiles=','mindocs=','maxdocs=','minlines=','maxlines=','sleep=','namespace=','bucket=','pattern=','workers=','uploaders=','queuesize=','partsize=','partthreads=','engine=','textsource=','slabsize=','slabreuse=','serializer=','compress=','compressthreads=','compressblock=','layout=','rowgroupsize=','sink=','directory=','progress=','metricsport=','ratemb=','ratefiles=','ratedocs=','rateburst=','targetsize=','seed=','shard=','manifest=','journal=','resume','retries=','retrydelay=','schema=','products=','customers=','customerskew=','dimensions=','streamlines=','corpus=','corpusdocs=','docindex=','updates=','deletes=','plan=','execute','calibratelines=','schedule=','md5','hash=','loglevel='])
    except getopt.GetoptError:
       g_logger.error ('Unknown parameter or parameter with missing value')
       print (v_usage)
@@ -120,6 +340,103 @@ def get_input_parameters(p_argv):
          v_params['bucket'] = v_arg
       elif v_opt in ('-p', '--pattern'):
          v_params['pattern'] = v_arg
+      elif v_opt == '--workers':
+         v_params['workers'] = int(v_arg)
+      elif v_opt == '--uploaders':
+         v_params['uploaders'] = int(v_arg)
+      elif v_opt == '--queuesize':
+         v_params['queuesize'] = int(v_arg)
+      elif v_opt == '--partsize':
+         v_params['partsize'] = int(v_arg)
+      elif v_opt == '--partthreads':
+         v_params['partthreads'] = int(v_arg)
+      elif v_opt == '--engine':
+         v_params['engine'] = v_arg
+      elif v_opt == '--textsource':
+         v_params['textsource'] = v_arg
+      elif v_opt == '--slabsize':
+         v_params['slabsize'] = int(v_arg)
+      elif v_opt == '--slabreuse':
+         v_params['slabreuse'] = int(v_arg)
+      elif v_opt == '--serializer':
+         v_params['serializer'] = v_arg
+      elif v_opt == '--compress':
+         v_params['compress'] = v_arg
+      elif v_opt == '--compressthreads':
+         v_params['compressthreads'] = int(v_arg)
+      elif v_opt == '--compressblock':
+         v_params['compressblock'] = int(v_arg)
+      elif v_opt == '--layout':
+         v_params['layout'] = v_arg
+      elif v_opt == '--rowgroupsize':
+         v_params['rowgroupsize'] = int(v_arg)
+      elif v_opt == '--sink':
+         v_params['sink'] = v_arg
+      elif v_opt == '--directory':
+         v_params['directory'] = v_arg
+      elif v_opt == '--progress':
+         v_params['progress'] = int(v_arg)
+      elif v_opt == '--metricsport':
+         v_params['metricsport'] = int(v_arg)
+      elif v_opt == '--ratemb':
+         v_params['ratemb'] = float(v_arg)
+      elif v_opt == '--ratefiles':
+         v_params['ratefiles'] = float(v_arg)
+      elif v_opt == '--ratedocs':
+         v_params['ratedocs'] = float(v_arg)
+      elif v_opt == '--rateburst':
+         v_params['rateburst'] = float(v_arg)
+      elif v_opt == '--targetsize':
+         v_sizes = v_arg.split('-')
+         v_params['targetsize'] = (get_size_bytes(v_sizes[0]), get_size_bytes(v_sizes[-1]))
+      elif v_opt == '--seed':
+         v_params['seed'] = v_arg
+      elif v_opt == '--shard':
+         v_params['shard'] = tuple(int(v_value) for v_value in v_arg.split('/'))
+      elif v_opt == '--manifest':
+         v_params['manifest'] = v_arg
+      elif v_opt == '--journal':
+         v_params['journal'] = v_arg
+      elif v_opt == '--resume':
+         v_params['resume'] = True
+      elif v_opt == '--retries':
+         v_params['retries'] = int(v_arg)
+      elif v_opt == '--retrydelay':
+         v_params['retrydelay'] = float(v_arg)
+      elif v_opt == '--schema':
+         v_params['schema'] = v_arg
+      elif v_opt == '--products':
+         v_params['products'] = int(v_arg)
+      elif v_opt == '--customers':
+         v_params['customers'] = int(v_arg)
+      elif v_opt == '--customerskew':
+         v_params['customerskew'] = float(v_arg)
+      elif v_opt == '--dimensions':
+         v_params['dimensions'] = v_arg.rstrip('/')
+      elif v_opt == '--streamlines':
+         v_params['streamlines'] = int(v_arg)
+      elif v_opt == '--corpus':
+         v_params['corpus'] = v_arg
+      elif v_opt == '--corpusdocs':
+         v_params['corpusdocs'] = int(v_arg)
+      elif v_opt == '--docindex':
+         v_params['docindex'] = v_arg
+      elif v_opt == '--updates':
+         v_params['updates'] = float(v_arg)
+      elif v_opt == '--deletes':
+         v_params['deletes'] = float(v_arg)
+      elif v_opt == '--plan':
+         v_params['plan'] = v_arg
+      elif v_opt == '--execute':
+         v_params['execute'] = True
+      elif v_opt == '--calibratelines':
+         v_params['calibratelines'] = int(v_arg)
+      elif v_opt == '--schedule':
+         v_params['schedule'] = v_arg
+      elif v_opt == '--md5':
+         v_params['md5'] = True
+      elif v_opt == '--hash':
+         v_params['hash'] = v_arg
       elif v_opt in ('--loglevel'):
          v_params['loglevel'] = v_arg.upper()
 
@@ -127,8 +444,8 @@ def get_input_parameters(p_argv):
       g_logger.error ('Missing value for parameter "scenario"')
       print (v_usage)
       sys.exit(2)
-   elif v_params['scenario'] not in ('json'):
-      g_logger.error ('Parameter "scenario" must have value "json"')
+   elif v_params['scenario'] not in ('json', 'parquet', 'cdc'):
+      g_logger.error ('Parameter "scenario" must have value "json", "parquet" or "cdc"')
       print (v_usage)
       sys.exit(2)
    if v_params['fromdate'] == None:
@@ -167,18 +484,242 @@ def get_input_parameters(p_argv):
       g_logger.error ('Missing value for parameter "sleep"')
       print (v_usage)
       sys.exit(2)
-   elif v_params['namespace'] == None:
+   elif v_params['sink'] not in ('oci', 'local', 'null'):
+      g_logger.error ('Parameter "sink" must have value "oci", "local" or "null"')
+      print (v_usage)
+      sys.exit(2)
+   elif v_params['sink'] == 'oci' and v_params['namespace'] == None:
       g_logger.error ('Missing value for parameter "namespace"')
       print (v_usage)
       sys.exit(2)
-   elif v_params['bucket'] == None:
+   elif v_params['sink'] == 'oci' and v_params['bucket'] == None:
       g_logger.error ('Missing value for parameter "bucket"')
       print (v_usage)
       sys.exit(2)
+   elif v_params['sink'] == 'local' and v_params['directory'] == None:
+      g_logger.error ('Missing value for parameter "directory"')
+      print (v_usage)
+      sys.exit(2)
    elif v_params['pattern'] == None:
       g_logger.error ('Missing value for parameter "pattern"')
       print (v_usage)
       sys.exit(2)
+   elif v_params['workers'] < 1:
+      g_logger.error ('Parameter "workers" must be at least 1')
+      print (v_usage)
+      sys.exit(2)
+   elif v_params['uploaders'] < 0:
+      g_logger.error ('Parameter "uploaders" must not be negative')
+      print (v_usage)
+      sys.exit(2)
+   elif v_params['queuesize'] < 1:
+      g_logger.error ('Parameter "queuesize" must be at least 1')
+      print (v_usage)
+      sys.exit(2)
+   elif v_params['partsize'] < 0:
+      g_logger.error ('Parameter "partsize" must not be negative')
+      print (v_usage)
+      sys.exit(2)
+   elif v_params['partthreads'] < 1:
+      g_logger.error ('Parameter "partthreads" must be at least 1')
+      print (v_usage)
+      sys.exit(2)
+   elif v_params['uploaders'] > 0 and v_params['partsize'] > 0 and v_params['workers'] == 1:
+      g_logger.error ('Parameter "uploaders" is not supported with parameter "partsize" and a single worker, files are written while they are generated')
+      print (v_usage)
+      sys.exit(2)
+   elif v_params['engine'] not in ('python', 'numpy'):
+      g_logger.error ('Parameter "engine" must have value "python" or "numpy"')
+      print (v_usage)
+      sys.exit(2)
+   elif v_params['textsource'] not in ('random', 'slab'):
+      g_logger.error ('Parameter "textsource" must have value "random" or "slab"')
+      print (v_usage)
+      sys.exit(2)
+   elif v_params['slabsize'] < 1:
+      g_logger.error ('Parameter "slabsize" must be at least 1')
+      print (v_usage)
+      sys.exit(2)
+   elif v_params['slabreuse'] < 1:
+      g_logger.error ('Parameter "slabreuse" must be at least 1')
+      print (v_usage)
+      sys.exit(2)
+   elif v_params['serializer'] not in ('dict', 'template'):
+      g_logger.error ('Parameter "serializer" must have value "dict" or "template"')
+      print (v_usage)
+      sys.exit(2)
+   elif v_params['compress'] not in ('none', 'gzip', 'zstd'):
+      g_logger.error ('Parameter "compress" must have value "none", "gzip" or "zstd"')
+      print (v_usage)
+      sys.exit(2)
+   elif v_params['compressthreads'] < 1:
+      g_logger.error ('Parameter "compressthreads" must be at least 1')
+      print (v_usage)
+      sys.exit(2)
+   elif v_params['compressblock'] < 1:
+      g_logger.error ('Parameter "compressblock" must be at least 1')
+      print (v_usage)
+      sys.exit(2)
+   elif v_params['layout'] not in ('flat', 'nested'):
+      g_logger.error ('Parameter "layout" must have value "flat" or "nested"')
+      print (v_usage)
+      sys.exit(2)
+   elif v_params['rowgroupsize'] < 1:
+      g_logger.error ('Parameter "rowgroupsize" must be at least 1')
+      print (v_usage)
+      sys.exit(2)
+   elif v_params['progress'] < 0:
+      g_logger.error ('Parameter "progress" must not be negative')
+      print (v_usage)
+      sys.exit(2)
+   elif v_params['metricsport'] < 0:
+      g_logger.error ('Parameter "metricsport" must not be negative')
+      print (v_usage)
+      sys.exit(2)
+   elif v_params['ratemb'] < 0:
+      g_logger.error ('Parameter "ratemb" must not be negative')
+      print (v_usage)
+      sys.exit(2)
+   elif v_params['ratefiles'] < 0:
+      g_logger.error ('Parameter "ratefiles" must not be negative')
+      print (v_usage)
+      sys.exit(2)
+   elif v_params['ratedocs'] < 0:
+      g_logger.error ('Parameter "ratedocs" must not be negative')
+      print (v_usage)
+      sys.exit(2)
+   elif v_params['rateburst'] < 0:
+      g_logger.error ('Parameter "rateburst" must not be negative')
+      print (v_usage)
+      sys.exit(2)
+   elif v_params['targetsize'] != None and v_params['targetsize'][0] < 16384:
+      g_logger.error ('Parameter "targetsize" must be at least 16K')
+      print (v_usage)
+      sys.exit(2)
+   elif v_params['targetsize'] != None and (v_params['scenario'] != 'json' or v_params['compress'] != 'none'):
+      g_logger.error ('Parameter "targetsize" is supported only for json scenario without compression')
+      print (v_usage)
+      sys.exit(2)
+   elif v_params['targetsize'] != None and v_params['targetsize'][0] > v_params['targetsize'][1]:
+      g_logger.error ('Parameter "targetsize" must have minimum not larger than maximum')
+      print (v_usage)
+      sys.exit(2)
+   elif len(v_params['shard']) != 2 or v_params['shard'][1] < 1 or not 0 <= v_params['shard'][0] < v_params['shard'][1]:
+      g_logger.error ('Parameter "shard" must have format INDEX/COUNT with 0 <= INDEX < COUNT')
+      print (v_usage)
+      sys.exit(2)
+   elif v_params['shard'][1] > 1 and v_params['seed'] == None:
+      g_logger.error ('Parameter "shard" requires parameter "seed", so all shards draw the same files')
+      print (v_usage)
+      sys.exit(2)
+   elif v_params['resume'] and v_params['journal'] == None:
+      g_logger.error ('Parameter "resume" requires parameter "journal"')
+      print (v_usage)
+      sys.exit(2)
+   elif v_params['retries'] < 0:
+      g_logger.error ('Parameter "retries" must not be negative')
+      print (v_usage)
+      sys.exit(2)
+   elif v_params['retrydelay'] < 0:
+      g_logger.error ('Parameter "retrydelay" must not be negative')
+      print (v_usage)
+      sys.exit(2)
+   elif v_params['schema'] != None and (v_params['scenario'] != 'json' or v_params['engine'] != 'python' or v_params['targetsize'] != None):
+      g_logger.error ('Parameter "schema" is supported only for json scenario with python engine and without targetsize')
+      print (v_usage)
+      sys.exit(2)
+   elif v_params['products'] < 1:
+      g_logger.error ('Parameter "products" must be positive')
+      print (v_usage)
+      sys.exit(2)
+   elif v_params['customers'] < 0:
+      g_logger.error ('Parameter "customers" must not be negative')
+      print (v_usage)
+      sys.exit(2)
+   elif v_params['customerskew'] < 0:
+      g_logger.error ('Parameter "customerskew" must not be negative')
+      print (v_usage)
+      sys.exit(2)
+   elif v_params['schema'] != None and (v_params['products'] != 2000 or v_params['customers'] > 0):
+      g_logger.error ('Parameters "products" and "customers" are not supported with schema')
+      print (v_usage)
+      sys.exit(2)
+   elif v_params['streamlines'] < 0:
+      g_logger.error ('Parameter "streamlines" must not be negative')
+      print (v_usage)
+      sys.exit(2)
+   elif v_params['streamlines'] > 0 and (v_params['scenario'] != 'json' or v_params['engine'] != 'python' or v_params['schema'] != None or v_params['targetsize'] != None):
+      g_logger.error ('Parameter "streamlines" is supported only for json scenario with python engine, without schema and targetsize')
+      print (v_usage)
+      sys.exit(2)
+   elif v_params['streamlines'] > 0 and v_params['workers'] > 1:
+      g_logger.error ('Parameter "streamlines" is not supported with "workers", which return every file whole')
+      print (v_usage)
+      sys.exit(2)
+   elif v_params['corpusdocs'] < 1:
+      g_logger.error ('Parameter "corpusdocs" must be positive')
+      print (v_usage)
+      sys.exit(2)
+   elif v_params['corpus'] != None and (v_params['scenario'] != 'json' or v_params['schema'] != None or v_params['targetsize'] != None or v_params['streamlines'] > 0):
+      g_logger.error ('Parameter "corpus" is supported only for json scenario without schema, targetsize and streamlines')
+      print (v_usage)
+      sys.exit(2)
+   elif not 0 <= v_params['updates'] <= 1:
+      g_logger.error ('Parameter "updates" must be between 0 and 1')
+      print (v_usage)
+      sys.exit(2)
+   elif not 0 <= v_params['deletes'] <= 1 - v_params['updates']:
+      g_logger.error ('Parameter "deletes" must be between 0 and 1 and not larger than 1 - updates')
+      print (v_usage)
+      sys.exit(2)
+   elif v_params['scenario'] == 'cdc' and v_params['docindex'] == None:
+      g_logger.error ('Parameter "docindex" is mandatory for cdc scenario')
+      print (v_usage)
+      sys.exit(2)
+   elif v_params['docindex'] != None and (v_params['scenario'] == 'parquet' or v_params['schema'] != None or v_params['targetsize'] != None or v_params['corpus'] != None):
+      g_logger.error ('Parameter "docindex" is supported only for json and cdc scenarios without schema, targetsize and corpus')
+      print (v_usage)
+      sys.exit(2)
+   elif v_params['docindex'] != None and v_params['shard'][1] > 1:
+      g_logger.error ('Parameter "docindex" is not supported with shard')
+      print (v_usage)
+      sys.exit(2)
+   elif v_params['scenario'] == 'cdc' and (v_params['schema'] != None or v_params['targetsize'] != None or v_params['corpus'] != None or v_params['streamlines'] > 0):
+      g_logger.error ('Scenario "cdc" is not supported with schema, targetsize, corpus and streamlines')
+      print (v_usage)
+      sys.exit(2)
+   elif v_params['plan'] != None and (v_params['scenario'] == 'cdc' or v_params['schema'] != None or v_params['targetsize'] != None or v_params['corpus'] != None):
+      g_logger.error ('Parameter "plan" is supported only for json and parquet scenarios without schema, targetsize and corpus')
+      print (v_usage)
+      sys.exit(2)
+   elif v_params['execute'] and v_params['plan'] == None:
+      g_logger.error ('Parameter "execute" requires parameter "plan"')
+      print (v_usage)
+      sys.exit(2)
+   elif v_params['plan'] != None and not v_params['execute'] and v_params['journal'] != None:
+      g_logger.error ('Parameter "journal" is supported with plan only when the plan is executed')
+      print (v_usage)
+      sys.exit(2)
+   elif v_params['calibratelines'] < 1:
+      g_logger.error ('Parameter "calibratelines" must be positive')
+      print (v_usage)
+      sys.exit(2)
+   elif v_params['schedule'] not in ('order', 'size'):
+      g_logger.error ('Missing or invalid value for parameter "schedule"')
+      print (v_usage)
+      sys.exit(2)
+   elif v_params['schedule'] == 'size' and (v_params['scenario'] == 'cdc' or v_params['schema'] != None or v_params['targetsize'] != None or v_params['corpus'] != None):
+      g_logger.error ('Parameter "schedule" with value "size" is supported only for json and parquet scenarios without schema, targetsize and corpus')
+      print (v_usage)
+      sys.exit(2)
+   elif v_params['hash'] not in ('none', 'crc32', 'xxh3'):
+      g_logger.error ('Missing or invalid value for parameter "hash"')
+      print (v_usage)
+      sys.exit(2)
+   elif v_params['hash'] == 'xxh3' and importlib.util.find_spec('xxhash') == None:
+      g_logger.error ('Parameter "hash" with value "xxh3" requires package xxhash')
+      print (v_usage)
+      sys.exit(2)
    elif v_params['loglevel'] not in ('DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'):
       g_logger.error ('Missing or invalid value for parameter "loglevel"')
       print (v_usage)
@@ -205,6 +746,54 @@ def print_input_parameters(p_params):
     g_logger.debug('Parameter "namespace" = {}'.format(p_params['namespace']))
     g_logger.debug('Parameter "bucket" = {}'.format(p_params['bucket']))
     g_logger.debug('Parameter "pattern" = {}'.format(p_params['pattern']))
+    g_logger.debug('Parameter "workers" = {}'.format(p_params['workers']))
+    g_logger.debug('Parameter "uploaders" = {}'.format(p_params['uploaders']))
+    g_logger.debug('Parameter "queuesize" = {}'.format(p_params['queuesize']))
+    g_logger.debug('Parameter "partsize" = {}'.format(p_params['partsize']))
+    g_logger.debug('Parameter "partthreads" = {}'.format(p_params['partthreads']))
+    g_logger.debug('Parameter "engine" = {}'.format(p_params['engine']))
+    g_logger.debug('Parameter "textsource" = {}'.format(p_params['textsource']))
+    g_logger.debug('Parameter "slabsize" = {}'.format(p_params['slabsize']))
+    g_logger.debug('Parameter "slabreuse" = {}'.format(p_params['slabreuse']))
+    g_logger.debug('Parameter "serializer" = {}'.format(p_params['serializer']))
+    g_logger.debug('Parameter "compress" = {}'.format(p_params['compress']))
+    g_logger.debug('Parameter "compressthreads" = {}'.format(p_params['compressthreads']))
+    g_logger.debug('Parameter "compressblock" = {}'.format(p_params['compressblock']))
+    g_logger.debug('Parameter "layout" = {}'.format(p_params['layout']))
+    g_logger.debug('Parameter "rowgroupsize" = {}'.format(p_params['rowgroupsize']))
+    g_logger.debug('Parameter "sink" = {}'.format(p_params['sink']))
+    g_logger.debug('Parameter "directory" = {}'.format(p_params['directory']))
+    g_logger.debug('Parameter "progress" = {}'.format(p_params['progress']))
+    g_logger.debug('Parameter "metricsport" = {}'.format(p_params['metricsport']))
+    g_logger.debug('Parameter "ratemb" = {}'.format(p_params['ratemb']))
+    g_logger.debug('Parameter "ratefiles" = {}'.format(p_params['ratefiles']))
+    g_logger.debug('Parameter "ratedocs" = {}'.format(p_params['ratedocs']))
+    g_logger.debug('Parameter "rateburst" = {}'.format(p_params['rateburst']))
+    g_logger.debug('Parameter "targetsize" = {}'.format(p_params['targetsize']))
+    g_logger.debug('Parameter "seed" = {}'.format(p_params['seed']))
+    g_logger.debug('Parameter "shard" = {}/{}'.format(p_params['shard'][0], p_params['shard'][1]))
+    g_logger.debug('Parameter "manifest" = {}'.format(p_params['manifest']))
+    g_logger.debug('Parameter "journal" = {}'.format(p_params['journal']))
+    g_logger.debug('Parameter "resume" = {}'.format(p_params['resume']))
+    g_logger.debug('Parameter "retries" = {}'.format(p_params['retries']))
+    g_logger.debug('Parameter "retrydelay" = {}'.format(p_params['retrydelay']))
+    g_logger.debug('Parameter "schema" = {}'.format(p_params['schema']))
+    g_logger.debug('Parameter "products" = {}'.format(p_params['products']))
+    g_logger.debug('Parameter "customers" = {}'.format(p_params['customers']))
+    g_logger.debug('Parameter "customerskew" = {}'.format(p_params['customerskew']))
+    g_logger.debug('Parameter "dimensions" = {}'.format(p_params['dimensions']))
+    g_logger.debug('Parameter "streamlines" = {}'.format(p_params['streamlines']))
+    g_logger.debug('Parameter "corpus" = {}'.format(p_params['corpus']))
+    g_logger.debug('Parameter "corpusdocs" = {}'.format(p_params['corpusdocs']))
+    g_logger.debug('Parameter "docindex" = {}'.format(p_params['docindex']))
+    g_logger.debug('Parameter "updates" = {}'.format(p_params['updates']))
+    g_logger.debug('Parameter "deletes" = {}'.format(p_params['deletes']))
+    g_logger.debug('Parameter "plan" = {}'.format(p_params['plan']))
+    g_logger.debug('Parameter "execute" = {}'.format(p_params['execute']))
+    g_logger.debug('Parameter "calibratelines" = {}'.format(p_params['calibratelines']))
+    g_logger.debug('Parameter "schedule" = {}'.format(p_params['schedule']))
+    g_logger.debug('Parameter "md5" = {}'.format(p_params['md5']))
+    g_logger.debug('Parameter "hash" = {}'.format(p_params['hash']))
     g_logger.debug('Parameter "loglevel" = {}'.format(p_params['loglevel']))
 
 
@@ -232,6 +821,8 @@ def initialize_logging (p_logger_name, p_level):
     global g_logger
     g_logger = logging.getLogger(p_logger_name)
     g_logger.setLevel(v_level)
+    if g_logger.handlers:
+        return
     v_formatter = logging.Formatter('%(asctime)s : %(levelname)s : %(name)s : %(message)s', datefmt='%Y/%m/%d %H:%M:%S', style='%')
     v_handler = logging.StreamHandler()
     v_handler.setFormatter(v_formatter)
@@ -249,6 +840,141 @@ def get_random_string(p_choices, p_min_length, p_max_length):
     return ''.join(random.choices(p_choices, k=random.randrange(p_min_length,p_max_length+1)))
 
 
+# ----------------------------------------------------
+# Initialize text source
+# ----------------------------------------------------
+def initialize_text_source(p_params):
+
+    # slabs are filled lazily, so every process starts with its own slabs
+    global g_text_source, g_text_slabs, g_text_slab_bases
+    g_text_source = {
+        "type": p_params['textsource'],
+        "slab_size": p_params['slabsize'] * 1024 * 1024,
+        "slab_reuse": p_params['slabreuse']
+    }
+    g_text_slabs = {}
+    g_text_slab_bases = {}
+
+
+# ----------------------------------------------------
+# Get random characters
+# ----------------------------------------------------
+def get_random_characters(p_choices, p_length, p_random=random):
+
+    # random bytes are mapped to characters; bytes above the largest multiple
+    # of the number of choices are dropped, so all characters are equally likely
+    v_choices = p_choices.encode('ascii')
+    v_limit = 256 - 256 % len(v_choices)
+    v_table = bytes(v_choices[v_byte % len(v_choices)] for v_byte in range(256))
+    v_drop = bytes(range(v_limit, 256))
+
+    v_characters = bytearray()
+    while len(v_characters) < p_length:
+        v_characters += p_random.randbytes(p_length).translate(v_table, v_drop)
+
+    return v_characters[:p_length].decode('ascii')
+
+
+# ----------------------------------------------------
+# Get text slab
+# ----------------------------------------------------
+def get_text_slab(p_choices):
+
+    # slab is refilled once it served slab_reuse times its size, so the data
+    # does not visibly repeat; in seeded run every file starts from the slab
+    # filled from the seed of the run, and one chunk of it is refilled from the
+    # seed of the file once it served slab_reuse times the chunk size, so the
+    # data is the same in every process and still does not visibly repeat
+    v_slab = g_text_slabs.get(p_choices)
+    if g_seed != None:
+        v_chunk_size = g_text_source['slab_size'] // g_text_slab_chunks
+        if v_slab == None:
+            if p_choices not in g_text_slab_bases:
+                g_text_slab_bases[p_choices] = get_random_characters(p_choices, g_text_source['slab_size'], random.Random('{}:{}'.format(g_seed, p_choices)))
+            v_slab = {"text": g_text_slab_bases[p_choices], "served": 0, "refills": 0}
+            g_text_slabs[p_choices] = v_slab
+        elif v_slab['served'] >= v_chunk_size * g_text_source['slab_reuse']:
+            v_offset = (v_slab['refills'] % g_text_slab_chunks) * v_chunk_size
+            v_chunk = get_random_characters(p_choices, v_chunk_size, random.Random('{}:{}:{}'.format(g_text_slab_seed, p_choices, v_slab['refills'])))
+            v_slab = {"text": v_slab['text'][:v_offset] + v_chunk + v_slab['text'][v_offset+v_chunk_size:], "served": 0, "refills": v_slab['refills'] + 1}
+            g_text_slabs[p_choices] = v_slab
+    elif v_slab == None or v_slab['served'] >= len(v_slab['text']) * g_text_source['slab_reuse']:
+        v_slab = {"text": get_random_characters(p_choices, g_text_source['slab_size']), "served": 0}
+        g_text_slabs[p_choices] = v_slab
+
+    return v_slab
+
+
+# ----------------------------------------------------
+# Get random text
+# ----------------------------------------------------
+def get_random_text(p_choices, p_min_length, p_max_length):
+
+    if g_text_source['type'] != 'slab':
+        return get_random_string(p_choices, p_min_length, p_max_length)
+
+    # cut text of random length at random offset of the slab
+    v_slab = get_text_slab(p_choices)
+    v_length = random.randrange(p_min_length,p_max_length+1)
+    v_offset = random.randrange(0,len(v_slab['text'])-v_length+1)
+    v_slab['served'] = v_slab['served'] + v_length
+
+    return v_slab['text'][v_offset:v_offset+v_length]
+
+
+# ----------------------------------------------------
+# Initialize seed
+# ----------------------------------------------------
+def initialize_seed(p_params):
+
+    global g_seed, g_text_slab_seed, g_text_slab_bases
+    g_seed = p_params['seed']
+    g_text_slab_seed = g_seed
+    g_text_slab_bases = {}
+
+
+# ----------------------------------------------------
+# Seed file
+# ----------------------------------------------------
+def seed_file(p_seed):
+
+    # every file of seeded run is generated from its own seed, so its content
+    # does not depend on the process or the order in which files are generated;
+    # text slabs start again from the slabs filled from the seed of the run
+    global g_numpy_random, g_numpy_seed, g_text_slab_seed
+    random.seed(p_seed)
+    g_text_slab_seed = p_seed
+    g_text_slabs.clear()
+    g_numpy_seed = int.from_bytes(hashlib.sha256(p_seed.encode('utf-8')).digest()[0:8], 'little')
+    g_numpy_random = None
+
+
+# ----------------------------------------------------
+# Seed counts
+# ----------------------------------------------------
+def seed_counts(p_params, p_seed):
+
+    # document and line counts of planned file are drawn from their own
+    # generator, so the plan and the scheduler know them without generating the file
+    global g_counts_random
+    if (p_params['execute'] or p_params['schedule'] == 'size') and p_seed != None:
+        g_counts_random = random.Random('{}:counts'.format(p_seed))
+    else:
+        g_counts_random = None
+
+
+# ----------------------------------------------------
+# Get document id
+# ----------------------------------------------------
+def get_document_id():
+
+    # uuid4() does not use the random state, so seeded run draws the identifier
+    if g_seed == None:
+        return str(uuid.uuid4())
+    else:
+        return str(uuid.UUID(int=random.getrandbits(128), version=4))
+
+
 # ----------------------------------------------------
 # Get random integer
 # ----------------------------------------------------
@@ -256,6 +982,17 @@ def get_random_integer(p_min_length, p_max_length):
     return random.randrange(p_min_length,p_max_length+1)
 
 
+# ----------------------------------------------------
+# Get random count of documents or lines
+# ----------------------------------------------------
+def get_random_count(p_min, p_max):
+
+    if g_counts_random == None:
+        return get_random_integer(p_min, p_max)
+    else:
+        return g_counts_random.randrange(p_min, p_max+1)
+
+
 # ----------------------------------------------------
 # Get random number
 # ----------------------------------------------------
@@ -270,35 +1007,25 @@ def get_random_timestamp(p_date):
     return datetime.datetime(year=p_date.year,month=p_date.month,day=p_date.day,hour=get_random_integer(0,23),minute=get_random_integer(0,59),second=get_random_integer(0,59))
 
 
-# ----------------------------------------------------
-# Get random crdr code
-# ----------------------------------------------------
-def get_random_crdr():
-    return random.choices(['CR','DR'],k=1)[0]
-
-
 # ----------------------------------------------------
 # Get random currency code
 # ----------------------------------------------------
-def get_random_currency_code():
-    return random.choices(['EUR','EUR','EUR','USD','USD','USD','GBP','CHF','JPY'],k=1)[0]
+def get_random_currency_code(p_currencies):
+    return random.choices(p_currencies,k=1)[0]
 
 
 # ----------------------------------------------------
 # Get random country
 # ----------------------------------------------------
-def get_random_country():
-    return random.choices(['France','Italy','Spain','Germany','Netherlands','Belgium','Switzerland','Portugal','Poland','Norway','Denmark','Sweden','Finland','Czechia','Austria','United Kingdom','United States','Japan'],k=1)[0]
+def get_random_country(p_countries):
+    return random.choices(p_countries,k=1)[0]
 
 
 # ----------------------------------------------------
 # Get random tax
 # ----------------------------------------------------
-def get_random_tax():
-    v_tax_pct = random.choices([0,15,20,25],k=1)[0]
-    v_tax_code = 'VAT' + str(v_tax_pct)
-    v_tax_desc = str(v_tax_pct) + '%' + ' VAT'
-    return (v_tax_pct, v_tax_code, v_tax_desc)
+def get_random_tax(p_taxes):
+    return random.choices(p_taxes,k=1)[0]
 
 
 # ----------------------------------------------------
@@ -312,36 +1039,25 @@ def get_random_discount():
 # ----------------------------------------------------
 # Get random product
 # ----------------------------------------------------
-def get_random_product():
-    v_product_number = get_random_integer(1,2000)
-    v_product_code = 'P{0:04}'.format(v_product_number)
-    v_product_desc = v_product_code * 20
-    return (v_product_number, v_product_code, v_product_desc)
+def get_random_product(p_products):
+    return random.choice(p_products)
 
 
 # ----------------------------------------------------
-# Generate invoice
+# Generate invoice line values
 # ----------------------------------------------------
-def get_invoice(p_date, p_minlines, p_maxlines):
-
-    # initialize
-    v_total_base_amount = 0
-    v_total_discount_amount = 0
-    v_total_tax_amount = 0
-    v_total_net_amount = 0
-    v_invoice_date = p_date
-    v_due_date = v_invoice_date + datetime.timedelta(days=60)
-    v_tax_lines = {}
+def get_invoice_line_values(p_line_count):
 
-    # generate lines
-    v_lines = []
-    v_line_count = get_random_integer(p_minlines, p_maxlines)
+    # products and taxes are looked up in reference tables
+    v_reference = get_reference_data()
+    v_products = v_reference['products']
+    v_taxes = v_reference['taxes']
 
-    for v_line_number in range(1,v_line_count+1):
+    # lines are generated one at a time as tuples of values in order of get_invoice_line_fields()
+    for v_line_number in range(1,p_line_count+1):
 
-        # generate line
-        (v_product_number, v_product_code, v_product_desc) = get_random_product()
-        (v_tax_pct, v_tax_code, v_tax_desc) = get_random_tax()
+        (v_product_number, v_product_code, v_product_desc) = get_random_product(v_products)
+        (v_tax_pct, v_tax_code, v_tax_desc) = get_random_tax(v_taxes)
 
         v_line_quantity = get_random_integer(1,1000)
         v_line_unit_price = get_random_number(0.5,100,2)
@@ -351,180 +1067,4456 @@ def get_invoice(p_date, p_minlines, p_maxlines):
         v_line_tax_amount = round(v_line_discount_amount * v_tax_pct/100,2)
         v_line_net_amount = v_line_discount_amount + v_line_tax_amount
 
-        v_line = {
-            "line_number": v_line_number,
-            "product_code": v_product_code,
-            "product_desc": v_product_desc,
-            "quantity": v_line_quantity,
-            "unit_price": v_line_unit_price,
-            "base_amount": v_line_base_amount,
-            "discount_pct": v_line_discount_pct,
-            "discount_amount": v_line_discount_amount,
-            "tax_code": v_tax_code,
-            "tax_pct": v_tax_pct,
-            "tax_amount": v_line_tax_amount,
-            "net_amount": v_line_net_amount,
-            "comment": get_random_string(string.ascii_lowercase+' ',20,200).strip().capitalize()
-        }
+        yield (
+            v_line_number,
+            v_product_code,
+            v_product_desc,
+            v_line_quantity,
+            v_line_unit_price,
+            v_line_base_amount,
+            v_line_discount_pct,
+            v_line_discount_amount,
+            v_tax_code,
+            v_tax_pct,
+            v_line_tax_amount,
+            v_line_net_amount,
+            get_random_text(string.ascii_lowercase+' ',20,200).strip().capitalize()
+        )
 
-        v_lines.append(v_line)
 
-        # save totals
-        v_total_base_amount = v_total_base_amount + v_line_base_amount 
-        v_total_discount_amount = v_total_discount_amount + v_line_discount_amount
-        v_total_tax_amount = v_total_tax_amount + v_line_tax_amount 
-        v_total_net_amount = v_total_net_amount + v_line_net_amount 
+# ----------------------------------------------------
+# Generate invoice lines
+# ----------------------------------------------------
+def get_invoice_lines(p_line_count):
 
-        # save taxes
-        if v_tax_code not in v_tax_lines:
-            v_tax_lines[v_tax_code] = {"tax_code": v_tax_code, "tax_pct": v_tax_pct, "tax_desc": v_tax_desc, "tax_amount": v_line_tax_amount}
-        else:
-            v_tax_lines[v_tax_code] = {"tax_code": v_tax_code, "tax_pct": v_tax_pct, "tax_desc": v_tax_desc, "tax_amount": v_tax_lines[v_tax_code]["tax_amount"] + v_line_tax_amount}
+    v_lines = list(get_invoice_line_values(p_line_count))
+    (v_tax_array, v_totals) = get_invoice_totals(v_lines)
 
-    # generate tax lines
-    v_tax_array = []
-    for v_tax_code in v_tax_lines:
-        v_tax_array.append(v_tax_lines[v_tax_code])
+    return v_lines, v_tax_array, v_totals
 
-    # generate comments
-    v_comments = []
-    v_comment_count = get_random_integer(1, 10)
 
-    for v_comment_number in range(1,v_comment_count+1):
+# ----------------------------------------------------
+# Get numpy random generator
+# ----------------------------------------------------
+def get_numpy_random():
 
-        v_comment = {
-            "comment_number": v_comment_number,
-            "comment_text": get_random_string(string.ascii_lowercase+' ',20,200).strip().capitalize()
-        }
+    # numpy is optional and imported only when the numpy engine is used
+    global g_numpy, g_numpy_random
+    if g_numpy_random == None:
+        import numpy
+        g_numpy = numpy
+        g_numpy_random = numpy.random.default_rng(g_numpy_seed)
 
-        v_comments.append(v_comment)
+    return g_numpy_random
 
-    # generate invoice
-    v_invoice = {
-        "detail": {
-            "document_id": str(uuid.uuid4()),
-            "invoice_number": get_random_string(string.ascii_uppercase+string.digits,20,20),
-            "purchase_order": get_random_string(string.ascii_uppercase+string.digits,20,20),
-            "contract_number": get_random_string(string.ascii_uppercase+string.digits,20,20),
-            "currency_code": get_random_currency_code(),
-            "invoice_date": v_invoice_date.isoformat(),
-            "due_date": v_due_date.isoformat(),
-            "created_timestamp": get_random_timestamp(v_invoice_date).isoformat(),
-        },
-        "customer": {
-            "customer_number": get_random_string(string.ascii_uppercase+string.digits,20,20),
-            "name": get_random_string(string.ascii_lowercase+' ',20,200).strip().capitalize(),
-            "addresses": [
-                {
-                    "address_type": "BILL",
-                    "contact_name": get_random_string(string.ascii_lowercase+' ',20,120).strip().capitalize(),
-                    "address_detail": get_random_string(string.ascii_lowercase+string.digits+' ',20,200).strip().capitalize(),
-                    "zip_code": str(get_random_integer(10000,99999)),
-                    "city_name": get_random_string(string.ascii_lowercase+' ',20,100).strip().capitalize(),
-                    "country_name": get_random_country()
-                },
-                {
-                    "address_type": "SHIP",
-                    "contact_name": get_random_string(string.ascii_lowercase+' ',20,120).strip().capitalize(),
-                    "address_detail": get_random_string(string.ascii_lowercase+string.digits+' ',20,200).strip().capitalize(),
-                    "zip_code": str(get_random_integer(10000,99999)),
-                    "city_name": get_random_string(string.ascii_lowercase+' ',20,100).strip().capitalize(),
-                    "country_name": get_random_country()
-                }
-            ]
-        },
-        "total": {
-            "base_amount": round(v_total_base_amount,2),
-            "discount_amount": round(v_total_discount_amount,2),
-            "tax_amount": round(v_total_tax_amount,2),
-            "net_amount": round(v_total_net_amount,2)
-        },
-        "tax_lines": v_tax_array,
-        "lines": v_lines,
-        "comments": v_comments
-    }
 
-    return v_invoice, v_line_count
+# ----------------------------------------------------
+# Get random strings with numpy
+# ----------------------------------------------------
+def get_random_strings_numpy(p_choices, p_min_length, p_max_length, p_count):
+
+    # all strings are drawn as one block of characters and then sliced
+    v_random = get_numpy_random()
+    v_choices = g_numpy.frombuffer(p_choices.encode('ascii'), dtype=g_numpy.uint8)
+    v_lengths = v_random.integers(p_min_length, p_max_length+1, p_count)
+    v_text = v_choices[v_random.integers(0, len(v_choices), int(v_lengths.sum()))].tobytes().decode('ascii')
+
+    v_strings = []
+    v_offset = 0
+    for v_length in v_lengths.tolist():
+        v_strings.append(v_text[v_offset:v_offset+v_length])
+        v_offset = v_offset + v_length
+
+    return v_strings
 
 
 # ----------------------------------------------------
-# Get content
+# Generate invoice lines with numpy
 # ----------------------------------------------------
-def get_content(p_params, p_date):
+def get_invoice_lines_numpy(p_line_count):
 
-    v_content = ''
-    v_document_counter = 0
-    v_line_counter = 0
+    # all lines are drawn as columns, with the same distributions as get_invoice_lines()
+    v_random = get_numpy_random()
 
-    v_record_count = get_random_integer(p_params['mindocs'], p_params['maxdocs'])
+    v_reference = get_reference_data()
+    v_products = v_reference['products']
+    v_tax_pcts = g_numpy.array([v_tax[0] for v_tax in v_reference['taxes']])
+    v_discount_pcts = g_numpy.array([0,0,0,0,0,0,0,0,0,0,5,5,10,15,20])
 
-    for v_current_record in range(1,v_record_count+1):
+    v_product_index = v_random.integers(0, len(v_products), p_line_count)
+    v_tax_index = v_random.integers(0, len(v_tax_pcts), p_line_count)
+    v_tax_pct = v_tax_pcts[v_tax_index]
+    v_quantity = v_random.integers(1, 1001, p_line_count)
+    v_unit_price = g_numpy.round(v_random.uniform(0.5, 100, p_line_count), 2)
+    v_discount_pct = v_discount_pcts[v_random.integers(0, len(v_discount_pcts), p_line_count)]
+    v_base_amount = g_numpy.round(v_quantity * v_unit_price, 2)
+    v_discount_amount = g_numpy.round(v_base_amount * (100-v_discount_pct)/100, 2)
+    v_tax_amount = g_numpy.round(v_discount_amount * v_tax_pct/100, 2)
+    v_net_amount = v_discount_amount + v_tax_amount
+    v_comments = get_random_strings_numpy(string.ascii_lowercase+' ', 20, 200, p_line_count)
 
-        (v_record, v_line_count) = get_invoice(p_date, p_params['minlines'], p_params['maxlines'])
+    # product and tax codes are looked up in reference tables
+    v_tax_codes = {v_tax[0]: v_tax[1] for v_tax in v_reference['taxes']}
 
-        if (v_current_record > 1):
-            v_content = v_content + "\n"
+    # generate lines as tuples of values in order of get_invoice_line_fields()
+    v_product_values = [v_products[v_index] for v_index in v_product_index.tolist()]
+    v_tax_pct_values = v_tax_pct.tolist()
+
+    v_lines = list(zip(
+        range(1,p_line_count+1),
+        [v_product[1] for v_product in v_product_values],
+        [v_product[2] for v_product in v_product_values],
+        v_quantity.tolist(),
+        v_unit_price.tolist(),
+        v_base_amount.tolist(),
+        v_discount_pct.tolist(),
+        v_discount_amount.tolist(),
+        [v_tax_codes[v_pct] for v_pct in v_tax_pct_values],
+        v_tax_pct_values,
+        v_tax_amount.tolist(),
+        v_net_amount.tolist(),
+        [v_comment.strip().capitalize() for v_comment in v_comments]
+    ))
+
+    # generate tax lines in order of first occurrence
+    v_tax_totals = g_numpy.bincount(v_tax_index, weights=v_tax_amount, minlength=len(v_tax_pcts))
+    (v_tax_indexes, v_tax_first_lines) = g_numpy.unique(v_tax_index, return_index=True)
+
+    v_tax_array = []
+    for v_index in v_tax_indexes[g_numpy.argsort(v_tax_first_lines)].tolist():
+        (v_pct, v_code, v_desc) = v_reference['taxes'][v_index]
+        v_tax_array.append((v_code, v_pct, v_desc, float(v_tax_totals[v_index])))
 
-        v_content = v_content + json.dumps(v_record)
-        v_document_counter = v_document_counter + 1
-        v_line_counter = v_line_counter + v_line_count
+    v_totals = (float(v_base_amount.sum()), float(v_discount_amount.sum()), float(v_tax_amount.sum()), float(v_net_amount.sum()))
 
-    return v_content, v_document_counter, v_line_counter, len(v_content)
+    return v_lines, v_tax_array, v_totals
 
 
 # ----------------------------------------------------
-# STORAGE FUNCTIONS
+# Get invoice line fields
 # ----------------------------------------------------
+def get_invoice_line_fields():
+    return ('line_number', 'product_code', 'product_desc', 'quantity', 'unit_price', 'base_amount', 'discount_pct', 'discount_amount', 'tax_code', 'tax_pct', 'tax_amount', 'net_amount', 'comment')
+
 
 # ----------------------------------------------------
-# Get file name
+# Generate invoice values
 # ----------------------------------------------------
-def get_file_name(p_params, p_date, p_files_count, p_current_file):
+def get_invoice_values(p_date, p_minlines, p_maxlines, p_engine='python'):
 
-    v_current_timestamp = datetime.datetime.now()
-    v_file_name = p_params['pattern']
-    v_file_name = v_file_name.replace('${date}',p_date.strftime('%Y%0m%0d'))
-    v_file_name = v_file_name.replace('${time}',v_current_timestamp.strftime('%H%M%S'))
+    # generate lines
+    v_line_count = get_random_count(p_minlines, p_maxlines)
+
+    if p_engine == 'numpy':
+        (v_lines, v_tax_array, v_totals) = get_invoice_lines_numpy(v_line_count)
+    else:
+        (v_lines, v_tax_array, v_totals) = get_invoice_lines(v_line_count)
+
+    return get_invoice_header_values(p_date, v_lines, v_line_count, v_tax_array, v_totals)
+
+
+# ----------------------------------------------------
+# Generate invoice header values
+# ----------------------------------------------------
+def get_invoice_header_values(p_date, p_lines, p_line_count, p_tax_array, p_totals):
+
+    # initialize
+    v_invoice_date = p_date
+    v_due_date = v_invoice_date + datetime.timedelta(days=60)
+
+    # generate comments
+    v_comments = []
+    v_comment_count = get_random_integer(1, 10)
+
+    for v_comment_number in range(1,v_comment_count+1):
+        v_comments.append((v_comment_number, get_random_text(string.ascii_lowercase+' ',20,200).strip().capitalize()))
+
+    # generate header, values are drawn in order of fields in the invoice
+    v_values = {
+        "document_id": get_document_id(),
+        "invoice_number": get_random_string(string.ascii_uppercase+string.digits,20,20),
+        "purchase_order": get_random_string(string.ascii_uppercase+string.digits,20,20),
+        "contract_number": get_random_string(string.ascii_uppercase+string.digits,20,20),
+        "currency_code": get_random_currency_code(get_reference_data()['currencies']),
+        "invoice_date": v_invoice_date.isoformat(),
+        "due_date": v_due_date.isoformat(),
+        "created_timestamp": get_random_timestamp(v_invoice_date).isoformat()
+    }
+
+    (v_values['customer_number'], v_values['name'], v_values['addresses']) = get_random_customer()
+    v_values['totals'] = tuple(round(v_total,2) for v_total in p_totals)
+    v_values['tax_lines'] = p_tax_array
+    v_values['lines'] = p_lines
+    v_values['comments'] = v_comments
+    v_values['line_count'] = p_line_count
+
+    return v_values
+
+
+# ----------------------------------------------------
+# Get random state
+# ----------------------------------------------------
+def get_random_state():
+
+    # text slabs are copied with their served counters, so text cut from a
+    # slab, and slab refills, are drawn again the same way after set_random_state()
+    return (random.getstate(), {v_choices: dict(v_slab) for (v_choices, v_slab) in g_text_slabs.items()})
+
+
+# ----------------------------------------------------
+# Set random state
+# ----------------------------------------------------
+def set_random_state(p_state):
+
+    (v_state, v_slabs) = p_state
+    random.setstate(v_state)
+    g_text_slabs.clear()
+    g_text_slabs.update({v_choices: dict(v_slab) for (v_choices, v_slab) in v_slabs.items()})
+
+
+# ----------------------------------------------------
+# Generate streamed invoice values
+# ----------------------------------------------------
+def get_streamed_invoice_values(p_date, p_minlines, p_maxlines):
+
+    # totals and tax lines precede the lines in the invoice, so lines are drawn
+    # twice from the same random state: first only to accumulate totals, then
+    # again one at a time while they are serialized; lines are never held in
+    # memory and the invoice is the same as from get_invoice_values()
+    v_line_count = get_random_count(p_minlines, p_maxlines)
+    v_lines_state = get_random_state()
+    (v_tax_array, v_totals) = get_invoice_totals(get_invoice_line_values(v_line_count))
+
+    v_values = get_invoice_header_values(p_date, None, v_line_count, v_tax_array, v_totals)
+    v_values['lines'] = get_replayed_invoice_lines(v_lines_state, get_random_state(), v_line_count)
+
+    return v_values
+
+
+# ----------------------------------------------------
+# Generate replayed invoice lines
+# ----------------------------------------------------
+def get_replayed_invoice_lines(p_lines_state, p_end_state, p_line_count):
+
+    # random state after the invoice is restored once all lines are replayed,
+    # so the lines must be consumed before the next invoice is generated
+    set_random_state(p_lines_state)
+    yield from get_invoice_line_values(p_line_count)
+    set_random_state(p_end_state)
+
+
+# ----------------------------------------------------
+# Generate invoice
+# ----------------------------------------------------
+def get_invoice(p_date, p_minlines, p_maxlines, p_engine='python'):
+
+    v_values = get_invoice_values(p_date, p_minlines, p_maxlines, p_engine)
+    return get_invoice_from_values(v_values), v_values['line_count']
+
+
+# ----------------------------------------------------
+# Generate invoice from values
+# ----------------------------------------------------
+def get_invoice_from_values(p_values):
+
+    v_values = p_values
+    v_line_fields = get_invoice_line_fields()
+    (v_total_base_amount, v_total_discount_amount, v_total_tax_amount, v_total_net_amount) = v_values['totals']
+
+    # generate invoice
+    v_invoice = {
+        "detail": {
+            "document_id": v_values['document_id'],
+            "invoice_number": v_values['invoice_number'],
+            "purchase_order": v_values['purchase_order'],
+            "contract_number": v_values['contract_number'],
+            "currency_code": v_values['currency_code'],
+            "invoice_date": v_values['invoice_date'],
+            "due_date": v_values['due_date'],
+            "created_timestamp": v_values['created_timestamp'],
+        },
+        "customer": {
+            "customer_number": v_values['customer_number'],
+            "name": v_values['name'],
+            "addresses": [
+                {
+                    "address_type": v_address[0],
+                    "contact_name": v_address[1],
+                    "address_detail": v_address[2],
+                    "zip_code": v_address[3],
+                    "city_name": v_address[4],
+                    "country_name": v_address[5]
+                } for v_address in v_values['addresses']
+            ]
+        },
+        "total": {
+            "base_amount": v_total_base_amount,
+            "discount_amount": v_total_discount_amount,
+            "tax_amount": v_total_tax_amount,
+            "net_amount": v_total_net_amount
+        },
+        "tax_lines": [
+            {"tax_code": v_tax[0], "tax_pct": v_tax[1], "tax_desc": v_tax[2], "tax_amount": v_tax[3]} for v_tax in v_values['tax_lines']
+        ],
+        "lines": [dict(zip(v_line_fields, v_line)) for v_line in v_values['lines']],
+        "comments": [
+            {"comment_number": v_comment[0], "comment_text": v_comment[1]} for v_comment in v_values['comments']
+        ]
+    }
+
+    return v_invoice
+
+
+# ----------------------------------------------------
+# REFERENCE DATA FUNCTIONS
+# ----------------------------------------------------
+
+# ----------------------------------------------------
+# Get product table
+# ----------------------------------------------------
+def get_product_table(p_count):
+
+    v_products = []
+    for v_product_number in range(1, p_count+1):
+        v_product_code = 'P{0:04}'.format(v_product_number)
+        v_products.append((v_product_number, v_product_code, v_product_code * 20))
+
+    return v_products
+
+
+# ----------------------------------------------------
+# Get new customer
+# ----------------------------------------------------
+def get_new_customer(p_random_text):
+
+    # values are drawn in order of fields in the invoice
+    v_customer_number = get_random_string(string.ascii_uppercase+string.digits,20,20)
+    v_name = p_random_text(string.ascii_lowercase+' ',20,200).strip().capitalize()
+
+    v_addresses = []
+    for v_address_type in ('BILL', 'SHIP'):
+        v_addresses.append((
+            v_address_type,
+            p_random_text(string.ascii_lowercase+' ',20,120).strip().capitalize(),
+            p_random_text(string.ascii_lowercase+string.digits+' ',20,200).strip().capitalize(),
+            str(get_random_integer(10000,99999)),
+            p_random_text(string.ascii_lowercase+' ',20,100).strip().capitalize(),
+            get_random_country(get_reference_data()['countries'])
+        ))
+
+    return (v_customer_number, v_name, v_addresses)
+
+
+# ----------------------------------------------------
+# Get customer pool
+# ----------------------------------------------------
+def get_customer_pool(p_count, p_skew, p_seed):
+
+    # pool is generated from its own seed without text slabs, so all processes
+    # and shards of the run have the same customers; runs without seed share
+    # one pool, and the random state of documents is not changed
+    v_state = random.getstate()
+    random.seed('{}:customers'.format(p_seed))
+    try:
+        v_customers = [get_new_customer(get_random_string) for v_rank in range(p_count)]
+    finally:
+        random.setstate(v_state)
+
+    # customer of rank N is drawn with weight 1/N^skew
+    if p_skew > 0:
+        v_cum_weights = list(itertools.accumulate(1 / v_rank ** p_skew for v_rank in range(1, p_count+1)))
+    else:
+        v_cum_weights = None
+
+    return {"customers": v_customers, "cum_weights": v_cum_weights}
+
+
+# ----------------------------------------------------
+# Initialize reference data
+# ----------------------------------------------------
+def initialize_reference_data(p_params):
+
+    # forked workers inherit reference data of the parent, so it is built again
+    # only if it was built for other parameters
+    global g_reference
+    v_key = (p_params['products'], p_params['customers'], p_params['customerskew'], p_params['seed'])
+    if g_reference != None and g_reference['key'] == v_key:
+        return
+
+    # weighted choices are tables with repeated values, so draws stay the same as with literal lists
+    g_reference = {
+        "key": v_key,
+        "products": get_product_table(p_params['products']),
+        "taxes": [(v_tax_pct, 'VAT' + str(v_tax_pct), str(v_tax_pct) + '%' + ' VAT') for v_tax_pct in (0,15,20,25)],
+        "currencies": ['EUR','EUR','EUR','USD','USD','USD','GBP','CHF','JPY'],
+        "countries": ['France','Italy','Spain','Germany','Netherlands','Belgium','Switzerland','Portugal','Poland','Norway','Denmark','Sweden','Finland','Czechia','Austria','United Kingdom','United States','Japan'],
+        "customers": None
+    }
+
+    if p_params['customers'] > 0:
+        g_reference['customers'] = get_customer_pool(p_params['customers'], p_params['customerskew'], p_params['seed'])
+
+
+# ----------------------------------------------------
+# Get reference data
+# ----------------------------------------------------
+def get_reference_data():
+
+    # default tables are built on first use, like in benchmarks
+    if g_reference == None:
+        initialize_reference_data({'products': 2000, 'customers': 0, 'customerskew': 0.0, 'seed': None})
+
+    return g_reference
+
+
+# ----------------------------------------------------
+# Get random customer
+# ----------------------------------------------------
+def get_random_customer():
+
+    v_pool = get_reference_data()['customers']
+    if v_pool == None:
+        return get_new_customer(get_random_text)
+    elif v_pool['cum_weights'] == None:
+        return random.choice(v_pool['customers'])
+    else:
+        return random.choices(v_pool['customers'], cum_weights=v_pool['cum_weights'], k=1)[0]
+
+
+# ----------------------------------------------------
+# Get dimension rows
+# ----------------------------------------------------
+def get_dimension_rows(p_name):
+
+    v_reference = get_reference_data()
+
+    if p_name == 'products':
+        return [{"product_number": v_product[0], "product_code": v_product[1], "product_desc": v_product[2]} for v_product in v_reference['products']]
+    elif p_name == 'taxes':
+        return [{"tax_code": v_tax[1], "tax_pct": v_tax[0], "tax_desc": v_tax[2]} for v_tax in v_reference['taxes']]
+    elif p_name == 'currencies':
+        v_counts = collections.Counter(v_reference['currencies'])
+        return [{"currency_code": v_code, "weight": round(v_count / len(v_reference['currencies']), 4)} for (v_code, v_count) in v_counts.items()]
+    elif p_name == 'countries':
+        return [{"country_name": v_country} for v_country in v_reference['countries']]
+
+    # customers are in order of rank, with their share of invoices
+    v_pool = v_reference['customers']
+    if v_pool['cum_weights'] == None:
+        v_weights = [1 / len(v_pool['customers'])] * len(v_pool['customers'])
+    else:
+        v_total = v_pool['cum_weights'][-1]
+        v_weights = [(v_weight - v_previous) / v_total for (v_previous, v_weight) in zip([0] + v_pool['cum_weights'][:-1], v_pool['cum_weights'])]
+
+    return [
+        {
+            "customer_number": v_customer[0],
+            "name": v_customer[1],
+            "addresses": [
+                {
+                    "address_type": v_address[0],
+                    "contact_name": v_address[1],
+                    "address_detail": v_address[2],
+                    "zip_code": v_address[3],
+                    "city_name": v_address[4],
+                    "country_name": v_address[5]
+                } for v_address in v_customer[2]
+            ],
+            "weight": v_weight
+        } for (v_customer, v_weight) in zip(v_pool['customers'], v_weights)
+    ]
+
+
+# ----------------------------------------------------
+# Write dimensions
+# ----------------------------------------------------
+def write_dimensions(p_params, p_sink):
+
+    # dimensions are written as JSON Lines without compression, by the first shard only
+    if p_params['dimensions'] == None or p_params['shard'][0] != 0:
+        return []
+
+    v_names = ['products', 'taxes', 'currencies', 'countries']
+    if get_reference_data()['customers'] != None:
+        v_names.append('customers')
+
+    v_object_names = []
+    for v_name in v_names:
+        v_object_name = '{}/{}.json'.format(p_params['dimensions'], v_name)
+        v_content = ''.join(json.dumps(v_row) + '\n' for v_row in get_dimension_rows(v_name)).encode('utf-8')
+        write_file(dict(p_params, scenario='json', compress='none'), v_content, p_sink, v_object_name)
+        g_logger.info('Dimension {} written to {}'.format(v_name, v_object_name))
+        v_object_names.append(v_object_name)
+
+    return v_object_names
+
+
+# ----------------------------------------------------
+# SERIALIZATION FUNCTIONS
+# ----------------------------------------------------
+
+# ----------------------------------------------------
+# Get invoice templates
+# ----------------------------------------------------
+def get_invoice_templates():
+
+    # templates produce the same text as json.dumps() of the invoice from get_invoice();
+    # strings are passed already quoted, floats are formatted by repr() as in json
+    return {
+        "invoice": (
+            '{"detail": {"document_id": %s, "invoice_number": %s, "purchase_order": %s, "contract_number": %s, '
+            '"currency_code": %s, "invoice_date": %s, "due_date": %s, "created_timestamp": %s}, '
+            '"customer": {"customer_number": %s, "name": %s, "addresses": [%s]}, '
+            '"total": {"base_amount": %r, "discount_amount": %r, "tax_amount": %r, "net_amount": %r}, '
+            '"tax_lines": [%s], "lines": [%s], "comments": [%s]}'
+        ),
+        "address": '{"address_type": %s, "contact_name": %s, "address_detail": %s, "zip_code": %s, "city_name": %s, "country_name": %s}',
+        "tax_line": '{"tax_code": %s, "tax_pct": %d, "tax_desc": %s, "tax_amount": %r}',
+        "line": (
+            '{"line_number": %d, "product_code": %s, "product_desc": %s, "quantity": %d, "unit_price": %r, '
+            '"base_amount": %r, "discount_pct": %d, "discount_amount": %r, "tax_code": %s, "tax_pct": %d, '
+            '"tax_amount": %r, "net_amount": %r, "comment": %s}'
+        ),
+        "comment": '{"comment_number": %d, "comment_text": %s}',
+        "change": '{"op": %s, "version": %d, "changed_timestamp": %s, "document_id": %s, "document": %s}'
+    }
+
+
+# ----------------------------------------------------
+# Generate invoice as JSON
+# ----------------------------------------------------
+def get_invoice_json(p_date, p_minlines, p_maxlines, p_engine='python'):
+
+    v_values = get_invoice_values(p_date, p_minlines, p_maxlines, p_engine)
+    return get_invoice_json_from_values(v_values), v_values['line_count']
+
+
+# ----------------------------------------------------
+# Generate invoice as JSON from values
+# ----------------------------------------------------
+def get_invoice_json_from_values(p_values):
+
+    # values are written to templates directly, without building invoice dictionaries
+    v_values = p_values
+    v_templates = get_invoice_templates()
+    v_quote = encode_basestring_ascii
+
+    v_lines = get_invoice_lines_json(v_templates['line'], v_values['lines'])
+
+    v_tax_lines = ', '.join([
+        v_templates['tax_line'] % (v_quote(v_tax[0]), v_tax[1], v_quote(v_tax[2]), v_tax[3])
+        for v_tax in v_values['tax_lines']
+    ])
+
+    v_addresses = ', '.join([
+        v_templates['address'] % tuple(v_quote(v_value) for v_value in v_address)
+        for v_address in v_values['addresses']
+    ])
+
+    v_comments = ', '.join([
+        v_templates['comment'] % (v_comment[0], v_quote(v_comment[1]))
+        for v_comment in v_values['comments']
+    ])
+
+    v_invoice = v_templates['invoice'] % (
+        v_quote(v_values['document_id']),
+        v_quote(v_values['invoice_number']),
+        v_quote(v_values['purchase_order']),
+        v_quote(v_values['contract_number']),
+        v_quote(v_values['currency_code']),
+        v_quote(v_values['invoice_date']),
+        v_quote(v_values['due_date']),
+        v_quote(v_values['created_timestamp']),
+        v_quote(v_values['customer_number']),
+        v_quote(v_values['name']),
+        v_addresses,
+        v_values['totals'][0],
+        v_values['totals'][1],
+        v_values['totals'][2],
+        v_values['totals'][3],
+        v_tax_lines,
+        v_lines,
+        v_comments
+    )
+
+    return v_invoice
+
+
+# ----------------------------------------------------
+# Generate invoice lines as JSON
+# ----------------------------------------------------
+def get_invoice_lines_json(p_line_template, p_lines):
+
+    v_quote = encode_basestring_ascii
+
+    return ', '.join([
+        p_line_template % (v_line[0], v_quote(v_line[1]), v_quote(v_line[2]), v_line[3], v_line[4], v_line[5], v_line[6], v_line[7], v_quote(v_line[8]), v_line[9], v_line[10], v_line[11], v_quote(v_line[12]))
+        for v_line in p_lines
+    ])
+
+
+# ----------------------------------------------------
+# Generate invoice as JSON chunks
+# ----------------------------------------------------
+def get_invoice_json_chunks(p_values, p_batch_lines):
+
+    # invoice without lines is split where the lines belong; quotes in text
+    # fields are escaped, so '"lines": []' occurs only as the key of lines
+    (v_head, v_separator, v_tail) = get_invoice_json_from_values(dict(p_values, lines=[])).partition('"lines": []')
+    v_line_template = get_invoice_templates()['line']
+    v_lines = iter(p_values['lines'])
+
+    yield v_head + '"lines": ['
+
+    v_batch = list(itertools.islice(v_lines, p_batch_lines))
+    if len(v_batch) > 0:
+        yield get_invoice_lines_json(v_line_template, v_batch)
+
+    while len(v_batch) > 0:
+        v_batch = list(itertools.islice(v_lines, p_batch_lines))
+        if len(v_batch) > 0:
+            yield ', ' + get_invoice_lines_json(v_line_template, v_batch)
+
+    yield ']' + v_tail
+
+
+# ----------------------------------------------------
+# Get documents
+# ----------------------------------------------------
+def get_documents(p_params, p_date, p_counters, p_changes=None):
+
+    if p_params['targetsize'] != None:
+        yield from get_sized_documents(p_params, p_date, p_counters)
+        return
+    elif p_params['scenario'] == 'cdc':
+        yield from get_change_documents(p_params, p_date, p_counters, p_changes)
+        return
+
+    # time of generating values and of serializing them is added to counters
+    v_schema = get_compiled_schema(p_params['schema']) if p_params['schema'] != None else None
+    v_record_count = get_random_count(p_params['mindocs'], p_params['maxdocs'])
+
+    for v_current_record in range(1,v_record_count+1):
+        v_start = time.perf_counter()
+        if v_schema != None:
+            (v_values, v_line_count) = v_schema['generate'](p_date, p_params)
+        elif p_params['streamlines'] > 0:
+            v_values = get_streamed_invoice_values(p_date, p_params['minlines'], p_params['maxlines'])
+            v_line_count = v_values['line_count']
+        else:
+            v_values = get_invoice_values(p_date, p_params['minlines'], p_params['maxlines'], p_params['engine'])
+            v_line_count = v_values['line_count']
+        v_generated = time.perf_counter()
+
+        # streamed document is serialized by templates while it is written
+        if v_schema != None:
+            v_document = v_schema['serialize'](v_values)
+        elif p_params['streamlines'] > 0:
+            v_document = get_streamed_document(get_invoice_json_chunks(v_values, p_params['streamlines']), p_counters)
+        else:
+            v_document = get_invoice_document(p_params, v_values)
+
+        if p_params['docindex'] != None:
+            add_document_index_insert(p_counters, p_date, v_values)
+
+        p_counters['generate_sec'] = p_counters['generate_sec'] + v_generated - v_start
+        p_counters['serialize_sec'] = p_counters['serialize_sec'] + time.perf_counter() - v_generated
+        yield (v_document, v_line_count)
+
+
+# ----------------------------------------------------
+# Get invoice document
+# ----------------------------------------------------
+def get_invoice_document(p_params, p_values):
+
+    if p_params['serializer'] == 'template':
+        return get_invoice_json_from_values(p_values)
+    else:
+        return json.dumps(get_invoice_from_values(p_values))
+
+
+# ----------------------------------------------------
+# Get streamed document
+# ----------------------------------------------------
+def get_streamed_document(p_chunks, p_counters):
+
+    # lines of streamed document are generated while they are serialized,
+    # so time of producing the chunks is counted as serialization
+    v_chunks = iter(p_chunks)
+    while True:
+        v_start = time.perf_counter()
+        v_chunk = next(v_chunks, None)
+        p_counters['serialize_sec'] = p_counters['serialize_sec'] + time.perf_counter() - v_start
+        if v_chunk == None:
+            break
+        yield v_chunk
+
+
+# ----------------------------------------------------
+# Get content counters
+# ----------------------------------------------------
+def get_content_counters():
+    return {"document_count": 0, "line_count": 0, "size_bytes": 0, "compressed_bytes": 0, "content_sec": 0.0, "generate_sec": 0.0, "serialize_sec": 0.0, "compress_sec": 0.0, "throttle_sec": 0.0, "target_bytes": 0, "index_changes": None, "md5": None, "hash": None}
+
+
+# ----------------------------------------------------
+# Get timed chunks
+# ----------------------------------------------------
+def get_timed_chunks(p_params, p_chunks, p_counters):
+
+    # measures time of producing the chunks, without time of consuming them;
+    # time not spent by generating and serializing documents is spent by
+    # compression, or by encoding when the content is not compressed, and by checksums
+    v_chunks = iter(p_chunks)
+    while True:
+        v_start = time.perf_counter()
+        v_chunk = next(v_chunks, None)
+        p_counters['content_sec'] = p_counters['content_sec'] + time.perf_counter() - v_start
+        if v_chunk == None:
+            break
+        yield v_chunk
+
+    v_other_sec = max(p_counters['content_sec'] - p_counters['generate_sec'] - p_counters['serialize_sec'], 0.0)
+    if p_params['compress'] != 'none' and p_params['scenario'] != 'parquet':
+        p_counters['compress_sec'] = v_other_sec
+    else:
+        p_counters['serialize_sec'] = p_counters['serialize_sec'] + v_other_sec
+
+
+# ----------------------------------------------------
+# Get content chunks
+# ----------------------------------------------------
+def get_content_chunks(p_params, p_date, p_counters, p_changes=None):
+
+    if p_params['scenario'] == 'parquet':
+        return get_parquet_chunks(p_params, p_date, p_counters)
+    elif p_params['corpus'] != None:
+        return get_corpus_chunks(p_params, p_date, p_counters)
+    else:
+        return get_json_chunks(p_params, p_date, p_counters, p_changes)
+
+
+# ----------------------------------------------------
+# Get json chunks
+# ----------------------------------------------------
+def get_json_chunks(p_params, p_date, p_counters, p_changes=None):
+
+    # content is emitted as encoded bytes one document at a time, so the
+    # size in counters is exactly the number of bytes written
+    for (v_document, v_line_count) in get_documents(p_params, p_date, p_counters, p_changes):
+
+        if p_counters['document_count'] > 0:
+            p_counters['size_bytes'] = p_counters['size_bytes'] + 1
+            yield b'\n'
+
+        # streamed document is emitted in chunks as they are serialized
+        if isinstance(v_document, str):
+            v_document = (v_document,)
+
+        for v_part in v_document:
+            v_chunk = v_part.encode('utf-8')
+            p_counters['size_bytes'] = p_counters['size_bytes'] + len(v_chunk)
+            yield v_chunk
+
+        p_counters['document_count'] = p_counters['document_count'] + 1
+        p_counters['line_count'] = p_counters['line_count'] + v_line_count
+
+
+# ----------------------------------------------------
+# Get content
+# ----------------------------------------------------
+def get_content(p_params, p_date, p_seed=None, p_changes=None):
+
+    if p_seed != None:
+        seed_file(p_seed)
+    seed_counts(p_params, p_seed)
+
+    v_counters = get_content_counters()
+    v_content = b''.join(get_timed_chunks(p_params, get_checksum_chunks(p_params, compress_chunks(p_params, get_content_chunks(p_params, p_date, v_counters, p_changes), v_counters), v_counters), v_counters))
+
+    return v_content, v_counters
+
+
+# ----------------------------------------------------
+# Get content parts
+# ----------------------------------------------------
+def get_content_parts(p_params, p_date, p_counters, p_seed=None, p_changes=None):
+
+    # documents are generated while parts are consumed, so only the current
+    # part is kept in memory; counters are complete once the last part is consumed
+    if p_seed != None:
+        seed_file(p_seed)
+    seed_counts(p_params, p_seed)
+
+    v_part_size = p_params['partsize'] * 1024 * 1024
+    v_part = bytearray()
+    v_part_count = 0
+
+    for v_chunk in get_timed_chunks(p_params, get_checksum_chunks(p_params, compress_chunks(p_params, get_content_chunks(p_params, p_date, p_counters, p_changes), p_counters), p_counters), p_counters):
+        v_part += v_chunk
+        while len(v_part) >= v_part_size:
+            v_part_count = v_part_count + 1
+            yield bytes(v_part[:v_part_size])
+            del v_part[:v_part_size]
+
+    if len(v_part) > 0 or v_part_count == 0:
+        yield bytes(v_part)
+
+
+# ----------------------------------------------------
+# Split content to parts
+# ----------------------------------------------------
+def split_content(p_content, p_part_size):
+
+    for v_offset in range(0, max(len(p_content),1), p_part_size):
+        yield p_content[v_offset:v_offset+p_part_size]
+
+
+# ----------------------------------------------------
+# SCHEMA FUNCTIONS
+# ----------------------------------------------------
+
+# ----------------------------------------------------
+# Schema error
+# ----------------------------------------------------
+class SchemaError(Exception):
+    pass
+
+
+# ----------------------------------------------------
+# Get schema option
+# ----------------------------------------------------
+def get_schema_option(p_field, p_option, p_types, p_default=None):
+
+    v_value = p_field.get(p_option, p_default)
+    if v_value == None:
+        raise SchemaError('Field "{}" is missing option "{}"'.format(p_field.get('name'), p_option))
+    if not isinstance(v_value, p_types) or isinstance(v_value, bool):
+        raise SchemaError('Field "{}" has option "{}" of wrong type'.format(p_field.get('name'), p_option))
+
+    return v_value
+
+
+# ----------------------------------------------------
+# Get schema variable
+# ----------------------------------------------------
+def get_schema_variable(p_compiler, p_prefix, p_value=None):
+
+    # constants are passed to the compiled code as variables of its namespace
+    p_compiler['counter'] = p_compiler['counter'] + 1
+    v_variable = '_{}{}'.format(p_prefix, p_compiler['counter'])
+    if p_prefix == 'c':
+        p_compiler['namespace'][v_variable] = p_value
+
+    return v_variable
+
+
+# ----------------------------------------------------
+# Get schema kind
+# ----------------------------------------------------
+def get_schema_kind(p_values):
+
+    # kind decides how the value is serialized: strings are quoted, numbers are
+    # formatted by repr() as in json, other values are passed to json.dumps()
+    if all(isinstance(v_value, str) for v_value in p_values):
+        return 'string'
+    elif all(isinstance(v_value, (int, float)) and not isinstance(v_value, bool) for v_value in p_values):
+        return 'number'
+    else:
+        return 'any'
+
+
+# ----------------------------------------------------
+# Get schema name
+# ----------------------------------------------------
+def get_schema_name(p_scopes, p_field_name, p_name):
+
+    if p_name == 'date':
+        return 'p_date'
+
+    for v_scope in reversed(p_scopes):
+        if p_name in ('index', 'item') and v_scope[p_name] != None:
+            return v_scope[p_name]
+        elif p_name in v_scope['fields']:
+            return v_scope['fields'][p_name]['variable']
+
+    if p_name in g_schema_builtins:
+        return p_name
+
+    raise SchemaError('Field "{}" uses unknown name "{}"'.format(p_field_name, p_name))
+
+
+# ----------------------------------------------------
+# Get schema expression
+# ----------------------------------------------------
+def get_schema_expression(p_scopes, p_field):
+
+    # names of fields are replaced by variables of the compiled code
+    v_expression = get_schema_option(p_field, 'expression', str)
+    try:
+        v_tree = ast.parse(v_expression, mode='eval')
+    except SyntaxError as e:
+        raise SchemaError('Field "{}" has invalid expression: {}'.format(p_field['name'], e.msg))
+
+    # attributes would reach objects behind the values, like __class__ of a string
+    for v_node in ast.walk(v_tree):
+        if isinstance(v_node, ast.Attribute):
+            raise SchemaError('Field "{}" uses attribute "{}", expressions may use only fields and functions'.format(p_field['name'], v_node.attr))
+        elif isinstance(v_node, ast.Name) and v_node.id.startswith('__'):
+            raise SchemaError('Field "{}" uses unknown name "{}"'.format(p_field['name'], v_node.id))
+        elif isinstance(v_node, ast.Name):
+            v_node.id = get_schema_name(p_scopes, p_field['name'], v_node.id)
+
+    return ast.unparse(v_tree)
+
+
+# ----------------------------------------------------
+# Get schema array field
+# ----------------------------------------------------
+def get_schema_array_field(p_scopes, p_field, p_option):
+
+    v_array_name = get_schema_option(p_field, p_option, str)
+    for v_scope in reversed(p_scopes):
+        if v_array_name in v_scope['fields'] and v_scope['fields'][v_array_name]['kind'] == 'array':
+            return v_scope['fields'][v_array_name]
+
+    raise SchemaError('Field "{}" refers to unknown array "{}"'.format(p_field['name'], v_array_name))
+
+
+# ----------------------------------------------------
+# Get schema element position
+# ----------------------------------------------------
+def get_schema_element_position(p_field, p_array, p_name):
+
+    for (v_position, (v_name, v_info)) in enumerate(p_array['element']['fields']):
+        if v_name == p_name:
+            return (v_position, v_info)
+
+    raise SchemaError('Field "{}" refers to unknown field "{}" of array "{}"'.format(p_field['name'], p_name, p_array['field']['name']))
+
+
+# ----------------------------------------------------
+# Compile schema array
+# ----------------------------------------------------
+def compile_schema_array(p_compiler, p_scopes, p_field, p_variable, p_indent):
+
+    # count is drawn before the elements; it is a range of integers or of
+    # parameters, like minlines and maxlines, or the list of items
+    v_lines = p_compiler['lines']
+    v_index = get_schema_variable(p_compiler, 'i')
+    v_item = None
+    v_lines.append(p_indent + '{} = []'.format(p_variable))
+
+    if 'items' in p_field:
+        v_items = get_schema_variable(p_compiler, 'c', tuple(get_schema_option(p_field, 'items', list)))
+        v_item = get_schema_variable(p_compiler, 't')
+        v_lines.append(p_indent + 'for {}, {} in enumerate({}, 1):'.format(v_index, v_item, v_items))
+    else:
+        v_count = get_schema_option(p_field, 'count', list)
+        if len(v_count) != 2 or not all(isinstance(v_value, (int, str)) for v_value in v_count):
+            raise SchemaError('Field "{}" must have count as [MIN, MAX] of integers or parameter names'.format(p_field['name']))
+        (v_min, v_max) = [repr(v_value) if isinstance(v_value, int) else 'p_params[{!r}]'.format(v_value) for v_value in v_count]
+        v_lines.append(p_indent + 'for {} in range(1, _randrange({}, {} + 1) + 1):'.format(v_index, v_min, v_max))
+
+    p_scopes.append({"fields": {}, "index": v_index, "item": v_item})
+    v_fields = compile_schema_fields(p_compiler, p_scopes, get_schema_option(p_field, 'fields', list), p_indent + '    ')
+    p_scopes.pop()
+
+    v_lines.append(p_indent + '    {}.append(({},))'.format(p_variable, ', '.join([v_info['variable'] for (v_name, v_info) in v_fields])))
+
+    return {"fields": v_fields, "layout": p_field.get('layout')}
+
+
+# ----------------------------------------------------
+# Compile schema group
+# ----------------------------------------------------
+def compile_schema_group(p_compiler, p_scopes, p_field, p_variable, p_indent):
+
+    # elements of the array are grouped by key in order of first occurrence;
+    # aggregates start with the value of the first element and are summed in order
+    v_lines = p_compiler['lines']
+    v_array = get_schema_array_field(p_scopes, p_field, 'array')
+    (v_key_position, v_key_info) = get_schema_element_position(p_field, v_array, get_schema_option(p_field, 'key', str))
+    v_groups = get_schema_variable(p_compiler, 'g')
+    v_element = get_schema_variable(p_compiler, 'e')
+    v_group = get_schema_variable(p_compiler, 'a')
+
+    v_fields = []
+    v_first_values = []
+    v_sums = []
+
+    for (v_position, v_aggregate) in enumerate(get_schema_option(p_field, 'fields', list)):
+        v_name = get_schema_option(v_aggregate, 'name', str)
+        v_function = v_aggregate.get('aggregate', 'first')
+        if v_function == 'count':
+            v_first_values.append('1')
+            v_sums.append((v_position, '1'))
+            v_fields.append((v_name, {"variable": None, "kind": 'number', "field": v_aggregate, "element": None}))
+            continue
+        (v_source_position, v_source_info) = get_schema_element_position(p_field, v_array, v_aggregate.get('field', v_name))
+        if v_function == 'first':
+            v_fields.append((v_name, {"variable": None, "kind": v_source_info['kind'], "field": v_aggregate, "element": v_source_info['element']}))
+        elif v_function == 'sum':
+            v_sums.append((v_position, '{}[{}]'.format(v_element, v_source_position)))
+            v_fields.append((v_name, {"variable": None, "kind": 'number', "field": v_aggregate, "element": None}))
+        else:
+            raise SchemaError('Field "{}" has unknown aggregate "{}"'.format(v_name, v_function))
+        v_first_values.append('{}[{}]'.format(v_element, v_source_position))
+
+    v_lines.append(p_indent + '{} = {{}}'.format(v_groups))
+    v_lines.append(p_indent + 'for {} in {}:'.format(v_element, v_array['variable']))
+    v_lines.append(p_indent + '    {} = {}.get({}[{}])'.format(v_group, v_groups, v_element, v_key_position))
+    v_lines.append(p_indent + '    if {} is None:'.format(v_group))
+    v_lines.append(p_indent + '        {}[{}[{}]] = [{}]'.format(v_groups, v_element, v_key_position, ', '.join(v_first_values)))
+    if len(v_sums) > 0:
+        v_lines.append(p_indent + '    else:')
+        for (v_position, v_value) in v_sums:
+            v_lines.append(p_indent + '        {0}[{1}] = {0}[{1}] + {2}'.format(v_group, v_position, v_value))
+    v_lines.append(p_indent + '{} = [tuple({}) for {} in {}.values()]'.format(p_variable, v_group, v_group, v_groups))
+
+    return {"fields": v_fields, "layout": p_field.get('layout')}
+
+
+# ----------------------------------------------------
+# Compile schema field
+# ----------------------------------------------------
+def compile_schema_field(p_compiler, p_scopes, p_field, p_indent):
+
+    # values are drawn by the same functions as get_invoice_values(), so the
+    # invoice schema draws the same random values in the same order
+    v_type = p_field.get('type')
+    v_variable = get_schema_variable(p_compiler, 'f')
+    v_info = {"variable": v_variable, "kind": 'string', "field": p_field, "element": None}
+
+    if v_type == 'integer':
+        v_code = '_randrange({!r}, {!r})'.format(get_schema_option(p_field, 'min', int), get_schema_option(p_field, 'max', int) + 1)
+        v_info['kind'] = 'number'
+    elif v_type == 'number':
+        v_code = 'round(_uniform({!r}, {!r}), {!r})'.format(get_schema_option(p_field, 'min', (int, float)), get_schema_option(p_field, 'max', (int, float)), get_schema_option(p_field, 'digits', int, 2))
+        v_info['kind'] = 'number'
+    elif v_type in ('string', 'text'):
+        v_alphabet = get_schema_option(p_field, 'alphabet', str)
+        if len(v_alphabet) == 0 or not v_alphabet.isascii():
+            raise SchemaError('Field "{}" must have alphabet of ASCII characters'.format(p_field['name']))
+        v_arguments = '{!r}, {!r}, {!r}'.format(v_alphabet, get_schema_option(p_field, 'min_length', int), get_schema_option(p_field, 'max_length', int))
+        if v_type == 'string':
+            v_code = '_get_random_string({})'.format(v_arguments)
+        else:
+            v_code = '_get_random_text({}).strip().capitalize()'.format(v_arguments)
+    elif v_type == 'enum':
+        v_values = get_schema_option(p_field, 'values', list)
+        v_weights = p_field.get('weights')
+        if len(v_values) == 0 or (v_weights != None and len(v_weights) != len(v_values)):
+            raise SchemaError('Field "{}" must have values, and the same number of weights'.format(p_field['name']))
+        # integer weights draw the same values as population with values repeated
+        # by weight, which is drawn faster than population with weights
+        if v_weights == None:
+            v_code = '_choices({}, k=1)[0]'.format(get_schema_variable(p_compiler, 'c', v_values))
+        elif all(isinstance(v_weight, int) and v_weight >= 0 for v_weight in v_weights) and sum(v_weights) <= 1000:
+            v_code = '_choices({}, k=1)[0]'.format(get_schema_variable(p_compiler, 'c', [v_value for (v_value, v_weight) in zip(v_values, v_weights) for v_count in range(v_weight)]))
+        else:
+            v_code = '_choices({}, cum_weights={}, k=1)[0]'.format(get_schema_variable(p_compiler, 'c', v_values), get_schema_variable(p_compiler, 'c', list(itertools.accumulate(v_weights))))
+        v_info['kind'] = get_schema_kind(v_values)
+    elif v_type == 'constant':
+        v_value = p_field.get('value')
+        v_code = get_schema_variable(p_compiler, 'c', v_value)
+        v_info['kind'] = get_schema_kind([v_value])
+    elif v_type == 'uuid':
+        v_code = '_get_document_id()'
+    elif v_type == 'date' and get_schema_option(p_field, 'offset_days', int, 0) != 0:
+        v_code = '(p_date + _timedelta(days={!r})).isoformat()'.format(p_field['offset_days'])
+    elif v_type == 'date':
+        v_code = 'p_date.isoformat()'
+    elif v_type == 'timestamp':
+        v_code = '_get_random_timestamp(p_date).isoformat()'
+    elif v_type == 'sequence':
+        v_code = get_schema_name(p_scopes, p_field['name'], 'index')
+        v_info['kind'] = 'number'
+    elif v_type == 'expression':
+        v_code = get_schema_expression(p_scopes, p_field)
+        v_info['kind'] = p_field.get('json', 'any')
+        if v_info['kind'] not in ('string', 'number', 'any'):
+            raise SchemaError('Field "{}" must have json of string, number or any'.format(p_field['name']))
+    elif v_type == 'sum':
+        v_array = get_schema_array_field(p_scopes, p_field, 'array')
+        (v_position, v_source_info) = get_schema_element_position(p_field, v_array, get_schema_option(p_field, 'field', str))
+        v_code = 'sum([_e[{}] for _e in {}])'.format(v_position, v_array['variable'])
+        if 'digits' in p_field:
+            v_code = 'round({}, {!r})'.format(v_code, get_schema_option(p_field, 'digits', int))
+        v_info['kind'] = 'number'
+    elif v_type == 'array':
+        v_info['element'] = compile_schema_array(p_compiler, p_scopes, p_field, v_variable, p_indent)
+        v_info['kind'] = 'array'
+        return v_info
+    elif v_type == 'group':
+        v_info['element'] = compile_schema_group(p_compiler, p_scopes, p_field, v_variable, p_indent)
+        v_info['kind'] = 'array'
+        return v_info
+    else:
+        raise SchemaError('Field "{}" has unknown type "{}"'.format(p_field.get('name'), v_type))
+
+    # any value can be formatted to string, like zip code from integer
+    if 'format' in p_field:
+        v_code = '{!r}.format({})'.format(get_schema_option(p_field, 'format', str), v_code)
+        v_info['kind'] = 'string'
+
+    p_compiler['lines'].append(p_indent + '{} = {}'.format(v_variable, v_code))
+
+    return v_info
+
+
+# ----------------------------------------------------
+# Compile schema fields
+# ----------------------------------------------------
+def compile_schema_fields(p_compiler, p_scopes, p_fields, p_indent):
+
+    # fields are generated in order of definition, and may refer to fields
+    # generated before them in the same element or in enclosing elements
+    v_scope = p_scopes[-1]
+    v_fields = []
+
+    for v_field in p_fields:
+        v_name = v_field.get('name') if isinstance(v_field, dict) else None
+        if not isinstance(v_name, str) or not v_name.isidentifier() or v_name in ('date', 'index', 'item'):
+            raise SchemaError('Field "{}" must have name, which is identifier other than date, index and item'.format(v_name))
+        if v_name in v_scope['fields']:
+            raise SchemaError('Field "{}" is defined more than once'.format(v_name))
+        v_info = compile_schema_field(p_compiler, p_scopes, v_field, p_indent)
+        v_scope['fields'][v_name] = v_info
+        v_fields.append((v_name, v_info))
+
+    return v_fields
+
+
+# ----------------------------------------------------
+# Get schema template
+# ----------------------------------------------------
+def get_schema_template(p_compiler, p_fields, p_layout, p_element):
+
+    # layout maps keys of the document to fields, or to nested objects; values
+    # are written to template, as in get_invoice_templates(); fields of document
+    # are variables, fields of array elements are items of element tuple
+    if p_layout == None:
+        p_layout = [v_name for (v_name, v_info) in p_fields if not v_info['field'].get('hidden', False)]
+    if isinstance(p_layout, list):
+        p_layout = {v_name: v_name for v_name in p_layout}
+    if not isinstance(p_layout, dict):
+        raise SchemaError('Layout must be object of keys mapped to fields or nested objects')
+
+    v_positions = {v_name: (v_position, v_info) for (v_position, (v_name, v_info)) in enumerate(p_fields)}
+    v_parts = []
+    v_arguments = []
+
+    for (v_key, v_value) in p_layout.items():
+        v_part = json.dumps(v_key).replace('%', '%%') + ': '
+
+        if isinstance(v_value, dict):
+            (v_template, v_nested_arguments) = get_schema_template(p_compiler, p_fields, v_value, p_element)
+            v_parts.append(v_part + v_template)
+            v_arguments.extend(v_nested_arguments)
+            continue
+
+        if not isinstance(v_value, str) or v_value not in v_positions:
+            raise SchemaError('Layout key "{}" refers to unknown field "{}"'.format(v_key, v_value))
+
+        (v_position, v_info) = v_positions[v_value]
+        v_reference = v_info['variable'] if p_element == None else '{}[{}]'.format(p_element, v_position)
+
+        if v_info['kind'] == 'string':
+            v_parts.append(v_part + '%s')
+            v_arguments.append('_quote({})'.format(v_reference))
+        elif v_info['kind'] == 'number':
+            v_parts.append(v_part + '%r')
+            v_arguments.append(v_reference)
+        elif v_info['kind'] == 'array':
+            v_element = get_schema_variable(p_compiler, 'e')
+            (v_template, v_element_arguments) = get_schema_template(p_compiler, v_info['element']['fields'], v_info['element']['layout'], v_element)
+            v_parts.append(v_part + '[%s]')
+            v_arguments.append("', '.join([{} % ({},) for {} in {}])".format(get_schema_variable(p_compiler, 'c', v_template), ', '.join(v_element_arguments), v_element, v_reference))
+        else:
+            v_parts.append(v_part + '%s')
+            v_arguments.append('_dumps({})'.format(v_reference))
+
+    return ('{' + ', '.join(v_parts) + '}', v_arguments)
+
+
+# ----------------------------------------------------
+# Compile schema
+# ----------------------------------------------------
+def compile_schema(p_schema):
+
+    # schema is compiled to source code of two functions: generate() draws
+    # values of one document as tuple, serialize() writes the tuple to JSON
+    if not isinstance(p_schema, dict) or not isinstance(p_schema.get('fields'), list) or len(p_schema['fields']) == 0:
+        raise SchemaError('Schema must be object with non-empty list of fields')
+
+    v_compiler = {
+        "counter": 0,
+        "lines": ['def generate(p_date, p_params):'],
+        "namespace": {
+            "_randrange": random.randrange,
+            "_uniform": random.uniform,
+            "_choices": random.choices,
+            "_get_random_string": get_random_string,
+            "_get_random_text": get_random_text,
+            "_get_document_id": get_document_id,
+            "_get_random_timestamp": get_random_timestamp,
+            "_timedelta": datetime.timedelta,
+            "_quote": encode_basestring_ascii,
+            "_dumps": json.dumps
+        }
+    }
+
+    v_fields = compile_schema_fields(v_compiler, [{"fields": {}, "index": None, "item": None}], p_schema['fields'], '    ')
+    v_variables = ', '.join([v_info['variable'] for (v_name, v_info) in v_fields])
+
+    # documents count as lines the elements of line_array, like lines of invoice
+    v_line_array = p_schema.get('line_array')
+    v_line_count = '0'
+    for (v_name, v_info) in v_fields:
+        if v_name == v_line_array and v_info['kind'] == 'array':
+            v_line_count = 'len({})'.format(v_info['variable'])
+    if v_line_array != None and v_line_count == '0':
+        raise SchemaError('Line array "{}" is not array field of the document'.format(v_line_array))
+
+    (v_template, v_arguments) = get_schema_template(v_compiler, v_fields, p_schema.get('layout'), None)
+
+    v_lines = v_compiler['lines']
+    v_lines.append('    return (({},), {})'.format(v_variables, v_line_count))
+    v_lines.append('')
+    v_lines.append('def serialize(p_values):')
+    v_lines.append('    ({},) = p_values'.format(v_variables))
+    v_lines.append('    return {} % ({},)'.format(get_schema_variable(v_compiler, 'c', v_template), ', '.join(v_arguments)))
+
+    v_source = '\n'.join(v_lines) + '\n'
+    v_namespace = v_compiler['namespace']
+    v_namespace['__builtins__'] = {v_name: getattr(builtins, v_name) for v_name in g_schema_code_builtins}
+    exec(compile(v_source, '<schema {}>'.format(p_schema.get('name', '')), 'exec'), v_namespace)
+
+    return {
+        "name": p_schema.get('name'),
+        "source": v_source,
+        "generate": v_namespace['generate'],
+        "serialize": v_namespace['serialize']
+    }
+
+
+# ----------------------------------------------------
+# Get compiled schema
+# ----------------------------------------------------
+def get_compiled_schema(p_file_name):
+
+    # schema is compiled once in every process, forked workers inherit it
+    v_compiled = g_schemas.get(p_file_name)
+    if v_compiled == None:
+        try:
+            with open(p_file_name) as v_file:
+                v_schema = json.load(v_file)
+        except (OSError, ValueError) as e:
+            raise SchemaError('Schema cannot be read: {}'.format(e))
+        v_compiled = compile_schema(v_schema)
+        g_schemas[p_file_name] = v_compiled
+
+    return v_compiled
+
+
+# ----------------------------------------------------
+# TARGET SIZE FUNCTIONS
+# ----------------------------------------------------
+
+# ----------------------------------------------------
+# Get sized documents
+# ----------------------------------------------------
+def get_sized_documents(p_params, p_date, p_counters):
+
+    # documents are added while another one fits into the target size, with line
+    # counts estimated from bytes per line of the documents generated so far; the
+    # last document gets lines for the remaining bytes less margin, and is fitted
+    # to them exactly by its text fields, so no line is generated and dropped
+    (v_min_size, v_max_size) = p_params['targetsize']
+    v_target_bytes = get_random_integer(v_min_size, v_max_size)
+    p_counters['target_bytes'] = v_target_bytes
+
+    # size of invoice without lines varies with number and length of comments,
+    # so margin is left for the last document
+    v_estimate = dict(g_invoice_estimate, margin_bytes=2000, lines=0, lines_bytes=0)
+    v_size = 0
+    v_last = False
+
+    while not v_last:
+
+        v_remaining = v_target_bytes - v_size - (1 if v_size > 0 else 0)
+
+        # the last document is generated when another document with at least
+        # minlines would not leave enough bytes for it, with margin for both
+        v_available = v_remaining - 1 - get_estimated_size(v_estimate, p_params['minlines']) - 2 * v_estimate['margin_bytes']
+
+        if v_remaining <= get_estimated_size(v_estimate, p_params['maxlines']) or v_available < get_estimated_size(v_estimate, p_params['minlines']):
+            v_last = True
+            v_line_count = get_estimated_line_count(v_estimate, v_remaining - v_estimate['margin_bytes'])
+        else:
+            v_line_count = min(get_random_integer(p_params['minlines'], p_params['maxlines']), get_estimated_line_count(v_estimate, v_available))
+
+        v_start = time.perf_counter()
+        v_values = get_invoice_values(p_date, v_line_count, v_line_count, p_params['engine'])
+        v_generated = time.perf_counter()
+
+        # templates produce the same text as the dict serializer
+        if v_last:
+            v_document = fit_invoice_values(v_values, v_remaining)
+        elif p_params['serializer'] == 'template':
+            v_document = get_invoice_json_from_values(v_values)
+        else:
+            v_document = json.dumps(get_invoice_from_values(v_values))
+
+        p_counters['generate_sec'] = p_counters['generate_sec'] + v_generated - v_start
+        p_counters['serialize_sec'] = p_counters['serialize_sec'] + time.perf_counter() - v_generated
+
+        # bytes per line are estimated only from documents where lines outweigh the header
+        if not v_last and v_line_count >= 20:
+            v_estimate['lines'] = v_estimate['lines'] + v_line_count
+            v_estimate['lines_bytes'] = v_estimate['lines_bytes'] + max(len(v_document) - v_estimate['header_bytes'], 0)
+            v_estimate['line_bytes'] = max(v_estimate['lines_bytes'] / v_estimate['lines'], 1.0)
+
+        v_size = v_size + len(v_document) + (1 if v_size > 0 else 0)
+        yield (v_document, v_values['line_count'])
+
+
+# ----------------------------------------------------
+# Get estimated size
+# ----------------------------------------------------
+def get_estimated_size(p_estimate, p_line_count):
+    return p_estimate['header_bytes'] + p_estimate['line_bytes'] * p_line_count
+
+
+# ----------------------------------------------------
+# Get estimated line count
+# ----------------------------------------------------
+def get_estimated_line_count(p_estimate, p_size):
+    return max(int((p_size - p_estimate['header_bytes']) / p_estimate['line_bytes']), 0)
+
+
+# ----------------------------------------------------
+# Get invoice totals
+# ----------------------------------------------------
+def get_invoice_totals(p_lines):
+
+    # totals and tax lines are accumulated in order of lines, so the
+    # lines may be generated while they are accumulated
+    v_total_base_amount = 0
+    v_total_discount_amount = 0
+    v_total_tax_amount = 0
+    v_total_net_amount = 0
+    v_tax_lines = {}
+
+    for v_line in p_lines:
+        v_total_base_amount = v_total_base_amount + v_line[5]
+        v_total_discount_amount = v_total_discount_amount + v_line[7]
+        v_total_tax_amount = v_total_tax_amount + v_line[10]
+        v_total_net_amount = v_total_net_amount + v_line[11]
+        v_tax_line = v_tax_lines.get(v_line[8])
+        if v_tax_line == None:
+            v_tax_lines[v_line[8]] = (v_line[8], v_line[9], str(v_line[9]) + '%' + ' VAT', v_line[10])
+        else:
+            v_tax_lines[v_line[8]] = (v_tax_line[0], v_tax_line[1], v_tax_line[2], v_tax_line[3] + v_line[10])
+
+    return list(v_tax_lines.values()), (v_total_base_amount, v_total_discount_amount, v_total_tax_amount, v_total_net_amount)
+
+
+# ----------------------------------------------------
+# Get padding text
+# ----------------------------------------------------
+def get_padding_text(p_length):
+
+    # random text of exact length, starting and ending with a letter like the stripped text fields
+    if p_length <= 2:
+        return get_random_string(string.ascii_lowercase, p_length, p_length)
+
+    return random.choice(string.ascii_lowercase) + get_random_text(string.ascii_lowercase+' ', p_length-2, p_length-2) + random.choice(string.ascii_lowercase)
+
+
+# ----------------------------------------------------
+# Get trimmed text
+# ----------------------------------------------------
+def get_trimmed_text(p_text, p_length):
+
+    # text cut to p_length ends with a letter like the stripped text fields
+    v_text = p_text[:p_length]
+    if v_text.endswith(' '):
+        v_text = v_text[:-1] + random.choice(string.ascii_lowercase)
+
+    return v_text
+
+
+# ----------------------------------------------------
+# Fit invoice values
+# ----------------------------------------------------
+def fit_invoice_values(p_values, p_size):
+
+    # the invoice is serialized once and measured by the length of its text, as the
+    # encoder escapes to ASCII; text fields need no escaping, so their length is
+    # their size in the JSON text and excess is removed by shortening them, first
+    # comments of the invoice and then comments of lines from the last one
+    v_document = get_invoice_json_from_values(p_values)
+    v_excess = len(v_document) - p_size
+    v_comment_template = get_invoice_templates()['comment']
+
+    while v_excess > 0 and len(p_values['comments']) > 1:
+        (v_number, v_text) = p_values['comments'].pop()
+        v_excess = v_excess - len(v_comment_template % (v_number, '""')) - len(v_text) - 2
+
+    v_texts = [(None, 0)] + [(v_index, 12) for v_index in range(len(p_values['lines'])-1, -1, -1)]
+    for (v_index, v_position) in v_texts:
+        if v_excess <= 0:
+            break
+        v_text = p_values['comments'][0][1] if v_index == None else p_values['lines'][v_index][v_position]
+        v_cut = min(v_excess, len(v_text) - 1)
+        if v_cut > 0:
+            v_text = get_trimmed_text(v_text, len(v_text) - v_cut)
+            if v_index == None:
+                p_values['comments'][0] = (p_values['comments'][0][0], v_text)
+            else:
+                p_values['lines'][v_index] = p_values['lines'][v_index][:v_position] + (v_text,) + p_values['lines'][v_index][v_position+1:]
+            v_excess = v_excess - v_cut
+
+    v_document = get_invoice_json_from_values(p_values)
+
+    v_gap = p_size - len(v_document)
+
+    while v_gap > 0:
+        (v_number, v_text) = p_values['comments'][-1]
+        v_overhead = len(v_comment_template % (v_number + 1, '""')) + 2
+        if len(v_text) + v_gap > 200 and v_gap >= v_overhead + 20:
+            v_length = min(get_random_integer(20,200), v_gap - v_overhead)
+            p_values['comments'].append((v_number + 1, get_padding_text(v_length).capitalize()))
+            v_gap = v_gap - v_overhead - v_length
+        elif v_gap == 1:
+            p_values['comments'][-1] = (v_number, v_text + get_padding_text(1))
+            v_gap = 0
+        else:
+            p_values['comments'][-1] = (v_number, v_text + ' ' + get_padding_text(v_gap - 1))
+            v_gap = 0
+
+    return get_invoice_json_from_values(p_values)
+
+
+# ----------------------------------------------------
+# CORPUS FUNCTIONS
+# ----------------------------------------------------
+
+# ----------------------------------------------------
+# Corpus error
+# ----------------------------------------------------
+class CorpusError(Exception):
+    pass
+
+
+# ----------------------------------------------------
+# Build corpus
+# ----------------------------------------------------
+def build_corpus(p_params):
+
+    # documents are stored as JSON Lines after the header and followed by the
+    # index; corpus of seeded run is generated from the seed, so all shards
+    # generate the same corpus
+    if p_params['seed'] != None:
+        seed_file('{}:corpus'.format(p_params['seed']))
+
+    v_records = []
+    v_temp_file_name = p_params['corpus'] + '.tmp'
+
+    with open(v_temp_file_name, 'wb') as v_file:
+        v_file.write(g_corpus_header.pack(g_corpus_magic, 1, 0, 0))
+
+        for v_number in range(p_params['corpusdocs']):
+            v_values = get_invoice_values(p_params['fromdate'], p_params['minlines'], p_params['maxlines'], p_params['engine'])
+            v_document = get_invoice_json_from_values(v_values)
+            # quotes in text fields are escaped, so the first key of the field is in the detail
+            v_offsets = [v_document.index('"{}": "'.format(v_field)) + len(v_field) + 5 for v_field in g_corpus_fields]
+            v_content = v_document.encode('utf-8')
+            v_records.append((v_file.tell(), len(v_content), v_values['line_count'], *v_offsets))
+            v_file.write(v_content + b'\n')
+
+        v_index_offset = v_file.tell()
+        for v_record in v_records:
+            v_file.write(g_corpus_record.pack(*v_record))
+
+        v_file.seek(0)
+        v_file.write(g_corpus_header.pack(g_corpus_magic, 1, len(v_records), v_index_offset))
+
+    os.replace(v_temp_file_name, p_params['corpus'])
+
+
+# ----------------------------------------------------
+# Get corpus
+# ----------------------------------------------------
+def get_corpus(p_file_name):
+
+    # corpus is mapped read-only, so forked workers share its pages with the parent
+    global g_corpus
+    if g_corpus != None and g_corpus['file_name'] == p_file_name:
+        return g_corpus
+
+    with open(p_file_name, 'rb') as v_file:
+        v_map = mmap.mmap(v_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    if len(v_map) < g_corpus_header.size:
+        raise CorpusError('file is too short')
+
+    (v_magic, v_version, v_document_count, v_index_offset) = g_corpus_header.unpack_from(v_map, 0)
+
+    if v_magic != g_corpus_magic or v_version != 1:
+        raise CorpusError('file is not a corpus of version 1')
+    elif v_document_count == 0 or v_index_offset + v_document_count * g_corpus_record.size != len(v_map):
+        raise CorpusError('index does not match the file')
+
+    g_corpus = {
+        "file_name": p_file_name,
+        "map": v_map,
+        "view": memoryview(v_map),
+        "records": list(g_corpus_record.iter_unpack(v_map[v_index_offset:]))
+    }
+
+    return g_corpus
+
+
+# ----------------------------------------------------
+# Open corpus
+# ----------------------------------------------------
+def open_corpus(p_params):
+
+    if p_params['corpus'] == None:
+        return None
+
+    if not os.path.exists(p_params['corpus']):
+        v_start = time.perf_counter()
+        build_corpus(p_params)
+        g_logger.info('Corpus {} with {} documents generated in {} sec'.format(p_params['corpus'], p_params['corpusdocs'], round(time.perf_counter() - v_start, 3)))
+
+    v_corpus = get_corpus(p_params['corpus'])
+    g_logger.info('Corpus {} with {} documents and {} bytes opened'.format(p_params['corpus'], len(v_corpus['records']), len(v_corpus['map'])))
+
+    return v_corpus
+
+
+# ----------------------------------------------------
+# Get corpus chunks
+# ----------------------------------------------------
+def get_corpus_chunks(p_params, p_date, p_counters):
+
+    # documents are drawn from the corpus and copied with new identifiers and
+    # dates written at the offsets of the index; the new values have the same
+    # width as the replaced ones, so documents are not serialized again
+    v_corpus = get_corpus(p_params['corpus'])
+    v_view = v_corpus['view']
+    v_records = v_corpus['records']
+    v_invoice_date = p_date.isoformat()
+    v_due_date = (p_date + datetime.timedelta(days=60)).isoformat()
+    v_record_count = get_random_integer(p_params['mindocs'], p_params['maxdocs'])
+
+    for v_current_record in range(1,v_record_count+1):
+
+        v_start = time.perf_counter()
+        v_record = v_records[random.randrange(len(v_records))]
+        v_offset = v_record[0]
+        v_values = (
+            get_document_id(),
+            get_random_string(string.ascii_uppercase+string.digits,20,20),
+            v_invoice_date,
+            v_due_date,
+            get_random_timestamp(p_date).isoformat()
+        )
+
+        v_parts = [b'\n'] if v_current_record > 1 else []
+        v_position = v_offset
+        for (v_field_offset, v_value) in zip(v_record[3:], v_values):
+            v_parts.append(v_view[v_position:v_offset+v_field_offset])
+            v_parts.append(v_value.encode('ascii'))
+            v_position = v_offset + v_field_offset + len(v_value)
+        v_parts.append(v_view[v_position:v_offset+v_record[1]])
+
+        v_chunk = b''.join(v_parts)
+        p_counters['generate_sec'] = p_counters['generate_sec'] + time.perf_counter() - v_start
+        p_counters['document_count'] = p_counters['document_count'] + 1
+        p_counters['line_count'] = p_counters['line_count'] + v_record[2]
+        p_counters['size_bytes'] = p_counters['size_bytes'] + len(v_chunk)
+        yield v_chunk
+
+
+# ----------------------------------------------------
+# DOCUMENT INDEX FUNCTIONS
+# ----------------------------------------------------
+
+# ----------------------------------------------------
+# Get document index record
+# ----------------------------------------------------
+def get_document_index_record(p_document_id, p_date, p_net_amount, p_line_count, p_version, p_state):
+
+    # object ordinal is set when the object is written
+    return g_document_index_record.pack(uuid.UUID(p_document_id).bytes, p_date.toordinal(), 0, p_net_amount, p_line_count, p_version, p_state)
+
+
+# ----------------------------------------------------
+# Get index changes
+# ----------------------------------------------------
+def get_index_changes(p_counters):
+
+    # changes of the index are returned with counters of the file and written
+    # to the index once the file is written
+    if p_counters['index_changes'] == None:
+        p_counters['index_changes'] = {"inserts": bytearray(), "updates": [], "inserted_count": 0, "updated_count": 0, "deleted_count": 0}
+
+    return p_counters['index_changes']
+
+
+# ----------------------------------------------------
+# Add document index insert
+# ----------------------------------------------------
+def add_document_index_insert(p_counters, p_date, p_values):
+
+    v_changes = get_index_changes(p_counters)
+    v_changes['inserts'] += get_document_index_record(p_values['document_id'], p_date, p_values['totals'][3], p_values['line_count'], 1, 1)
+    v_changes['inserted_count'] = v_changes['inserted_count'] + 1
+
+
+# ----------------------------------------------------
+# Get document index count
+# ----------------------------------------------------
+def get_document_index_count(p_directory):
+
+    v_file_name = os.path.join(p_directory, 'documents.idx')
+
+    if not os.path.exists(v_file_name):
+        return 0
+
+    return os.path.getsize(v_file_name) // g_document_index_record.size
+
+
+# ----------------------------------------------------
+# Get document index object count
+# ----------------------------------------------------
+def get_document_index_object_count(p_directory):
+
+    v_file_name = os.path.join(p_directory, 'objects.idx')
+
+    if not os.path.exists(v_file_name):
+        return 0
+
+    return os.path.getsize(v_file_name) // 8
+
+
+# ----------------------------------------------------
+# Get document index objects
+# ----------------------------------------------------
+def get_document_index_objects(p_directory, p_object_ordinal):
+
+    # names of objects from the ordinal are read from its offset in objects.txt
+    if get_document_index_object_count(p_directory) <= p_object_ordinal:
+        return []
+
+    with open(os.path.join(p_directory, 'objects.idx'), 'rb') as v_file:
+        v_file.seek(p_object_ordinal * 8)
+        (v_offset,) = struct.unpack('<Q', v_file.read(8))
+
+    with open(os.path.join(p_directory, 'objects.txt'), 'rb') as v_file:
+        v_file.seek(v_offset)
+        return [v_line.decode('utf-8').rstrip('\n') for v_line in v_file if v_line.endswith(b'\n')]
+
+
+# ----------------------------------------------------
+# Get document index view
+# ----------------------------------------------------
+def get_document_index_view(p_directory):
+
+    # index is mapped read-only with records existing when it is mapped, so
+    # sampling reads only the records it needs; it is mapped again once records
+    # are appended, so records written earlier in the same process are found
+    global g_document_index
+    v_count = get_document_index_count(p_directory)
+    if g_document_index == None or g_document_index['directory'] != p_directory or g_document_index['count'] < v_count:
+        if v_count > 0:
+            with open(os.path.join(p_directory, 'documents.idx'), 'rb') as v_file:
+                v_map = mmap.mmap(v_file.fileno(), v_count * g_document_index_record.size, access=mmap.ACCESS_READ)
+        else:
+            v_map = b''
+        g_document_index = {"directory": p_directory, "map": v_map, "count": v_count}
+
+    return g_document_index['map']
+
+
+# ----------------------------------------------------
+# Get change positions
+# ----------------------------------------------------
+def get_change_positions(p_start, p_end, p_fraction):
+
+    # every position is selected with probability p_fraction; gaps between
+    # selected positions are drawn from the geometric distribution, so the
+    # positions are drawn in order without visiting the skipped ones
+    if p_fraction <= 0:
+        return
+    elif p_fraction >= 1:
+        yield from range(p_start, p_end)
+        return
+
+    v_log = math.log(1.0 - p_fraction)
+    v_position = p_start - 1
+
+    while True:
+        v_position = v_position + 1 + int(math.log(1.0 - random.random()) / v_log)
+        if v_position >= p_end:
+            return
+        yield v_position
+
+
+# ----------------------------------------------------
+# Get change document
+# ----------------------------------------------------
+def get_change_document(p_op, p_version, p_timestamp, p_document_id, p_document):
+
+    v_quote = encode_basestring_ascii
+    return get_invoice_templates()['change'] % (v_quote(p_op), p_version, v_quote(p_timestamp), v_quote(p_document_id), p_document if p_document != None else 'null')
+
+
+# ----------------------------------------------------
+# Get change documents
+# ----------------------------------------------------
+def get_change_documents(p_params, p_date, p_counters, p_changes):
+
+    # updates and deletes of indexed documents sampled from the segment of the
+    # file are followed by inserted documents; deleted documents are skipped
+    v_index = get_document_index_view(p_params['docindex'])
+    v_changes = get_index_changes(p_counters)
+    v_fraction = p_params['updates'] + p_params['deletes']
+
+    for v_position in get_change_positions(p_changes[0], p_changes[1], v_fraction):
+
+        v_start = time.perf_counter()
+        (v_id, v_date_ordinal, v_object_ordinal, v_net_amount, v_line_count, v_version, v_state) = g_document_index_record.unpack_from(v_index, v_position * g_document_index_record.size)
+        if v_state != 1:
+            continue
+
+        v_document_id = str(uuid.UUID(bytes=v_id))
+        v_date = datetime.date.fromordinal(v_date_ordinal)
+        v_timestamp = get_random_timestamp(p_date).isoformat()
+
+        if random.random() * v_fraction < p_params['deletes']:
+            v_record = get_document_index_record(v_document_id, v_date, v_net_amount, v_line_count, v_version + 1, 2)
+            v_document = get_change_document('delete', v_version + 1, v_timestamp, v_document_id, None)
+            v_changes['deleted_count'] = v_changes['deleted_count'] + 1
+            v_line_count = 0
+        else:
+            v_values = get_invoice_values(v_date, p_params['minlines'], p_params['maxlines'], p_params['engine'])
+            v_values['document_id'] = v_document_id
+            v_record = get_document_index_record(v_document_id, v_date, v_values['totals'][3], v_values['line_count'], v_version + 1, 1)
+            v_document = get_change_document('update', v_version + 1, v_timestamp, v_document_id, get_invoice_document(p_params, v_values))
+            v_changes['updated_count'] = v_changes['updated_count'] + 1
+            v_line_count = v_values['line_count']
+
+        v_changes['updates'].append((v_position, v_record))
+        p_counters['generate_sec'] = p_counters['generate_sec'] + time.perf_counter() - v_start
+        yield (v_document, v_line_count)
+
+    # inserted documents are created at their created timestamp
+    v_record_count = get_random_integer(p_params['mindocs'], p_params['maxdocs'])
+
+    for v_current_record in range(1,v_record_count+1):
+        v_start = time.perf_counter()
+        v_values = get_invoice_values(p_date, p_params['minlines'], p_params['maxlines'], p_params['engine'])
+        v_document = get_change_document('insert', 1, v_values['created_timestamp'], v_values['document_id'], get_invoice_document(p_params, v_values))
+        add_document_index_insert(p_counters, p_date, v_values)
+        p_counters['generate_sec'] = p_counters['generate_sec'] + time.perf_counter() - v_start
+        yield (v_document, v_values['line_count'])
+
+
+# ----------------------------------------------------
+# Open document index
+# ----------------------------------------------------
+def open_document_index(p_params):
+
+    if p_params['docindex'] == None:
+        return None
+
+    # partial record or offset left by interrupted write is truncated
+    os.makedirs(p_params['docindex'], exist_ok=True)
+    v_index = {
+        "directory": p_params['docindex'],
+        "documents": os.open(os.path.join(p_params['docindex'], 'documents.idx'), os.O_RDWR | os.O_CREAT, 0o644),
+        "objects": open(os.path.join(p_params['docindex'], 'objects.txt'), 'ab'),
+        "object_offsets": os.open(os.path.join(p_params['docindex'], 'objects.idx'), os.O_RDWR | os.O_CREAT, 0o644),
+        "lock": threading.Lock(),
+        "inserted_count": 0,
+        "updated_count": 0,
+        "deleted_count": 0
+    }
+
+    v_index['document_count'] = os.fstat(v_index['documents']).st_size // g_document_index_record.size
+    os.ftruncate(v_index['documents'], v_index['document_count'] * g_document_index_record.size)
+    v_index['object_count'] = os.fstat(v_index['object_offsets']).st_size // 8
+    os.ftruncate(v_index['object_offsets'], v_index['object_count'] * 8)
+
+    g_logger.info('Document index {} with {} documents in {} objects opened'.format(p_params['docindex'], v_index['document_count'], v_index['object_count']))
+
+    return v_index
+
+
+# ----------------------------------------------------
+# Write document index
+# ----------------------------------------------------
+def write_document_index(p_index, p_object_name, p_changes):
+
+    if p_index == None or p_changes == None:
+        return
+
+    # changes are written only after the object is written, with ordinal of the object
+    with p_index['lock']:
+
+        v_object_ordinal = p_index['object_count']
+        p_index['objects'].seek(0, os.SEEK_END)
+        os.pwrite(p_index['object_offsets'], struct.pack('<Q', p_index['objects'].tell()), v_object_ordinal * 8)
+        p_index['objects'].write((p_object_name + '\n').encode('utf-8'))
+        p_index['objects'].flush()
+        p_index['object_count'] = v_object_ordinal + 1
+
+        v_ordinal = struct.pack('<I', v_object_ordinal)
+        v_inserts = p_changes['inserts']
+        for v_offset in range(20, len(v_inserts), g_document_index_record.size):
+            v_inserts[v_offset:v_offset+4] = v_ordinal
+        os.pwrite(p_index['documents'], v_inserts, p_index['document_count'] * g_document_index_record.size)
+        p_index['document_count'] = p_index['document_count'] + len(v_inserts) // g_document_index_record.size
+
+        for (v_position, v_record) in p_changes['updates']:
+            os.pwrite(p_index['documents'], v_record[:20] + v_ordinal + v_record[24:], v_position * g_document_index_record.size)
+
+        p_index['inserted_count'] = p_index['inserted_count'] + p_changes['inserted_count']
+        p_index['updated_count'] = p_index['updated_count'] + p_changes['updated_count']
+        p_index['deleted_count'] = p_index['deleted_count'] + p_changes['deleted_count']
+
+
+# ----------------------------------------------------
+# Close document index
+# ----------------------------------------------------
+def close_document_index(p_index):
+
+    if p_index == None:
+        return None
+
+    os.close(p_index['documents'])
+    os.close(p_index['object_offsets'])
+    p_index['objects'].close()
+
+    return {
+        "document_count": p_index['document_count'],
+        "object_count": p_index['object_count'],
+        "inserted_count": p_index['inserted_count'],
+        "updated_count": p_index['updated_count'],
+        "deleted_count": p_index['deleted_count']
+    }
+
+
+# ----------------------------------------------------
+# Read document keys
+# ----------------------------------------------------
+def read_document_keys(p_file):
+
+    # key records are read in blocks and yielded as bytes, which sort by document id
+    v_size = g_document_key_record.size
+    while True:
+        v_block = p_file.read(v_size * 4096)
+        if len(v_block) == 0:
+            return
+        for v_offset in range(0, len(v_block), v_size):
+            yield v_block[v_offset:v_offset+v_size]
+
+
+# ----------------------------------------------------
+# Update document keys
+# ----------------------------------------------------
+def update_document_keys(p_directory):
+
+    # keys of records appended to the index since the keys were written are
+    # sorted in chunks and merged with the sorted keys, so neither the index
+    # nor the keys are loaded into memory and records keep their positions
+    v_file_name = os.path.join(p_directory, 'documents.key')
+    v_count = get_document_index_count(p_directory)
+    v_key_count = 0
+
+    # keys are derived from the index, so key file left by interrupted update is rebuilt
+    if os.path.exists(v_file_name):
+        with open(v_file_name, 'rb') as v_file:
+            v_header = v_file.read(g_document_key_header.size)
+        if len(v_header) == g_document_key_header.size and v_header[0:8] == g_document_key_magic:
+            v_key_count = g_document_key_header.unpack(v_header)[1]
+
+    if v_key_count >= v_count:
+        return v_count
+
+    v_index = get_document_index_view(p_directory)
+    v_record_size = g_document_index_record.size
+    v_runs = []
+
+    try:
+        for v_start in range(v_key_count, v_count, g_document_key_chunk):
+            v_keys = sorted([
+                g_document_key_record.pack(v_index[v_position*v_record_size:v_position*v_record_size+16], v_position)
+                for v_position in range(v_start, min(v_start + g_document_key_chunk, v_count))
+            ])
+            v_run = tempfile.TemporaryFile(dir=p_directory)
+            v_run.write(b''.join(v_keys))
+            v_run.seek(0)
+            v_runs.append(v_run)
+
+        if v_key_count > 0:
+            v_runs.append(open(v_file_name, 'rb'))
+            v_runs[-1].seek(g_document_key_header.size)
+
+        with open(v_file_name + '.tmp', 'wb') as v_file:
+            v_file.write(g_document_key_header.pack(g_document_key_magic, v_count))
+            v_block = []
+            for v_key in heapq.merge(*[read_document_keys(v_run) for v_run in v_runs]):
+                v_block.append(v_key)
+                if len(v_block) >= 4096:
+                    v_file.write(b''.join(v_block))
+                    v_block = []
+            v_file.write(b''.join(v_block))
+    finally:
+        for v_run in v_runs:
+            v_run.close()
+
+    os.replace(v_file_name + '.tmp', v_file_name)
+    g_logger.info('Keys of {} documents added to {}'.format(v_count - v_key_count, v_file_name))
+
+    return v_count
+
+
+# ----------------------------------------------------
+# Find document key
+# ----------------------------------------------------
+def find_document_key(p_keys, p_count, p_id):
+
+    # binary search of the sorted keys, returns position of the document in the index
+    v_header_size = g_document_key_header.size
+    v_key_size = g_document_key_record.size
+    (v_low, v_high) = (0, p_count)
+
+    while v_low < v_high:
+        v_middle = (v_low + v_high) // 2
+        v_offset = v_header_size + v_middle * v_key_size
+        if p_keys[v_offset:v_offset+16] < p_id:
+            v_low = v_middle + 1
+        else:
+            v_high = v_middle
+
+    v_offset = v_header_size + v_low * v_key_size
+    if v_low < p_count and p_keys[v_offset:v_offset+16] == p_id:
+        return g_document_key_record.unpack_from(p_keys, v_offset)[1]
+
+    return None
+
+
+# ----------------------------------------------------
+# Lookup documents
+# ----------------------------------------------------
+def lookup_documents(p_directory, p_document_ids):
+
+    # index is kept in order of writes, so documents are found by binary search
+    # of its sorted keys, updated with documents written since the last lookup
+    v_count = update_document_keys(p_directory)
+    v_index = get_document_index_view(p_directory)
+    v_record_size = g_document_index_record.size
+    v_documents = []
+
+    if v_count > 0:
+        with open(os.path.join(p_directory, 'documents.key'), 'rb') as v_file:
+            v_keys = mmap.mmap(v_file.fileno(), 0, access=mmap.ACCESS_READ)
+    else:
+        v_keys = b''
+
+    with open(os.path.join(p_directory, 'objects.idx'), 'rb') as v_offsets_file, open(os.path.join(p_directory, 'objects.txt'), 'rb') as v_objects_file:
+
+        for v_document_id in p_document_ids:
+            v_position = find_document_key(v_keys, v_count, uuid.UUID(v_document_id).bytes)
+
+            if v_position == None:
+                v_documents.append({"document_id": v_document_id, "found": False})
+                continue
+
+            (v_id, v_date_ordinal, v_object_ordinal, v_net_amount, v_line_count, v_version, v_state) = g_document_index_record.unpack_from(v_index, v_position * v_record_size)
+            v_offsets_file.seek(v_object_ordinal * 8)
+            v_objects_file.seek(struct.unpack('<Q', v_offsets_file.read(8))[0])
+
+            v_documents.append({
+                "document_id": v_document_id,
+                "found": True,
+                "position": v_position,
+                "date": datetime.date.fromordinal(v_date_ordinal).isoformat(),
+                "object_name": v_objects_file.readline().decode('utf-8').rstrip('\n'),
+                "net_amount": v_net_amount,
+                "line_count": v_line_count,
+                "version": v_version,
+                "state": g_document_index_states[v_state]
+            })
+
+    return v_documents
+
+
+# ----------------------------------------------------
+# PARQUET FUNCTIONS
+# ----------------------------------------------------
+
+# ----------------------------------------------------
+# Parquet chunk sink
+# ----------------------------------------------------
+class ParquetChunkSink(io.RawIOBase):
+
+    # file object collecting bytes written by parquet writer, so they can be
+    # emitted as content chunks after every row group
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, p_data):
+        self.chunks.append(bytes(p_data))
+        self.position = self.position + len(p_data)
+        return len(p_data)
+
+    def tell(self):
+        return self.position
+
+    def drain(self):
+        v_chunks = self.chunks
+        self.chunks = []
+        return v_chunks
+
+
+# ----------------------------------------------------
+# Get parquet schema
+# ----------------------------------------------------
+def get_parquet_schema(p_layout):
+
+    # pyarrow is optional and imported only when parquet scenario is used
+    import pyarrow
+
+    v_line_fields = [
+        ('line_number', pyarrow.int32()),
+        ('product_code', pyarrow.string()),
+        ('product_desc', pyarrow.string()),
+        ('quantity', pyarrow.int32()),
+        ('unit_price', pyarrow.float64()),
+        ('base_amount', pyarrow.float64()),
+        ('discount_pct', pyarrow.int32()),
+        ('discount_amount', pyarrow.float64()),
+        ('tax_code', pyarrow.string()),
+        ('tax_pct', pyarrow.int32()),
+        ('tax_amount', pyarrow.float64()),
+        ('net_amount', pyarrow.float64()),
+        ('comment', pyarrow.string())
+    ]
+    v_detail_fields = [
+        ('document_id', pyarrow.string()),
+        ('invoice_number', pyarrow.string()),
+        ('purchase_order', pyarrow.string()),
+        ('contract_number', pyarrow.string()),
+        ('currency_code', pyarrow.string()),
+        ('invoice_date', pyarrow.date32()),
+        ('due_date', pyarrow.date32()),
+        ('created_timestamp', pyarrow.timestamp('s'))
+    ]
+    v_address_fields = [
+        ('address_type', pyarrow.string()),
+        ('contact_name', pyarrow.string()),
+        ('address_detail', pyarrow.string()),
+        ('zip_code', pyarrow.string()),
+        ('city_name', pyarrow.string()),
+        ('country_name', pyarrow.string())
+    ]
+    v_total_fields = [
+        ('base_amount', pyarrow.float64()),
+        ('discount_amount', pyarrow.float64()),
+        ('tax_amount', pyarrow.float64()),
+        ('net_amount', pyarrow.float64())
+    ]
+    v_tax_line_fields = [
+        ('tax_code', pyarrow.string()),
+        ('tax_pct', pyarrow.int32()),
+        ('tax_desc', pyarrow.string()),
+        ('tax_amount', pyarrow.float64())
+    ]
+    v_comment_fields = [
+        ('comment_number', pyarrow.int32()),
+        ('comment_text', pyarrow.string())
+    ]
+
+    # flat layout has one row per invoice line with invoice header repeated,
+    # nested layout has one row per invoice with the same shape as json document
+    if p_layout == 'flat':
+        return pyarrow.schema(
+            v_detail_fields +
+            [('customer_number', pyarrow.string()), ('customer_name', pyarrow.string())] +
+            [('bill_' + v_name, v_type) for (v_name, v_type) in v_address_fields[1:]] +
+            [('ship_' + v_name, v_type) for (v_name, v_type) in v_address_fields[1:]] +
+            [('total_' + v_name, v_type) for (v_name, v_type) in v_total_fields] +
+            v_line_fields
+        )
+    else:
+        return pyarrow.schema([
+            ('detail', pyarrow.struct(v_detail_fields)),
+            ('customer', pyarrow.struct([
+                ('customer_number', pyarrow.string()),
+                ('name', pyarrow.string()),
+                ('addresses', pyarrow.list_(pyarrow.struct(v_address_fields)))
+            ])),
+            ('total', pyarrow.struct(v_total_fields)),
+            ('tax_lines', pyarrow.list_(pyarrow.struct(v_tax_line_fields))),
+            ('lines', pyarrow.list_(pyarrow.struct(v_line_fields))),
+            ('comments', pyarrow.list_(pyarrow.struct(v_comment_fields)))
+        ])
+
+
+# ----------------------------------------------------
+# Get parquet buffers
+# ----------------------------------------------------
+def get_parquet_buffers(p_schema):
+
+    # one list per leaf column, named by its path, and one list of offsets per
+    # list column; offsets start with 0 as in arrow list arrays
+    v_buffers = {"rows": 0}
+
+    def add_buffers(p_path, p_type):
+        if g_pyarrow.types.is_struct(p_type):
+            for v_field in p_type:
+                add_buffers(p_path + '.' + v_field.name if p_path else v_field.name, v_field.type)
+        elif g_pyarrow.types.is_list(p_type):
+            v_buffers[p_path + '[]'] = [0]
+            add_buffers(p_path, p_type.value_type)
+        else:
+            v_buffers[p_path] = []
+
+    for v_field in p_schema:
+        add_buffers(v_field.name, v_field.type)
+
+    return v_buffers
+
+
+# ----------------------------------------------------
+# Append invoice to parquet buffers
+# ----------------------------------------------------
+def append_parquet_invoice(p_buffers, p_values, p_layout):
+
+    v_invoice_date = datetime.date.fromisoformat(p_values['invoice_date'])
+    v_due_date = datetime.date.fromisoformat(p_values['due_date'])
+    v_created_timestamp = datetime.datetime.fromisoformat(p_values['created_timestamp'])
+    v_detail = [
+        ('document_id', p_values['document_id']),
+        ('invoice_number', p_values['invoice_number']),
+        ('purchase_order', p_values['purchase_order']),
+        ('contract_number', p_values['contract_number']),
+        ('currency_code', p_values['currency_code']),
+        ('invoice_date', v_invoice_date),
+        ('due_date', v_due_date),
+        ('created_timestamp', v_created_timestamp)
+    ]
+    v_line_fields = get_invoice_line_fields()
+    v_line_columns = list(zip(*p_values['lines'])) if len(p_values['lines']) > 0 else [()] * len(v_line_fields)
+
+    if p_layout == 'flat':
+
+        # header values are repeated for every line; invoice without lines
+        # has one row with null line columns, so every invoice has a row
+        v_line_count = len(p_values['lines'])
+        if v_line_count == 0:
+            v_line_count = 1
+            v_line_columns = [(None,)] * len(v_line_fields)
+        v_header = v_detail + [('customer_number', p_values['customer_number']), ('customer_name', p_values['name'])]
+        for (v_prefix, v_address) in zip(('bill_', 'ship_'), p_values['addresses']):
+            v_header = v_header + [(v_prefix + v_name, v_value) for (v_name, v_value) in zip(('contact_name', 'address_detail', 'zip_code', 'city_name', 'country_name'), v_address[1:])]
+        v_header = v_header + [('total_' + v_name, v_value) for (v_name, v_value) in zip(('base_amount', 'discount_amount', 'tax_amount', 'net_amount'), p_values['totals'])]
+
+        for (v_column, v_value) in v_header:
+            p_buffers[v_column].extend([v_value] * v_line_count)
+        for (v_column, v_values) in zip(v_line_fields, v_line_columns):
+            p_buffers[v_column].extend(v_values)
+
+        p_buffers['rows'] = p_buffers['rows'] + v_line_count
+
+    else:
+
+        for (v_column, v_value) in v_detail:
+            p_buffers['detail.' + v_column].append(v_value)
+        p_buffers['customer.customer_number'].append(p_values['customer_number'])
+        p_buffers['customer.name'].append(p_values['name'])
+        for (v_column, v_value) in zip(('base_amount', 'discount_amount', 'tax_amount', 'net_amount'), p_values['totals']):
+            p_buffers['total.' + v_column].append(v_value)
+
+        # list columns get their child values and the end offset of the invoice
+        for (v_list, v_fields, v_rows) in (
+            ('customer.addresses', ('address_type', 'contact_name', 'address_detail', 'zip_code', 'city_name', 'country_name'), p_values['addresses']),
+            ('tax_lines', ('tax_code', 'tax_pct', 'tax_desc', 'tax_amount'), p_values['tax_lines']),
+            ('lines', v_line_fields, p_values['lines']),
+            ('comments', ('comment_number', 'comment_text'), p_values['comments'])
+        ):
+            v_offsets = p_buffers[v_list + '[]']
+            v_offsets.append(v_offsets[-1] + len(v_rows))
+            if len(v_rows) > 0:
+                for (v_column, v_values) in zip(v_fields, zip(*v_rows)):
+                    p_buffers[v_list + '.' + v_column].extend(v_values)
+
+        p_buffers['rows'] = p_buffers['rows'] + 1
+
+
+# ----------------------------------------------------
+# Get parquet table
+# ----------------------------------------------------
+def get_parquet_table(p_buffers, p_schema):
+
+    # arrays are built directly from column buffers, lists from child arrays and offsets
+    def get_array(p_path, p_type):
+        if g_pyarrow.types.is_struct(p_type):
+            v_children = [get_array(p_path + '.' + v_field.name if p_path else v_field.name, v_field.type) for v_field in p_type]
+            return g_pyarrow.StructArray.from_arrays(v_children, fields=list(p_type))
+        elif g_pyarrow.types.is_list(p_type):
+            v_offsets = g_pyarrow.array(p_buffers[p_path + '[]'], type=g_pyarrow.int32())
+            return g_pyarrow.ListArray.from_arrays(v_offsets, get_array(p_path, p_type.value_type), type=p_type)
+        else:
+            return g_pyarrow.array(p_buffers[p_path], type=p_type)
+
+    return g_pyarrow.Table.from_arrays([get_array(v_field.name, v_field.type) for v_field in p_schema], schema=p_schema)
+
+
+# ----------------------------------------------------
+# Get parquet chunks
+# ----------------------------------------------------
+def get_parquet_chunks(p_params, p_date, p_counters):
+
+    # invoices are appended to column buffers and written as row groups of
+    # exactly rowgroupsize rows, so one invoice with many lines is split between
+    # row groups and only one row group is kept in memory; rows after the last
+    # full row group are kept for the next one
+    global g_pyarrow
+    import pyarrow
+    import pyarrow.parquet
+    g_pyarrow = pyarrow
+
+    v_schema = get_parquet_schema(p_params['layout'])
+    v_sink = ParquetChunkSink()
+    v_compression = p_params['compress'] if p_params['compress'] != 'none' else 'snappy'
+    v_writer = pyarrow.parquet.ParquetWriter(v_sink, v_schema, compression=v_compression)
+    v_buffers = get_parquet_buffers(v_schema)
+    v_row_group_size = p_params['rowgroupsize']
+    v_pending = None
+
+    v_record_count = get_random_count(p_params['mindocs'], p_params['maxdocs'])
+
+    for v_current_record in range(1,v_record_count+1):
+
+        v_start = time.perf_counter()
+        v_values = get_invoice_values(p_date, p_params['minlines'], p_params['maxlines'], p_params['engine'])
+        p_counters['generate_sec'] = p_counters['generate_sec'] + time.perf_counter() - v_start
+        append_parquet_invoice(v_buffers, v_values, p_params['layout'])
+        p_counters['document_count'] = p_counters['document_count'] + 1
+        p_counters['line_count'] = p_counters['line_count'] + v_values['line_count']
+
+        if v_buffers['rows'] + (v_pending.num_rows if v_pending != None else 0) >= v_row_group_size:
+            v_table = get_parquet_table(v_buffers, v_schema)
+            if v_pending != None:
+                v_table = pyarrow.concat_tables([v_pending, v_table])
+            v_buffers = get_parquet_buffers(v_schema)
+            v_full_rows = v_table.num_rows - v_table.num_rows % v_row_group_size
+            v_writer.write_table(v_table.slice(0, v_full_rows), row_group_size=v_row_group_size)
+            v_pending = v_table.slice(v_full_rows) if v_full_rows < v_table.num_rows else None
+            for v_chunk in v_sink.drain():
+                p_counters['size_bytes'] = p_counters['size_bytes'] + len(v_chunk)
+                yield v_chunk
+
+    if v_buffers['rows'] > 0 or v_pending != None:
+        v_table = get_parquet_table(v_buffers, v_schema)
+        if v_pending != None:
+            v_table = pyarrow.concat_tables([v_pending, v_table])
+        v_writer.write_table(v_table, row_group_size=v_row_group_size)
+    v_writer.close()
+
+    for v_chunk in v_sink.drain():
+        p_counters['size_bytes'] = p_counters['size_bytes'] + len(v_chunk)
+        yield v_chunk
+
+
+# ----------------------------------------------------
+# COMPRESSION FUNCTIONS
+# ----------------------------------------------------
+
+# ----------------------------------------------------
+# Get compression suffix
+# ----------------------------------------------------
+def get_compression_suffix(p_params):
+
+    # parquet is compressed inside the file, so its objects get only the
+    # .parquet extension, unless the pattern already ends with it
+    if p_params['scenario'] == 'parquet':
+        return '' if p_params['pattern'].endswith('.parquet') else '.parquet'
+    elif p_params['compress'] == 'gzip':
+        return '.gz'
+    elif p_params['compress'] == 'zstd':
+        return '.zst'
+    else:
+        return ''
+
+
+# ----------------------------------------------------
+# Get compression blocks
+# ----------------------------------------------------
+def get_compression_blocks(p_chunks, p_block_size):
+
+    # content chunks are regrouped into blocks of p_block_size, the last
+    # block is flagged so the compressor can finish the stream
+    v_block = bytearray()
+    v_previous = None
+
+    for v_chunk in p_chunks:
+        v_block += v_chunk
+        while len(v_block) >= p_block_size:
+            if v_previous != None:
+                yield (v_previous, False)
+            v_previous = bytes(v_block[:p_block_size])
+            del v_block[:p_block_size]
+
+    if len(v_block) > 0:
+        if v_previous != None:
+            yield (v_previous, False)
+        v_previous = bytes(v_block)
+
+    yield (v_previous if v_previous != None else b'', True)
+
+
+# ----------------------------------------------------
+# Compress gzip block
+# ----------------------------------------------------
+def compress_gzip_block(p_block, p_dictionary, p_last):
+
+    # every block is raw deflate primed with the tail of the previous block and
+    # flushed to byte boundary, so compressed blocks concatenate to one deflate stream
+    v_compressor = zlib.compressobj(6, zlib.DEFLATED, -15, 9, zlib.Z_DEFAULT_STRATEGY, p_dictionary)
+    return v_compressor.compress(p_block) + v_compressor.flush(zlib.Z_FINISH if p_last else zlib.Z_SYNC_FLUSH)
+
+
+# ----------------------------------------------------
+# Compress chunks with gzip
+# ----------------------------------------------------
+def compress_chunks_gzip(p_params, p_chunks, p_counters):
+
+    v_block_size = p_params['compressblock'] * 1024 * 1024
+    v_threads = p_params['compressthreads']
+    v_crc = 0
+    v_size = 0
+    v_dictionary = b''
+    v_pending = collections.deque()
+
+    # gzip header without file name and modification time
+    v_header = b'\x1f\x8b\x08\x00\x00\x00\x00\x00\x00\xff'
+    p_counters['compressed_bytes'] = p_counters['compressed_bytes'] + len(v_header)
+    yield v_header
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=v_threads) as v_executor:
+
+        for (v_block, v_last) in get_compression_blocks(p_chunks, v_block_size):
+            v_crc = zlib.crc32(v_block, v_crc)
+            v_size = v_size + len(v_block)
+            v_pending.append(v_executor.submit(compress_gzip_block, v_block, v_dictionary, v_last))
+            v_dictionary = v_block[-32768:]
+
+            if len(v_pending) > v_threads:
+                v_compressed = v_pending.popleft().result()
+                p_counters['compressed_bytes'] = p_counters['compressed_bytes'] + len(v_compressed)
+                yield v_compressed
+
+        while len(v_pending) > 0:
+            v_compressed = v_pending.popleft().result()
+            p_counters['compressed_bytes'] = p_counters['compressed_bytes'] + len(v_compressed)
+            yield v_compressed
+
+    # gzip trailer with checksum and size of uncompressed content
+    v_trailer = struct.pack('<II', v_crc, v_size & 0xffffffff)
+    p_counters['compressed_bytes'] = p_counters['compressed_bytes'] + len(v_trailer)
+    yield v_trailer
+
+
+# ----------------------------------------------------
+# Compress chunks with zstd
+# ----------------------------------------------------
+def compress_chunks_zstd(p_params, p_chunks, p_counters):
+
+    # zstandard is optional and imported only when zstd compression is used;
+    # it compresses one frame with its own pool of threads
+    import zstandard
+
+    v_block_size = p_params['compressblock'] * 1024 * 1024
+    v_compressor = zstandard.ZstdCompressor(level=3, threads=p_params['compressthreads']).compressobj()
+
+    for (v_block, v_last) in get_compression_blocks(p_chunks, v_block_size):
+        v_compressed = v_compressor.compress(v_block)
+        if v_last:
+            v_compressed = v_compressed + v_compressor.flush()
+        if len(v_compressed) > 0:
+            p_counters['compressed_bytes'] = p_counters['compressed_bytes'] + len(v_compressed)
+            yield v_compressed
+
+
+# ----------------------------------------------------
+# Compress chunks
+# ----------------------------------------------------
+def compress_chunks(p_params, p_chunks, p_counters):
+
+    # parquet content is compressed by the parquet writer
+    if p_params['scenario'] == 'parquet':
+        return p_chunks
+    elif p_params['compress'] == 'gzip':
+        return compress_chunks_gzip(p_params, p_chunks, p_counters)
+    elif p_params['compress'] == 'zstd':
+        return compress_chunks_zstd(p_params, p_chunks, p_counters)
+    else:
+        return p_chunks
+
+
+# ----------------------------------------------------
+# CHECKSUM FUNCTIONS
+# ----------------------------------------------------
+
+# ----------------------------------------------------
+# CRC-32 hash
+# ----------------------------------------------------
+class Crc32Hash:
+
+    # zlib.crc32() with interface of hashlib objects
+    def __init__(self):
+        self.value = 0
+
+    def update(self, p_data):
+        self.value = zlib.crc32(p_data, self.value)
+
+    def hexdigest(self):
+        return '{:08x}'.format(self.value)
+
+
+# ----------------------------------------------------
+# Get fast hash
+# ----------------------------------------------------
+def get_fast_hash(p_algorithm):
+
+    # xxhash is optional and imported only when xxh3 hash is used
+    if p_algorithm == 'crc32':
+        return Crc32Hash()
+    elif p_algorithm == 'xxh3':
+        import xxhash
+        return xxhash.xxh3_64()
+    else:
+        return None
+
+
+# ----------------------------------------------------
+# Get MD5 value
+# ----------------------------------------------------
+def get_md5_value(p_md5):
+
+    # MD5 is encoded in base64, like in Content-MD5 header
+    return b64encode(p_md5.digest()).decode('ascii')
+
+
+# ----------------------------------------------------
+# Get checksum chunks
+# ----------------------------------------------------
+def get_checksum_chunks(p_params, p_chunks, p_counters):
+
+    if not p_params['md5'] and p_params['hash'] == 'none':
+        return p_chunks
+
+    return get_hashed_chunks(p_params, p_chunks, p_counters)
+
+
+# ----------------------------------------------------
+# Get hashed chunks
+# ----------------------------------------------------
+def get_hashed_chunks(p_params, p_chunks, p_counters):
+
+    # chunks are hashed as they are produced, so the content is never read
+    # again; checksums are in counters once the last chunk is consumed
+    v_md5 = hashlib.md5() if p_params['md5'] else None
+    v_hash = get_fast_hash(p_params['hash'])
+
+    for v_chunk in p_chunks:
+        if v_md5 != None:
+            v_md5.update(v_chunk)
+        if v_hash != None:
+            v_hash.update(v_chunk)
+        yield v_chunk
+
+    p_counters['md5'] = get_md5_value(v_md5) if v_md5 != None else None
+    p_counters['hash'] = v_hash.hexdigest() if v_hash != None else None
+
+
+# ----------------------------------------------------
+# Get file checksums
+# ----------------------------------------------------
+def get_file_checksums(p_path, p_md5, p_hash):
+
+    # file is read in blocks, hashing releases the GIL for large buffers
+    v_md5 = hashlib.md5() if p_md5 else None
+    v_hash = get_fast_hash(p_hash)
+
+    with open(p_path, 'rb') as v_file:
+        while True:
+            v_block = v_file.read(8*1024*1024)
+            if len(v_block) == 0:
+                break
+            if v_md5 != None:
+                v_md5.update(v_block)
+            if v_hash != None:
+                v_hash.update(v_block)
+
+    return (get_md5_value(v_md5) if v_md5 != None else None, v_hash.hexdigest() if v_hash != None else None)
+
+
+# ----------------------------------------------------
+# STORAGE FUNCTIONS
+# ----------------------------------------------------
+
+# ----------------------------------------------------
+# Get file name
+# ----------------------------------------------------
+def get_file_name(p_params, p_date, p_files_count, p_current_file):
+
+    v_current_timestamp = datetime.datetime.now()
+    v_file_name = p_params['pattern']
+    v_file_name = v_file_name.replace('${date}',p_date.strftime('%Y%0m%0d'))
+    v_file_name = v_file_name.replace('${time}',v_current_timestamp.strftime('%H%M%S'))
     v_file_name = v_file_name.replace('${microseconds}',v_current_timestamp.strftime('%f'))
     v_file_name = v_file_name.replace('${timestamp}',p_date.strftime('%Y%0m%0d')+v_current_timestamp.strftime('%H%M%S%f'))
     v_file_name = v_file_name.replace('${number}',str(p_current_file))
-    v_file_name = v_file_name.replace('${uuid}',str(uuid.uuid4()))
+    if p_params['seed'] == None:
+        v_file_name = v_file_name.replace('${uuid}',str(uuid.uuid4()))
+    else:
+        v_random = random.Random('{}:{}:{}:uuid'.format(p_params['seed'], p_date.isoformat(), p_current_file))
+        v_file_name = v_file_name.replace('${uuid}',str(uuid.UUID(int=v_random.getrandbits(128), version=4)))
+    v_file_name = v_file_name + get_compression_suffix(p_params)
+
+    return v_file_name
+
+
+# ----------------------------------------------------
+# Get oci module
+# ----------------------------------------------------
+def get_oci():
+
+    # oci is imported only when object storage is used, as it takes long to
+    # import; every use of the SDK goes through this function, so it is
+    # imported also when the client is created elsewhere
+    global g_oci
+    if g_oci == None:
+        import oci
+        g_oci = oci
+
+    return g_oci
+
+
+# ----------------------------------------------------
+# Get object storage client
+# ----------------------------------------------------
+def get_object_storage_client():
+
+    # requests are retried by the generator, so retries of the SDK are disabled
+    v_oci = get_oci()
+    v_oci_config = v_oci.config.from_file('~/.oci/config', 'DEFAULT')
+    v_oci_object_storage_client = v_oci.object_storage.ObjectStorageClient(config=v_oci_config, retry_strategy=v_oci.retry.NoneRetryStrategy())
+
+    return v_oci_object_storage_client
+
+
+# ----------------------------------------------------
+# Write file to object storage
+# ----------------------------------------------------
+def write_file_to_object_storage(p_content, p_client, p_control, p_namespace, p_bucket, p_object_name, p_content_encoding=None, p_content_type='application/json', p_content_md5=None):
+
+    # object storage rejects content not matching its MD5
+    try:
+        v_content_length = len(p_content)
+        v_response = call_with_retry(p_control, p_object_name, p_client.put_object,
+            namespace_name = p_namespace,
+            bucket_name = p_bucket,
+            object_name = p_object_name,
+            put_object_body = p_content,
+            content_length = v_content_length,
+            content_md5 = p_content_md5,
+            content_type = p_content_type,
+            content_encoding = p_content_encoding,
+            content_disposition = 'attachment'
+        )
+    except Exception as e:
+        if getattr(e, 'status', None) != None:
+            g_logger.error ('Writing object failed with status {}, code {}, message {}'.format(e.status, getattr(e, 'code', None), getattr(e, 'message', e)))
+        raise
+
+    return (v_response, v_content_length)
+
+
+# ----------------------------------------------------
+# Upload part to object storage
+# ----------------------------------------------------
+def upload_part_to_object_storage(p_part, p_part_number, p_upload_id, p_client, p_control, p_namespace, p_bucket, p_object_name):
+
+    v_response = call_with_retry(p_control, p_object_name, p_client.upload_part,
+        namespace_name = p_namespace,
+        bucket_name = p_bucket,
+        object_name = p_object_name,
+        upload_id = p_upload_id,
+        upload_part_num = p_part_number,
+        upload_part_body = p_part,
+        content_length = len(p_part)
+    )
+
+    return get_oci().object_storage.models.CommitMultipartUploadPartDetails(part_num=p_part_number, etag=v_response.headers['etag'])
+
+
+# ----------------------------------------------------
+# Write parts to object storage
+# ----------------------------------------------------
+def write_parts_to_object_storage(p_parts, p_client, p_control, p_namespace, p_bucket, p_object_name, p_threads, p_content_encoding=None, p_content_type='application/json', p_checksums=None):
+
+    # small content fits into single part and is written by single request,
+    # its checksums are complete once all parts are consumed
+    v_first_part = next(p_parts)
+    v_next_part = next(p_parts, None)
+    if v_next_part == None:
+        return write_file_to_object_storage(v_first_part, p_client, p_control, p_namespace, p_bucket, p_object_name, p_content_encoding, p_content_type, p_checksums['md5'] if p_checksums != None else None)
+
+    v_upload_id = None
+    v_content_length = 0
+    v_commit_parts = []
+
+    try:
+        v_response = call_with_retry(p_control, p_object_name, p_client.create_multipart_upload,
+            namespace_name = p_namespace,
+            bucket_name = p_bucket,
+            create_multipart_upload_details = get_oci().object_storage.models.CreateMultipartUploadDetails(
+                object = p_object_name,
+                content_type = p_content_type,
+                content_encoding = p_content_encoding,
+                content_disposition = 'attachment'
+            )
+        )
+        v_upload_id = v_response.data.upload_id
+
+        # upload parts in parallel, with at most p_threads parts in flight
+        v_pending = collections.deque()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=p_threads) as v_executor:
+
+            v_part_number = 0
+            for v_part in itertools.chain([v_first_part, v_next_part], p_parts):
+                v_part_number = v_part_number + 1
+                v_content_length = v_content_length + len(v_part)
+                v_pending.append(v_executor.submit(upload_part_to_object_storage, v_part, v_part_number, v_upload_id, p_client, p_control, p_namespace, p_bucket, p_object_name))
+                if len(v_pending) >= p_threads:
+                    v_commit_parts.append(v_pending.popleft().result())
+
+            while len(v_pending) > 0:
+                v_commit_parts.append(v_pending.popleft().result())
+
+        v_response = call_with_retry(p_control, p_object_name, p_client.commit_multipart_upload,
+            namespace_name = p_namespace,
+            bucket_name = p_bucket,
+            object_name = p_object_name,
+            upload_id = v_upload_id,
+            commit_multipart_upload_details = get_oci().object_storage.models.CommitMultipartUploadDetails(parts_to_commit=v_commit_parts)
+        )
+
+    except Exception as e:
+        # errors are classified by their status, so the SDK is not needed to
+        # report them, and failed abort does not hide the original error
+        if getattr(e, 'status', None) != None:
+            g_logger.error ('Multipart writing of object failed with status {}, code {}, message {}'.format(e.status, getattr(e, 'code', None), getattr(e, 'message', e)))
+        if v_upload_id != None:
+            try:
+                p_client.abort_multipart_upload(
+                    namespace_name = p_namespace,
+                    bucket_name = p_bucket,
+                    object_name = p_object_name,
+                    upload_id = v_upload_id
+                )
+            except Exception as e_abort:
+                g_logger.error ('Aborting multipart upload of object {} failed: {}'.format(p_object_name, e_abort))
+        raise
+
+    return (v_response, v_content_length)
+
+
+# ----------------------------------------------------
+# Write file to directory
+# ----------------------------------------------------
+def write_file_to_directory(p_content, p_directory, p_object_name):
+
+    # object name is used as relative path, so pattern like date=${date}/...
+    # creates the same layout as in the bucket; file is written under temporary
+    # name and renamed when complete
+    v_path = os.path.join(p_directory, p_object_name)
+    v_temporary_path = v_path + '.tmp'
+    os.makedirs(os.path.dirname(v_path), exist_ok=True)
+
+    v_content_length = 0
+    with open(v_temporary_path, 'wb', buffering=8*1024*1024) as v_file:
+        if isinstance(p_content, bytes):
+            if len(p_content) > 0 and hasattr(os, 'posix_fallocate'):
+                os.posix_fallocate(v_file.fileno(), 0, len(p_content))
+            v_file.write(p_content)
+            v_content_length = len(p_content)
+        else:
+            for v_part in p_content:
+                v_file.write(v_part)
+                v_content_length = v_content_length + len(v_part)
+
+    os.replace(v_temporary_path, v_path)
+
+    return (None, v_content_length)
+
+
+# ----------------------------------------------------
+# Write file to null
+# ----------------------------------------------------
+def write_file_to_null(p_content):
+
+    # content is only counted, to measure throughput of the generator
+    if isinstance(p_content, bytes):
+        return (None, len(p_content))
+
+    v_content_length = 0
+    for v_part in p_content:
+        v_content_length = v_content_length + len(v_part)
+
+    return (None, v_content_length)
+
+
+# ----------------------------------------------------
+# Open sink
+# ----------------------------------------------------
+def open_sink(p_params, p_control):
+
+    # every upload thread borrows its own client from the pool, clients keep
+    # connections open between requests
+    if p_params['sink'] == 'oci':
+        v_clients = queue.Queue()
+        for v_client_number in range(max(p_params['uploaders'], 1)):
+            v_clients.put(get_object_storage_client())
+        return {"type": "oci", "clients": v_clients, "control": p_control}
+    elif p_params['sink'] == 'local':
+        os.makedirs(p_params['directory'], exist_ok=True)
+        return {"type": "local", "directory": p_params['directory']}
+    else:
+        return {"type": "null"}
+
+
+# ----------------------------------------------------
+# Write file
+# ----------------------------------------------------
+def write_file(p_params, p_content, p_sink, p_object_name, p_checksums=None):
+
+    if p_sink['type'] == 'local':
+        return write_file_to_directory(p_content, p_sink['directory'], p_object_name)
+    elif p_sink['type'] == 'null':
+        return write_file_to_null(p_content)
+
+    # streamed content, or content larger than one part, is written by multipart upload
+    v_control = p_sink['control']
+    v_part_size = p_params['partsize'] * 1024 * 1024
+
+    if p_params['scenario'] == 'parquet':
+        v_content_type = 'application/vnd.apache.parquet'
+        v_content_encoding = None
+    else:
+        v_content_type = 'application/json'
+        v_content_encoding = p_params['compress'] if p_params['compress'] != 'none' else None
+
+    # checksums of streamed content are read only once the content is generated;
+    # parts of multipart upload are sent without MD5
+    v_client = p_sink['clients'].get()
+    try:
+        if not isinstance(p_content, bytes):
+            return write_parts_to_object_storage(p_content, v_client, v_control, p_params['namespace'], p_params['bucket'], p_object_name, p_params['partthreads'], v_content_encoding, v_content_type, p_checksums)
+        elif v_part_size > 0 and len(p_content) > v_part_size:
+            return write_parts_to_object_storage(split_content(p_content, v_part_size), v_client, v_control, p_params['namespace'], p_params['bucket'], p_object_name, p_params['partthreads'], v_content_encoding, v_content_type)
+        else:
+            return write_file_to_object_storage(p_content, v_client, v_control, p_params['namespace'], p_params['bucket'], p_object_name, v_content_encoding, v_content_type, p_checksums['md5'] if p_checksums != None else None)
+    finally:
+        p_sink['clients'].put(v_client)
+
+
+# ----------------------------------------------------
+# UPLOAD RETRY FUNCTIONS
+# ----------------------------------------------------
+
+# ----------------------------------------------------
+# Get upload control
+# ----------------------------------------------------
+def get_upload_control(p_params):
+
+    # number of concurrent object storage requests is halved on throttling and
+    # increased by one after every limit of successful requests, up to number
+    # of requests the upload threads and part threads can issue; the limit
+    # starts at half of them, so it has room to grow before the first throttling
+    if p_params['partsize'] > 0:
+        v_max_limit = max(p_params['uploaders'], 1) * p_params['partthreads']
+    else:
+        v_max_limit = max(p_params['uploaders'], 1)
+
+    return {
+        "condition": threading.Condition(),
+        "retries": p_params['retries'],
+        "delay": p_params['retrydelay'],
+        "random": random.Random(),
+        "limit": max(v_max_limit // 2, 1),
+        "min_limit": max(v_max_limit // 2, 1),
+        "max_limit": v_max_limit,
+        "active": 0,
+        "successes": 0,
+        "decreased": 0,
+        "request_count": 0,
+        "retry_count": 0,
+        "throttled_count": 0,
+        "backoff_sec": 0.0
+    }
+
+
+# ----------------------------------------------------
+# Acquire upload slot
+# ----------------------------------------------------
+def acquire_upload_slot(p_control):
+
+    # number of the request orders it with decreases of the limit
+    with p_control['condition']:
+        while p_control['active'] >= p_control['limit']:
+            p_control['condition'].wait()
+        p_control['active'] = p_control['active'] + 1
+        p_control['request_count'] = p_control['request_count'] + 1
+        return p_control['request_count']
+
+
+# ----------------------------------------------------
+# Release upload slot
+# ----------------------------------------------------
+def release_upload_slot(p_control, p_request, p_throttled):
+
+    with p_control['condition']:
+        p_control['active'] = p_control['active'] - 1
+
+        # requests in flight when the limit was halved were sent at the old limit,
+        # so only throttling of requests sent after the last decrease halves it again
+        if p_throttled:
+            p_control['throttled_count'] = p_control['throttled_count'] + 1
+            p_control['successes'] = 0
+            if p_request > p_control['decreased']:
+                p_control['limit'] = max(p_control['limit'] // 2, 1)
+                p_control['min_limit'] = min(p_control['min_limit'], p_control['limit'])
+                p_control['decreased'] = p_control['request_count']
+        else:
+            p_control['successes'] = p_control['successes'] + 1
+            if p_control['successes'] >= p_control['limit'] and p_control['limit'] < p_control['max_limit']:
+                p_control['limit'] = p_control['limit'] + 1
+                p_control['successes'] = 0
+
+        p_control['condition'].notify_all()
+
+
+# ----------------------------------------------------
+# Get error status
+# ----------------------------------------------------
+def get_error_status(p_error):
+
+    # service errors have HTTP status; connection errors and timeouts, raised
+    # by the SDK as exceptions of its requests package, are retried as transient
+    # errors, other errors like permission or disk full are not retried
+    v_status = getattr(p_error, 'status', None)
+    if v_status in g_retry_throttling_statuses:
+        return 'throttling'
+    elif v_status in g_retry_transient_statuses:
+        return 'transient'
+    elif v_status == None and isinstance(p_error, (ConnectionError, TimeoutError)):
+        return 'transient'
+    elif v_status == None and g_oci != None and isinstance(p_error, (g_oci._vendor.requests.exceptions.ConnectionError, g_oci._vendor.requests.exceptions.Timeout)):
+        return 'transient'
+    else:
+        return None
+
+
+# ----------------------------------------------------
+# Call with retry
+# ----------------------------------------------------
+def call_with_retry(p_control, p_object_name, p_function, **p_arguments):
+
+    v_retry = 0
+    while True:
+        v_request = acquire_upload_slot(p_control)
+        v_status = None
+        try:
+            return p_function(**p_arguments)
+        except Exception as e:
+            v_status = get_error_status(e)
+            if v_status == None or v_retry >= p_control['retries']:
+                raise
+            v_error = e
+        finally:
+            release_upload_slot(p_control, v_request, v_status == 'throttling')
+
+        # exponential backoff with full jitter spreads retries of all threads
+        v_retry = v_retry + 1
+        with p_control['condition']:
+            v_delay = p_control['random'].uniform(0, min(p_control['delay'] * 2 ** (v_retry - 1), g_retry_max_delay))
+            p_control['retry_count'] = p_control['retry_count'] + 1
+            p_control['backoff_sec'] = p_control['backoff_sec'] + v_delay
+
+        g_logger.warning ('Writing object {} failed with {} error {}, retry {} of {} in {:.3f} sec'.format(p_object_name, v_status, getattr(v_error, 'status', type(v_error).__name__), v_retry, p_control['retries'], v_delay))
+        time.sleep(v_delay)
+
+
+# ----------------------------------------------------
+# Get upload statistics
+# ----------------------------------------------------
+def get_upload_statistics(p_control):
+
+    with p_control['condition']:
+        return {
+            "request_count": p_control['request_count'],
+            "retry_count": p_control['retry_count'],
+            "throttled_count": p_control['throttled_count'],
+            "backoff_sec": round(p_control['backoff_sec'],3),
+            "min_concurrency": p_control['min_limit'],
+            "concurrency": p_control['limit']
+        }
+
+
+# ----------------------------------------------------
+# RATE CONTROL FUNCTIONS
+# ----------------------------------------------------
+
+# ----------------------------------------------------
+# Get rate control
+# ----------------------------------------------------
+def get_rate_control(p_params):
+
+    # one token bucket for every rate target that is set
+    v_rate_control = {}
+
+    for (v_unit, v_rate) in (('bytes', p_params['ratemb'] * 1024 * 1024), ('files', p_params['ratefiles']), ('documents', p_params['ratedocs'])):
+        if v_rate > 0:
+            v_rate_control[v_unit] = {
+                "lock": threading.Lock(),
+                "rate": v_rate,
+                "capacity": v_rate * p_params['rateburst'],
+                "tokens": v_rate * p_params['rateburst'],
+                "updated": time.perf_counter(),
+                "waited_sec": 0.0
+            }
+
+    return v_rate_control
+
+
+# ----------------------------------------------------
+# Acquire tokens
+# ----------------------------------------------------
+def acquire_tokens(p_rate_control, p_unit, p_tokens):
+
+    # tokens are taken even if the bucket does not hold enough of them, and the
+    # caller sleeps until the debt is refilled; later callers see the debt and
+    # wait longer, so concurrent uploads together keep the average on target
+    if p_unit not in p_rate_control or p_tokens <= 0:
+        return 0.0
+
+    v_bucket = p_rate_control[p_unit]
+    with v_bucket['lock']:
+        v_now = time.perf_counter()
+        v_bucket['tokens'] = min(v_bucket['capacity'], v_bucket['tokens'] + (v_now - v_bucket['updated']) * v_bucket['rate'])
+        v_bucket['updated'] = v_now
+        v_bucket['tokens'] = v_bucket['tokens'] - p_tokens
+        v_wait_sec = max(-v_bucket['tokens'] / v_bucket['rate'], 0.0)
+        v_bucket['waited_sec'] = v_bucket['waited_sec'] + v_wait_sec
+
+    if v_wait_sec > 0:
+        time.sleep(v_wait_sec)
+
+    return v_wait_sec
+
+
+# ----------------------------------------------------
+# Throttle file
+# ----------------------------------------------------
+def throttle_file(p_rate_control, p_content, p_document_count):
+
+    # streamed content is throttled part by part while it is written
+    v_wait_sec = acquire_tokens(p_rate_control, 'files', 1)
+    v_wait_sec = v_wait_sec + acquire_tokens(p_rate_control, 'documents', p_document_count)
+    if isinstance(p_content, bytes):
+        v_wait_sec = v_wait_sec + acquire_tokens(p_rate_control, 'bytes', len(p_content))
+
+    return v_wait_sec
+
+
+# ----------------------------------------------------
+# Get throttled parts
+# ----------------------------------------------------
+def get_throttled_parts(p_rate_control, p_parts, p_counters):
+
+    for v_part in p_parts:
+        p_counters['throttle_sec'] = p_counters['throttle_sec'] + acquire_tokens(p_rate_control, 'bytes', len(v_part))
+        yield v_part
+
+
+# ----------------------------------------------------
+# Get throttled time
+# ----------------------------------------------------
+def get_throttled_sec(p_rate_control):
+
+    return round(sum([v_bucket['waited_sec'] for v_bucket in p_rate_control.values()]),3)
+
+
+# ----------------------------------------------------
+# UPLOAD PIPELINE FUNCTIONS
+# ----------------------------------------------------
+
+# ----------------------------------------------------
+# Upload error
+# ----------------------------------------------------
+class UploadError(Exception):
+
+    def __init__(self, p_object_name, p_cause):
+        super().__init__('Upload of object {} failed: {}'.format(p_object_name, p_cause))
+        self.object_name = p_object_name
+        self.cause = p_cause
+
+
+# ----------------------------------------------------
+# Start upload pipeline
+# ----------------------------------------------------
+def start_upload_pipeline(p_params, p_sink, p_metrics, p_rate_control, p_journal, p_document_index):
+
+    # bounded queue blocks the generator when uploads fall behind
+    v_pipeline = {
+        "queue": queue.Queue(maxsize=p_params['queuesize']),
+        "errors": [],
+        "lock": threading.Lock(),
+        "threads": [],
+        "metrics": p_metrics,
+        "rate_control": p_rate_control,
+        "journal": p_journal,
+        "document_index": p_document_index
+    }
+
+    for v_thread_number in range(1,p_params['uploaders']+1):
+        v_thread = threading.Thread(
+            target = run_upload_worker,
+            args = (v_pipeline, p_params, p_sink),
+            name = 'uploader-{}'.format(v_thread_number),
+            daemon = True
+        )
+        v_thread.start()
+        v_pipeline['threads'].append(v_thread)
+
+    return v_pipeline
+
+
+# ----------------------------------------------------
+# Run upload worker
+# ----------------------------------------------------
+def run_upload_worker(p_pipeline, p_params, p_sink):
+
+    while True:
+        v_item = p_pipeline['queue'].get()
+        try:
+            if v_item is None:
+                return
+
+            (v_object_name, v_content, v_document_count, v_record, v_index_changes) = v_item
+
+            # drop remaining files once an upload failed
+            if len(p_pipeline['errors']) > 0:
+                continue
+
+            try:
+                throttle_file(p_pipeline['rate_control'], v_content, v_document_count)
+                v_start = time.perf_counter()
+                (v_response, v_content_length) = write_file(p_params, v_content, p_sink, v_object_name, v_record)
+                record_upload(p_pipeline['metrics'], time.perf_counter() - v_start, v_content_length)
+                write_journal_record(p_pipeline['journal'], v_record)
+                write_document_index(p_pipeline['document_index'], v_object_name, v_index_changes)
+            except Exception as e:
+                with p_pipeline['lock']:
+                    p_pipeline['errors'].append(UploadError(v_object_name, e))
+        finally:
+            p_pipeline['queue'].task_done()
+
+
+# ----------------------------------------------------
+# Check upload errors
+# ----------------------------------------------------
+def check_upload_errors(p_pipeline):
+
+    with p_pipeline['lock']:
+        if len(p_pipeline['errors']) > 0:
+            v_error = p_pipeline['errors'][0]
+            g_logger.error ('Upload of object {} failed'.format(v_error.object_name))
+            raise v_error
+
+
+# ----------------------------------------------------
+# Submit upload
+# ----------------------------------------------------
+def submit_upload(p_pipeline, p_object_name, p_content, p_document_count, p_record, p_index_changes=None):
+
+    check_upload_errors(p_pipeline)
+    p_pipeline['queue'].put((p_object_name, p_content, p_document_count, p_record, p_index_changes))
+
+
+# ----------------------------------------------------
+# Stop upload pipeline
+# ----------------------------------------------------
+def stop_upload_pipeline(p_pipeline):
+
+    for v_thread in p_pipeline['threads']:
+        p_pipeline['queue'].put(None)
+
+    for v_thread in p_pipeline['threads']:
+        v_thread.join()
+
+    check_upload_errors(p_pipeline)
+
+
+# ----------------------------------------------------
+# PARALLEL GENERATION FUNCTIONS
+# ----------------------------------------------------
+
+# ----------------------------------------------------
+# Initialize worker process
+# ----------------------------------------------------
+def initialize_worker(p_params, p_logger_name):
+
+    # forked workers inherit random state and text slabs of the parent, so reseed them
+    global g_numpy_random
+    initialize_logging(p_logger_name, p_params['loglevel'])
+    random.seed()
+    g_numpy_random = None
+    initialize_seed(p_params)
+    initialize_text_source(p_params)
+    initialize_reference_data(p_params)
+
+
+# ----------------------------------------------------
+# Get files count
+# ----------------------------------------------------
+def get_files_count(p_params, p_date):
+
+    # seeded run draws number of files in a day from the seed and the date, so
+    # all shards see the same files and cdc run knows all its files in advance;
+    # sharded run requires seed and cdc run is always seeded
+    if p_params['seed'] == None:
+        return get_random_integer(p_params['minfiles'], p_params['maxfiles'])
+
+    v_random = random.Random('{}:{}'.format(p_params['seed'], p_date.isoformat()))
+    return v_random.randrange(p_params['minfiles'], p_params['maxfiles']+1)
+
+
+# ----------------------------------------------------
+# Get run files count
+# ----------------------------------------------------
+def get_run_files_count(p_params):
+
+    v_run_files_count = 0
+    v_current_date = p_params['fromdate']
+    while v_current_date <= p_params['todate']:
+        v_run_files_count = v_run_files_count + get_files_count(p_params, v_current_date)
+        v_current_date = v_current_date + datetime.timedelta(days=1)
+
+    return v_run_files_count
+
+
+# ----------------------------------------------------
+# Get file seed
+# ----------------------------------------------------
+def get_file_seed(p_params, p_date, p_current_file):
+
+    if p_params['seed'] == None:
+        return None
+
+    return '{}:{}:{}'.format(p_params['seed'], p_date.isoformat(), p_current_file)
+
+
+# ----------------------------------------------------
+# Get work unit keys
+# ----------------------------------------------------
+def get_work_unit_keys(p_params, p_completed=None):
+
+    # files are assigned to shards round-robin in order of dates and file numbers
+    (v_shard_index, v_shard_count) = p_params['shard']
+    v_ordinal = 0
+
+    # Loop over dates
+    v_current_date = p_params['fromdate']
+    while v_current_date <= p_params['todate']:
+        g_logger.debug ('Processing date {0}'.format(v_current_date.strftime('%Y%0m%0d')))
+
+        # Loop over files in the day
+        v_files_count = get_files_count(p_params, v_current_date)
+        for v_current_file in range(1,v_files_count+1):
+
+            # Skip files of other shards
+            v_ordinal = v_ordinal + 1
+            if (v_ordinal - 1) % v_shard_count != v_shard_index:
+                continue
+
+            # Skip files written before resume
+            if p_completed != None and (v_current_date.isoformat(), v_current_file) in p_completed:
+                continue
+
+            yield (v_current_date, v_files_count, v_current_file, v_ordinal)
+
+        # Go to the next day
+        v_current_date = v_current_date + datetime.timedelta(days=1)
+
+
+# ----------------------------------------------------
+# Get work unit
+# ----------------------------------------------------
+def get_work_unit(p_params, p_key, p_changes=None):
+
+    (v_date, v_files_count, v_current_file, v_ordinal) = p_key
+
+    # Get file name
+    v_start = time.perf_counter()
+    v_file_name = get_file_name(p_params,v_date,v_files_count,v_current_file)
+    v_name_sec = time.perf_counter() - v_start
+    g_logger.debug ('Generating file {0}'.format(v_file_name))
+
+    return {
+        "date": v_date,
+        "files_count": v_files_count,
+        "number": v_current_file,
+        "file_name": v_file_name,
+        "name_sec": v_name_sec,
+        "seed": get_file_seed(p_params, v_date, v_current_file),
+        "changes": p_changes
+    }
+
+
+# ----------------------------------------------------
+# Get work units
+# ----------------------------------------------------
+def get_work_units(p_params, p_completed=None, p_index_count=None):
+
+    # every file of cdc run changes documents of its own segment of the index,
+    # so no document is changed twice by one run; resumed run splits the index
+    # as it was when the journaled run started
+    if p_params['scenario'] == 'cdc':
+        v_index_count = p_index_count if p_index_count != None else get_document_index_count(p_params['docindex'])
+        v_run_files_count = get_run_files_count(p_params)
+
+    for v_key in get_work_unit_keys(p_params, p_completed):
+        v_ordinal = v_key[3]
+        if p_params['scenario'] == 'cdc':
+            yield get_work_unit(p_params, v_key, (v_index_count * (v_ordinal - 1) // v_run_files_count, v_index_count * v_ordinal // v_run_files_count))
+        else:
+            yield get_work_unit(p_params, v_key)
+
+
+# ----------------------------------------------------
+# Get unit cost
+# ----------------------------------------------------
+def get_unit_cost(p_params, p_seed):
+
+    # cost is the estimated size of the file, from its document and line counts
+    (v_document_count, v_line_count) = get_planned_counts(p_params, p_seed)
+    return v_document_count * g_invoice_estimate['header_bytes'] + v_line_count * g_invoice_estimate['line_bytes']
+
+
+# ----------------------------------------------------
+# Get scheduled units
+# ----------------------------------------------------
+def get_scheduled_units(p_params, p_completed=None, p_index_count=None, p_metrics=None):
+
+    if p_params['schedule'] == 'order':
+        return get_work_units(p_params, p_completed, p_index_count)
+
+    # units of all dates are put to buckets by estimated cost, 8 buckets per
+    # doubling, and taken from the biggest bucket first, so the last units are
+    # small and all workers and uploaders finish together; only the date, the
+    # number and the cost of every unit are kept, packed in arrays, and names
+    # are assigned per date when the unit is taken, so they do not depend on
+    # the order
+    v_buckets = {}
+    v_files_counts = {}
+    v_scheduled_count = 0
+    v_scheduled_cost = 0.0
+
+    for (v_date, v_files_count, v_current_file, v_ordinal) in get_work_unit_keys(p_params, p_completed):
+        v_cost = get_unit_cost(p_params, get_file_seed(p_params, v_date, v_current_file))
+        v_bucket = int(math.log2(max(v_cost, 1.0)) * 8)
+        if v_bucket not in v_buckets:
+            v_buckets[v_bucket] = (array.array('q'), array.array('d'))
+        v_buckets[v_bucket][0].append(v_date.toordinal() * g_schedule_max_files + v_current_file)
+        v_buckets[v_bucket][1].append(v_cost)
+        v_files_counts[v_date] = v_files_count
+        v_scheduled_count = v_scheduled_count + 1
+        v_scheduled_cost = v_scheduled_cost + v_cost
+
+    # progress of the run is the estimated size of completed units
+    if p_metrics != None:
+        with p_metrics['lock']:
+            p_metrics['scheduled_file_count'] = v_scheduled_count
+            p_metrics['scheduled_cost'] = v_scheduled_cost
+
+    g_logger.info ('Scheduled {} files with estimated {} bytes, biggest first'.format(v_scheduled_count, round(v_scheduled_cost)))
+    return get_bucketed_units(p_params, v_buckets, v_files_counts)
+
+
+# ----------------------------------------------------
+# Get bucketed units
+# ----------------------------------------------------
+def get_bucketed_units(p_params, p_buckets, p_files_counts):
+
+    for v_bucket in sorted(p_buckets, reverse=True):
+        (v_keys, v_costs) = p_buckets.pop(v_bucket)
+        for (v_key, v_cost) in zip(v_keys, v_costs):
+            v_date = datetime.date.fromordinal(v_key // g_schedule_max_files)
+            v_unit = get_work_unit(p_params, (v_date, p_files_counts[v_date], v_key % g_schedule_max_files, None))
+            v_unit['cost'] = v_cost
+            yield v_unit
+
+
+# ----------------------------------------------------
+# Get content result
+# ----------------------------------------------------
+def get_content_result(p_unit, p_result):
+
+    (v_content, v_counters) = p_result
+
+    return (p_unit, v_content, v_counters)
+
+
+# ----------------------------------------------------
+# Get contents
+# ----------------------------------------------------
+def get_contents(p_params, p_units):
+
+    # stream content in parts from the current process
+    if p_params['workers'] == 1 and p_params['partsize'] > 0:
+        for v_unit in p_units:
+            v_counters = get_content_counters()
+            yield (v_unit, get_content_parts(p_params, v_unit['date'], v_counters, v_unit['seed'], v_unit['changes']), v_counters)
+        return
+
+    # generate in the current process
+    if p_params['workers'] == 1:
+        for v_unit in p_units:
+            yield get_content_result(v_unit, get_content(p_params, v_unit['date'], v_unit['seed'], v_unit['changes']))
+        return
+
+    # generate in pool of processes, yielding results as they are completed
+    if p_params['schedule'] == 'size':
+        yield from get_completed_contents(p_params, p_units)
+        return
+
+    # generate in pool of processes, keeping results in order of work units
+    # and limiting number of pending results to bound memory
+    v_max_pending = p_params['workers'] * 2
+    v_pending = collections.deque()
+
+    with multiprocessing.Pool(processes=p_params['workers'], initializer=initialize_worker, initargs=(p_params, g_logger.name)) as v_pool:
+
+        for v_unit in p_units:
+            v_pending.append((v_unit, v_pool.apply_async(get_content, (p_params, v_unit['date'], v_unit['seed'], v_unit['changes']))))
+            if len(v_pending) >= v_max_pending:
+                (v_pending_unit, v_pending_result) = v_pending.popleft()
+                yield get_content_result(v_pending_unit, v_pending_result.get())
+
+        while len(v_pending) > 0:
+            (v_pending_unit, v_pending_result) = v_pending.popleft()
+            yield get_content_result(v_pending_unit, v_pending_result.get())
+
+
+# ----------------------------------------------------
+# Get completed contents
+# ----------------------------------------------------
+def get_completed_contents(p_params, p_units):
+
+    # idle worker takes the next unit from the task queue shared by the pool,
+    # and results are yielded in order of completion, so a big file does not
+    # hold back files submitted after it; number of pending results is limited
+    # to bound memory
+    v_max_pending = p_params['workers'] * 2
+    v_pending_count = 0
+    v_completed = queue.Queue()
+
+    with multiprocessing.Pool(processes=p_params['workers'], initializer=initialize_worker, initargs=(p_params, g_logger.name)) as v_pool:
+
+        for v_unit in p_units:
+            v_pool.apply_async(get_content, (p_params, v_unit['date'], v_unit['seed'], v_unit['changes']),
+                callback=lambda p_result, p_unit=v_unit: v_completed.put((p_unit, p_result, None)),
+                error_callback=lambda p_error, p_unit=v_unit: v_completed.put((p_unit, None, p_error)))
+            v_pending_count = v_pending_count + 1
+            if v_pending_count >= v_max_pending:
+                v_pending_count = v_pending_count - 1
+                yield get_completed_content(v_completed)
+
+        while v_pending_count > 0:
+            v_pending_count = v_pending_count - 1
+            yield get_completed_content(v_completed)
+
+
+# ----------------------------------------------------
+# Get completed content
+# ----------------------------------------------------
+def get_completed_content(p_completed):
+
+    (v_unit, v_result, v_error) = p_completed.get()
+    if v_error != None:
+        raise v_error
+
+    return get_content_result(v_unit, v_result)
+
+
+# ----------------------------------------------------
+# METRICS FUNCTIONS
+# ----------------------------------------------------
+
+# ----------------------------------------------------
+# Get metrics
+# ----------------------------------------------------
+def get_metrics(p_params, p_upload_control):
+
+    # metrics are updated by the main thread and upload threads, and read by
+    # the progress reporter and metrics server, so they are guarded by lock
+    return {
+        "lock": threading.Lock(),
+        "start": time.perf_counter(),
+        "fromdate": p_params['fromdate'],
+        "day_count": max((p_params['todate'] - p_params['fromdate']).days + 1, 0),
+        "progress": 0.0,
+        "scheduled_file_count": None,
+        "scheduled_cost": 0.0,
+        "completed_cost": 0.0,
+        "file_count": 0,
+        "document_count": 0,
+        "line_count": 0,
+        "size_bytes": 0,
+        "upload_count": 0,
+        "upload_bytes": 0,
+        "upload_control": p_upload_control,
+        "stages": {v_stage: {"count": 0, "total_sec": 0.0, "max_sec": 0.0, "buckets": [0] * (len(g_metrics_buckets) + 1)} for v_stage in g_metrics_stages}
+    }
+
+
+# ----------------------------------------------------
+# Observe stage
+# ----------------------------------------------------
+def observe_stage(p_metrics, p_stage, p_seconds):
+
+    # the last bucket counts latencies above the highest bound
+    v_histogram = p_metrics['stages'][p_stage]
+    v_histogram['count'] = v_histogram['count'] + 1
+    v_histogram['total_sec'] = v_histogram['total_sec'] + p_seconds
+    v_histogram['max_sec'] = max(v_histogram['max_sec'], p_seconds)
+
+    v_bucket = 0
+    while v_bucket < len(g_metrics_buckets) and p_seconds > g_metrics_buckets[v_bucket]:
+        v_bucket = v_bucket + 1
+    v_histogram['buckets'][v_bucket] = v_histogram['buckets'][v_bucket] + 1
+
+
+# ----------------------------------------------------
+# Record generated file
+# ----------------------------------------------------
+def record_file(p_metrics, p_unit, p_counters):
+
+    with p_metrics['lock']:
+        p_metrics['file_count'] = p_metrics['file_count'] + 1
+        p_metrics['document_count'] = p_metrics['document_count'] + p_counters['document_count']
+        p_metrics['line_count'] = p_metrics['line_count'] + p_counters['line_count']
+        p_metrics['size_bytes'] = p_metrics['size_bytes'] + p_counters['size_bytes']
+
+        observe_stage(p_metrics, 'name', p_unit['name_sec'])
+        observe_stage(p_metrics, 'generate', p_counters['generate_sec'])
+        observe_stage(p_metrics, 'serialize', p_counters['serialize_sec'])
+        if p_counters['compress_sec'] > 0:
+            observe_stage(p_metrics, 'compress', p_counters['compress_sec'])
+
+        # progress of scheduled run is estimated from the size of completed
+        # units, otherwise from processed days and files of the current day
+        if p_unit.get('cost') != None and p_metrics['scheduled_cost'] > 0:
+            p_metrics['completed_cost'] = p_metrics['completed_cost'] + p_unit['cost']
+            p_metrics['progress'] = p_metrics['completed_cost'] / p_metrics['scheduled_cost']
+        elif p_metrics['day_count'] > 0:
+            v_day = (p_unit['date'] - p_metrics['fromdate']).days
+            p_metrics['progress'] = (v_day + p_unit['number'] / p_unit['files_count']) / p_metrics['day_count']
+
+
+# ----------------------------------------------------
+# Record upload
+# ----------------------------------------------------
+def record_upload(p_metrics, p_seconds, p_content_length):
+
+    with p_metrics['lock']:
+        p_metrics['upload_count'] = p_metrics['upload_count'] + 1
+        p_metrics['upload_bytes'] = p_metrics['upload_bytes'] + p_content_length
+        observe_stage(p_metrics, 'upload', p_seconds)
+
+
+# ----------------------------------------------------
+# Get stage percentile
+# ----------------------------------------------------
+def get_stage_percentile(p_histogram, p_percentile):
+
+    # percentile is interpolated linearly within the bucket that contains it
+    if p_histogram['count'] == 0:
+        return 0.0
+
+    v_rank = p_histogram['count'] * p_percentile / 100
+    v_cumulative = 0
+    v_lower = 0.0
+
+    for (v_bucket, v_bucket_count) in enumerate(p_histogram['buckets']):
+        v_upper = g_metrics_buckets[v_bucket] if v_bucket < len(g_metrics_buckets) else p_histogram['max_sec']
+        if v_bucket_count > 0 and v_cumulative + v_bucket_count >= v_rank:
+            v_value = v_lower + (v_upper - v_lower) * (v_rank - v_cumulative) / v_bucket_count
+            return round(min(v_value, p_histogram['max_sec']),6)
+        v_cumulative = v_cumulative + v_bucket_count
+        v_lower = v_upper
+
+    return round(p_histogram['max_sec'],6)
+
+
+# ----------------------------------------------------
+# Get stage statistics
+# ----------------------------------------------------
+def get_stage_statistics(p_metrics):
+
+    # histogram has cumulative counts of latencies less than or equal to the bound
+    v_statistics = {}
+
+    with p_metrics['lock']:
+        for v_stage in g_metrics_stages:
+            v_histogram = p_metrics['stages'][v_stage]
+            v_bounds = [str(v_bound) for v_bound in g_metrics_buckets] + ['+Inf']
+            v_statistics[v_stage] = {
+                "count": v_histogram['count'],
+                "total_sec": round(v_histogram['total_sec'],6),
+                "avg_sec": round(v_histogram['total_sec']/v_histogram['count'],6) if v_histogram['count'] > 0 else 0.0,
+                "max_sec": round(v_histogram['max_sec'],6),
+                "p50_sec": get_stage_percentile(v_histogram, 50),
+                "p95_sec": get_stage_percentile(v_histogram, 95),
+                "p99_sec": get_stage_percentile(v_histogram, 99),
+                "histogram": dict(zip(v_bounds, itertools.accumulate(v_histogram['buckets'])))
+            }
+
+    return v_statistics
+
+
+# ----------------------------------------------------
+# Get progress
+# ----------------------------------------------------
+def get_progress(p_metrics, p_previous=None):
+
+    # current rates are computed since the previous progress record
+    with p_metrics['lock']:
+        v_elapsed_sec = time.perf_counter() - p_metrics['start']
+        v_progress = {
+            "elapsed_sec": round(v_elapsed_sec,3),
+            "file_count": p_metrics['file_count'],
+            "scheduled_file_count": p_metrics['scheduled_file_count'],
+            "document_count": p_metrics['document_count'],
+            "line_count": p_metrics['line_count'],
+            "size_bytes": p_metrics['size_bytes'],
+            "upload_count": p_metrics['upload_count'],
+            "upload_bytes": p_metrics['upload_bytes'],
+            "progress_pct": round(p_metrics['progress']*100,2)
+        }
+        v_upload = p_metrics['stages']['upload']
+        v_percentiles = [get_stage_percentile(v_upload, v_percentile) for v_percentile in (50, 95, 99)]
+        v_fraction = p_metrics['progress']
+
+    if p_previous == None:
+        p_previous = {"elapsed_sec": 0.0, "upload_count": 0, "upload_bytes": 0}
+    v_interval_sec = max(v_progress['elapsed_sec'] - p_previous['elapsed_sec'], 0.001)
+
+    v_progress['current_mb_per_sec'] = round((v_progress['upload_bytes'] - p_previous['upload_bytes'])/v_interval_sec/1000000,3)
+    v_progress['avg_mb_per_sec'] = round(v_progress['upload_bytes']/max(v_elapsed_sec,0.001)/1000000,3)
+    v_progress['current_files_per_sec'] = round((v_progress['upload_count'] - p_previous['upload_count'])/v_interval_sec,3)
+    v_progress['avg_files_per_sec'] = round(v_progress['upload_count']/max(v_elapsed_sec,0.001),3)
+    (v_progress['upload_p50_sec'], v_progress['upload_p95_sec'], v_progress['upload_p99_sec']) = v_percentiles
+    v_progress['eta_sec'] = round(v_elapsed_sec*(1-v_fraction)/v_fraction,1) if v_fraction > 0 else None
+
+    return v_progress
+
+
+# ----------------------------------------------------
+# Start progress reporter
+# ----------------------------------------------------
+def start_progress_reporter(p_params, p_metrics):
+
+    if p_params['progress'] == 0:
+        return None
+
+    v_reporter = {"stop": threading.Event()}
+    v_reporter['thread'] = threading.Thread(target=run_progress_reporter, args=(v_reporter, p_params, p_metrics), name='progress', daemon=True)
+    v_reporter['thread'].start()
+
+    return v_reporter
+
+
+# ----------------------------------------------------
+# Run progress reporter
+# ----------------------------------------------------
+def run_progress_reporter(p_reporter, p_params, p_metrics):
+
+    v_progress = None
+    while not p_reporter['stop'].wait(p_params['progress']):
+        v_progress = get_progress(p_metrics, v_progress)
+        g_logger.info ('Progress {}'.format(json.dumps(v_progress)))
+
+
+# ----------------------------------------------------
+# Stop progress reporter
+# ----------------------------------------------------
+def stop_progress_reporter(p_reporter):
+
+    if p_reporter != None:
+        p_reporter['stop'].set()
+        p_reporter['thread'].join()
+
+
+# ----------------------------------------------------
+# Get prometheus metrics
+# ----------------------------------------------------
+def get_prometheus_metrics(p_metrics):
+
+    v_progress = get_progress(p_metrics)
+    v_statistics = get_stage_statistics(p_metrics)
+    v_upload_statistics = get_upload_statistics(p_metrics['upload_control'])
+    v_lines = []
+
+    for (v_name, v_type, v_help, v_value) in (
+        ('filegen_files_total', 'counter', 'Number of generated files', v_progress['file_count']),
+        ('filegen_documents_total', 'counter', 'Number of generated documents', v_progress['document_count']),
+        ('filegen_lines_total', 'counter', 'Number of generated invoice lines', v_progress['line_count']),
+        ('filegen_size_bytes_total', 'counter', 'Size of generated content before compression', v_progress['size_bytes']),
+        ('filegen_uploaded_files_total', 'counter', 'Number of files written to sink', v_progress['upload_count']),
+        ('filegen_uploaded_bytes_total', 'counter', 'Number of bytes written to sink', v_progress['upload_bytes']),
+        ('filegen_upload_retries_total', 'counter', 'Number of retried object storage requests', v_upload_statistics['retry_count']),
+        ('filegen_upload_throttled_total', 'counter', 'Number of object storage requests rejected by throttling', v_upload_statistics['throttled_count']),
+        ('filegen_upload_concurrency', 'gauge', 'Current limit of concurrent object storage requests', v_upload_statistics['concurrency']),
+        ('filegen_elapsed_seconds', 'gauge', 'Time since start of the run', v_progress['elapsed_sec']),
+        ('filegen_progress_ratio', 'gauge', 'Estimated fraction of the run completed', round(v_progress['progress_pct']/100,4)),
+        ('filegen_eta_seconds', 'gauge', 'Estimated time to completion', v_progress['eta_sec'])
+    ):
+        if v_value != None:
+            v_lines.append('# HELP {} {}'.format(v_name, v_help))
+            v_lines.append('# TYPE {} {}'.format(v_name, v_type))
+            v_lines.append('{} {}'.format(v_name, v_value))
+
+    v_lines.append('# HELP filegen_stage_seconds Duration of stage of file processing')
+    v_lines.append('# TYPE filegen_stage_seconds histogram')
+    for v_stage in g_metrics_stages:
+        for (v_bound, v_count) in v_statistics[v_stage]['histogram'].items():
+            v_lines.append('filegen_stage_seconds_bucket{{stage="{}",le="{}"}} {}'.format(v_stage, v_bound, v_count))
+        v_lines.append('filegen_stage_seconds_sum{{stage="{}"}} {}'.format(v_stage, v_statistics[v_stage]['total_sec']))
+        v_lines.append('filegen_stage_seconds_count{{stage="{}"}} {}'.format(v_stage, v_statistics[v_stage]['count']))
+
+    return '\n'.join(v_lines) + '\n'
+
+
+# ----------------------------------------------------
+# Metrics request handler
+# ----------------------------------------------------
+class MetricsRequestHandler(http.server.BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path not in ('/', '/metrics'):
+            self.send_error(404)
+            return
+        v_body = get_prometheus_metrics(self.server.metrics).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(v_body)))
+        self.end_headers()
+        self.wfile.write(v_body)
+
+    def log_message(self, p_format, *p_args):
+        g_logger.debug ('Metrics request {}'.format(p_format % p_args))
+
+
+# ----------------------------------------------------
+# Start metrics server
+# ----------------------------------------------------
+def start_metrics_server(p_params, p_metrics):
+
+    # metrics are served in prometheus text format on the local host only
+    if p_params['metricsport'] == 0:
+        return None
+
+    v_server = http.server.ThreadingHTTPServer(('127.0.0.1', p_params['metricsport']), MetricsRequestHandler)
+    v_server.daemon_threads = True
+    v_server.metrics = p_metrics
+    threading.Thread(target=v_server.serve_forever, name='metrics', daemon=True).start()
+    g_logger.info ('Serving metrics on http://127.0.0.1:{}/metrics'.format(p_params['metricsport']))
+
+    return v_server
+
+
+# ----------------------------------------------------
+# Stop metrics server
+# ----------------------------------------------------
+def stop_metrics_server(p_server):
+
+    if p_server != None:
+        p_server.shutdown()
+        p_server.server_close()
+
+
+# ----------------------------------------------------
+# MANIFEST FUNCTIONS
+# ----------------------------------------------------
+
+# ----------------------------------------------------
+# Get file record
+# ----------------------------------------------------
+def get_file_record(p_params, p_unit, p_counters):
+
+    # size_bytes is the size of the written object, content_bytes the size of
+    # uncompressed content
+    if p_params['compress'] != 'none' and p_params['scenario'] != 'parquet':
+        v_file_size = p_counters['compressed_bytes']
+    else:
+        v_file_size = p_counters['size_bytes']
+
+    return {
+        "name": p_unit['file_name'],
+        "date": p_unit['date'].isoformat(),
+        "number": p_unit['number'],
+        "size_bytes": v_file_size,
+        "content_bytes": p_counters['size_bytes'],
+        "document_count": p_counters['document_count'],
+        "line_count": p_counters['line_count'],
+        "target_bytes": p_counters['target_bytes'] if p_params['targetsize'] != None else None,
+        "md5": p_counters['md5'],
+        "hash": p_counters['hash']
+    }
 
-    return v_file_name
+
+# ----------------------------------------------------
+# Get file totals
+# ----------------------------------------------------
+def get_file_totals():
+
+    return {
+        "file_count": 0,
+        "document_count": 0,
+        "line_count": 0,
+        "size_bytes": 0,
+        "compressed_size_bytes": 0,
+        "min_file_size_bytes": None,
+        "max_file_size_bytes": 0,
+        "on_target_file_count": 0,
+        "max_deviation_bytes": 0
+    }
 
 
 # ----------------------------------------------------
-# Get object storage client
+# Add file totals
 # ----------------------------------------------------
-def get_object_storage_client():
+def add_file_totals(p_totals, p_record):
 
-    v_oci_config = oci.config.from_file('~/.oci/config', 'DEFAULT')
-    v_oci_object_storage_client = oci.object_storage.ObjectStorageClient(config=v_oci_config)
+    p_totals['file_count'] = p_totals['file_count'] + 1
+    p_totals['document_count'] = p_totals['document_count'] + p_record['document_count']
+    p_totals['line_count'] = p_totals['line_count'] + p_record['line_count']
+    p_totals['size_bytes'] = p_totals['size_bytes'] + p_record['content_bytes']
+    p_totals['compressed_size_bytes'] = p_totals['compressed_size_bytes'] + p_record['size_bytes']
+    p_totals['min_file_size_bytes'] = p_record['size_bytes'] if p_totals['min_file_size_bytes'] == None else min(p_totals['min_file_size_bytes'], p_record['size_bytes'])
+    p_totals['max_file_size_bytes'] = max(p_totals['max_file_size_bytes'], p_record['size_bytes'])
+    if p_record['target_bytes'] != None:
+        p_totals['max_deviation_bytes'] = max(p_totals['max_deviation_bytes'], abs(p_record['size_bytes'] - p_record['target_bytes']))
+        p_totals['on_target_file_count'] = p_totals['on_target_file_count'] + (1 if p_record['size_bytes'] == p_record['target_bytes'] else 0)
 
-    return v_oci_object_storage_client
+
+# ----------------------------------------------------
+# Write manifest
+# ----------------------------------------------------
+def write_manifest(p_file_name, p_statistics, p_objects):
+
+    # manifest is written to temporary file and renamed, so it is never partial
+    v_temporary_name = p_file_name + '.tmp'
+    with open(v_temporary_name, 'w') as v_file:
+        json.dump({"statistics": p_statistics, "objects": p_objects}, v_file)
+    os.replace(v_temporary_name, p_file_name)
+
+    g_logger.info ('Manifest with {} objects written to {}'.format(len(p_objects), p_file_name))
 
 
 # ----------------------------------------------------
-# Write file to object storage
+# Merge stage statistics
+# ----------------------------------------------------
+def merge_stage_statistics(p_stages):
+
+    # histograms of shards are added bucket by bucket, and percentiles are
+    # computed from the merged histogram
+    v_metrics = {"lock": threading.Lock(), "stages": {}}
+
+    for v_stage in g_metrics_stages:
+        v_histogram = {"count": 0, "total_sec": 0.0, "max_sec": 0.0, "buckets": [0] * (len(g_metrics_buckets) + 1)}
+        for v_stages in p_stages:
+            v_statistics = v_stages[v_stage]
+            v_histogram['count'] = v_histogram['count'] + v_statistics['count']
+            v_histogram['total_sec'] = v_histogram['total_sec'] + v_statistics['total_sec']
+            v_histogram['max_sec'] = max(v_histogram['max_sec'], v_statistics['max_sec'])
+            v_cumulative = list(v_statistics['histogram'].values())
+            for v_bucket in range(len(v_cumulative)):
+                v_histogram['buckets'][v_bucket] = v_histogram['buckets'][v_bucket] + v_cumulative[v_bucket] - (v_cumulative[v_bucket-1] if v_bucket > 0 else 0)
+        v_metrics['stages'][v_stage] = v_histogram
+
+    return get_stage_statistics(v_metrics)
+
+
+# ----------------------------------------------------
+# Merge manifests
+# ----------------------------------------------------
+def merge_manifests(p_file_names):
+
+    # statistics of all shards of one run are combined into statistics of the whole run
+    v_statistics = []
+    for v_file_name in p_file_names:
+        with open(v_file_name) as v_file:
+            v_statistics.append(json.load(v_file)['statistics'])
+
+    if len(v_statistics) == 0:
+        g_logger.error ('Missing manifests to merge')
+        sys.exit(2)
+
+    v_first = v_statistics[0]
+    v_shard_count = int(v_first['shard'].split('/')[1])
+    v_shard_indexes = sorted([int(v_node['shard'].split('/')[0]) for v_node in v_statistics])
+
+    if v_shard_indexes != list(range(v_shard_count)):
+        g_logger.error ('Manifests must contain every shard of {} shards exactly once, found shards {}'.format(v_shard_count, v_shard_indexes))
+        sys.exit(2)
+    for v_node in v_statistics:
+        for v_key in ('scenario', 'pattern', 'from_date', 'to_date', 'compress', 'seed', 'customer_count', 'checksums'):
+            if v_node[v_key] != v_first[v_key]:
+                g_logger.error ('Manifests of different runs, "{}" is {} and {}'.format(v_key, v_first[v_key], v_node[v_key]))
+                sys.exit(2)
+        for v_key in ('document_index', 'plan'):
+            if (v_node[v_key] == None) != (v_first[v_key] == None):
+                g_logger.error ('Manifests of different runs, "{}" is recorded only by some shards'.format(v_key))
+                sys.exit(2)
+
+    v_results = dict(v_first)
+    for v_key in ('file_count', 'document_count', 'line_count', 'size_bytes', 'compressed_size_bytes', 'resumed_file_count'):
+        v_results[v_key] = sum([v_node[v_key] for v_node in v_statistics])
+
+    v_start_datetime = min([datetime.datetime.strptime(v_node['start_datetime'], '%Y/%m/%d %H:%M:%S,%f') for v_node in v_statistics])
+    v_end_datetime = max([datetime.datetime.strptime(v_node['end_datetime'], '%Y/%m/%d %H:%M:%S,%f') for v_node in v_statistics])
+    v_nodes_with_files = [v_node for v_node in v_statistics if v_node['file_count'] > 0]
+
+    v_results['start_datetime'] = v_start_datetime.strftime('%Y/%0m/%0d %H:%M:%S,%f')
+    v_results['end_datetime'] = v_end_datetime.strftime('%Y/%0m/%0d %H:%M:%S,%f')
+    v_results['elapsed_sec'] = (v_end_datetime - v_start_datetime).total_seconds()
+    v_results['avg_document_size_bytes'] = round(v_results['size_bytes']/v_results['file_count'],2) if v_results['file_count'] > 0 else 0
+    v_results['min_file_size_bytes'] = min([v_node['min_file_size_bytes'] for v_node in v_nodes_with_files]) if len(v_nodes_with_files) > 0 else 0
+    v_results['avg_file_size_bytes'] = round(v_results['compressed_size_bytes']/v_results['file_count'],2) if v_results['file_count'] > 0 else 0
+    v_results['max_file_size_bytes'] = max([v_node['max_file_size_bytes'] for v_node in v_statistics])
+    v_results['throttled_sec'] = round(sum([v_node['throttled_sec'] for v_node in v_statistics]),3)
+    v_results['uploads'] = {
+        "request_count": sum([v_node['uploads']['request_count'] for v_node in v_statistics]),
+        "retry_count": sum([v_node['uploads']['retry_count'] for v_node in v_statistics]),
+        "throttled_count": sum([v_node['uploads']['throttled_count'] for v_node in v_statistics]),
+        "backoff_sec": round(sum([v_node['uploads']['backoff_sec'] for v_node in v_statistics]),3),
+        "min_concurrency": min([v_node['uploads']['min_concurrency'] for v_node in v_statistics]),
+        "concurrency": min([v_node['uploads']['concurrency'] for v_node in v_statistics])
+    }
+    v_results['dimensions'] = [v_name for v_node in v_statistics for v_name in v_node['dimensions']]
+    v_results['shard'] = '0/1'
+    v_results['stages'] = merge_stage_statistics([v_node['stages'] for v_node in v_statistics])
+
+    # every shard has its own index and plan, so their counts are added, and
+    # shards of planned run are estimated to run in parallel
+    if v_first['document_index'] != None:
+        v_results['document_index'] = {v_key: sum([v_node['document_index'][v_key] for v_node in v_statistics]) for v_key in v_first['document_index']}
+
+    if v_first['plan'] != None:
+        v_results['plan'] = {v_key: sum([v_node['plan'][v_key] for v_node in v_statistics]) for v_key in v_first['plan']}
+        v_results['plan']['elapsed_sec'] = max([v_node['plan']['elapsed_sec'] for v_node in v_statistics])
+
+    if v_first['target_size_bytes'] != None:
+        v_results['target_size_bytes'] = dict(v_first['target_size_bytes'])
+        v_results['target_size_bytes']['on_target_file_count'] = sum([v_node['target_size_bytes']['on_target_file_count'] for v_node in v_statistics])
+        v_results['target_size_bytes']['max_deviation_bytes'] = max([v_node['target_size_bytes']['max_deviation_bytes'] for v_node in v_statistics])
+
+    return v_results
+
+
+# ----------------------------------------------------
+# VERIFY FUNCTIONS
+# ----------------------------------------------------
+
+# ----------------------------------------------------
+# Get verify prefixes
+# ----------------------------------------------------
+def get_verify_prefixes(p_names):
+
+    # objects are listed in parallel by their first directory, like date=${date}/,
+    # or together by common prefix when some objects are not in a directory
+    v_prefixes = set()
+    for v_name in p_names:
+        v_position = v_name.find('/')
+        if v_position < 0:
+            return [os.path.commonprefix(list(p_names))]
+        v_prefixes.add(v_name[0:v_position+1])
+
+    return sorted(v_prefixes)
+
+
+# ----------------------------------------------------
+# List sink objects
 # ----------------------------------------------------
-def write_file_to_object_storage(p_content, p_client, p_namespace, p_bucket, p_object_name):
+def list_sink_objects(p_sink, p_namespace, p_bucket, p_prefix):
 
+    # one request lists up to 1000 objects with their sizes and MD5
+    v_objects = {}
+    v_start = None
+    v_client = p_sink['clients'].get()
     try:
-        v_content_length = len(p_content)
-        v_response = p_client.put_object(
-            namespace_name = p_namespace,
-            bucket_name = p_bucket,
-            object_name = p_object_name,
-            put_object_body = p_content,
-            content_length = v_content_length,
-            content_type = 'application/json',
-            content_disposition = 'attachment'
-        )
-    except oci.exceptions.ServiceError as e:
-        g_logger.error ('Writing object failed with status {}, code {}, message {}'.format(e.status, e.code, e.message))
-        raise
+        while True:
+            v_response = call_with_retry(p_sink['control'], p_prefix, v_client.list_objects,
+                namespace_name = p_namespace,
+                bucket_name = p_bucket,
+                prefix = p_prefix,
+                start = v_start,
+                limit = 1000,
+                fields = 'name,size,md5'
+            )
+            for v_object in v_response.data.objects:
+                v_objects[v_object.name] = (v_object.size, v_object.md5)
+            v_start = v_response.data.next_start_with
+            if v_start == None:
+                return v_objects
+    finally:
+        p_sink['clients'].put(v_client)
+
+
+# ----------------------------------------------------
+# Verify listed object
+# ----------------------------------------------------
+def verify_listed_object(p_record, p_listed):
+
+    # MD5 of object written by multipart upload is MD5 of its parts, so only
+    # its size is verified
+    if p_listed == None:
+        return ({"name": p_record['name'], "problem": "missing"}, False)
+
+    (v_size, v_md5) = p_listed
+    if v_size != p_record['size_bytes']:
+        return ({"name": p_record['name'], "problem": "size", "expected": p_record['size_bytes'], "actual": v_size}, False)
+    if p_record.get('md5') == None or v_md5 == None or '-' in v_md5:
+        return (None, False)
+    if v_md5 != p_record['md5']:
+        return ({"name": p_record['name'], "problem": "md5", "expected": p_record['md5'], "actual": v_md5}, True)
+
+    return (None, True)
+
+
+# ----------------------------------------------------
+# Verify local object
+# ----------------------------------------------------
+def verify_local_object(p_directory, p_hash, p_record):
+
+    # faster hash is verified instead of MD5 when both were computed
+    v_path = os.path.join(p_directory, p_record['name'])
+    try:
+        v_size = os.stat(v_path).st_size
+    except FileNotFoundError:
+        return ({"name": p_record['name'], "problem": "missing"}, False)
+
+    if v_size != p_record['size_bytes']:
+        return ({"name": p_record['name'], "problem": "size", "expected": p_record['size_bytes'], "actual": v_size}, False)
+
+    if p_record.get('hash') != None:
+        (v_md5, v_hash) = get_file_checksums(v_path, False, p_hash)
+        if v_hash != p_record['hash']:
+            return ({"name": p_record['name'], "problem": "hash", "expected": p_record['hash'], "actual": v_hash}, True)
+    elif p_record.get('md5') != None:
+        (v_md5, v_hash) = get_file_checksums(v_path, True, 'none')
+        if v_md5 != p_record['md5']:
+            return ({"name": p_record['name'], "problem": "md5", "expected": p_record['md5'], "actual": v_md5}, True)
+    else:
+        return (None, False)
+
+    return (None, True)
+
+
+# ----------------------------------------------------
+# Verify manifests
+# ----------------------------------------------------
+def verify_manifests(p_argv):
+
+    v_start = time.perf_counter()
+    v_threads = g_verify_threads
+
+    try:
+        (v_opts, v_args) = getopt.getopt(p_argv, '', ['threads='])
+    except getopt.GetoptError:
+        g_logger.error ('Unknown parameter or parameter with missing value')
+        sys.exit(2)
+    for v_opt, v_arg in v_opts:
+        if v_opt == '--threads':
+            v_threads = int(v_arg)
+
+    # manifests of all shards of one run are verified together
+    v_statistics = []
+    v_objects = []
+    for v_file_name in v_args:
+        with open(v_file_name) as v_file:
+            v_manifest = json.load(v_file)
+        v_statistics.append(v_manifest['statistics'])
+        v_objects.extend(v_manifest['objects'])
+
+    if len(v_statistics) == 0:
+        g_logger.error ('Missing manifests to verify')
+        sys.exit(2)
+
+    v_first = v_statistics[0]
+    for v_node in v_statistics:
+        for v_key in ('sink', 'namespace', 'bucket', 'directory'):
+            if v_node.get(v_key) != v_first.get(v_key):
+                g_logger.error ('Manifests of different sinks, "{}" is {} and {}'.format(v_key, v_first[v_key], v_node[v_key]))
+                sys.exit(2)
+
+    if v_first['sink'] == 'null':
+        g_logger.error ('Objects written to null sink cannot be verified')
+        sys.exit(2)
+
+    # objects are listed in namespace and bucket recorded in the manifest, not in
+    # namespace of the tenancy of the client
+    if v_first['sink'] == 'oci' and v_first.get('namespace') == None:
+        g_logger.error ('Manifests do not record namespace of the bucket, written by older version')
+        sys.exit(2)
+
+    v_hash = v_first.get('checksums', {}).get('hash', 'none')
+    if v_first['sink'] == 'local' and v_hash == 'xxh3' and importlib.util.find_spec('xxhash') == None:
+        g_logger.error ('Manifests with hash "xxh3" require package xxhash')
+        sys.exit(2)
+
+    # objects in bucket are listed, local files are checked by stat and hash,
+    # both by v_threads threads in parallel
+    with concurrent.futures.ThreadPoolExecutor(max_workers=v_threads) as v_executor:
+        if v_first['sink'] == 'oci':
+            v_sink = open_sink({"sink": "oci", "uploaders": v_threads}, get_upload_control({"partsize": 0, "uploaders": v_threads, "retries": 5, "retrydelay": 0.2}))
+            v_listed = {}
+            for v_prefix_objects in v_executor.map(lambda p_prefix: list_sink_objects(v_sink, v_first['namespace'], v_first['bucket'], p_prefix), get_verify_prefixes(v_record['name'] for v_record in v_objects)):
+                v_listed.update(v_prefix_objects)
+            v_checks = [verify_listed_object(v_record, v_listed.get(v_record['name'])) for v_record in v_objects]
+        else:
+            v_checks = list(v_executor.map(lambda p_record: verify_local_object(v_first['directory'], v_hash, p_record), v_objects))
+
+    v_problems = [v_problem for (v_problem, v_checked) in v_checks if v_problem != None]
+    v_results = {
+        "sink": v_first['sink'],
+        "namespace": v_first.get('namespace'),
+        "bucket": v_first['bucket'],
+        "directory": v_first['directory'],
+        "manifest_count": len(v_statistics),
+        "object_count": len(v_objects),
+        "verified_count": len(v_objects) - len(v_problems),
+        "checksum_count": sum([1 for (v_problem, v_checked) in v_checks if v_checked]),
+        "missing_count": sum([1 for v_problem in v_problems if v_problem['problem'] == 'missing']),
+        "size_mismatch_count": sum([1 for v_problem in v_problems if v_problem['problem'] == 'size']),
+        "checksum_mismatch_count": sum([1 for v_problem in v_problems if v_problem['problem'] in ('md5', 'hash')]),
+        "elapsed_sec": round(time.perf_counter() - v_start, 3),
+        "problems": v_problems[0:100]
+    }
+
+    print(json.dumps(v_results))
+
+    if len(v_problems) > 0:
+        sys.exit(1)
+
+
+# ----------------------------------------------------
+# PLAN FUNCTIONS
+# ----------------------------------------------------
+
+# ----------------------------------------------------
+# Get planned counts
+# ----------------------------------------------------
+def get_planned_counts(p_params, p_seed):
+
+    # counts are drawn in the same order as from get_random_count() while
+    # the file is generated
+    v_random = random.Random('{}:counts'.format(p_seed))
+    v_document_count = v_random.randrange(p_params['mindocs'], p_params['maxdocs']+1)
+    v_line_count = 0
+    for v_current_record in range(v_document_count):
+        v_line_count = v_line_count + v_random.randrange(p_params['minlines'], p_params['maxlines']+1)
+
+    return (v_document_count, v_line_count)
+
+
+# ----------------------------------------------------
+# Get calibration sample
+# ----------------------------------------------------
+def get_calibration_sample(p_params, p_line_count):
+
+    # sample file has as many documents with the given line count as fit
+    # into calibratelines, and is generated with the parameters of the run
+    v_document_count = max(min(p_params['calibratelines'] // p_line_count, 1000), 1)
+    v_params = dict(p_params, mindocs=v_document_count, maxdocs=v_document_count, minlines=p_line_count, maxlines=p_line_count, execute=False, docindex=None, partsize=0)
+    (v_content, v_counters) = get_content(v_params, p_params['fromdate'])
+
+    return {
+        "document_count": v_document_count,
+        "line_count": p_line_count,
+        "size_bytes": v_counters['size_bytes'],
+        "compressed_bytes": len(v_content),
+        "content_sec": v_counters['content_sec']
+    }
+
+
+# ----------------------------------------------------
+# Get calibration model
+# ----------------------------------------------------
+def get_calibration_model(p_samples, p_name):
+
+    # value of document is linear in its line count, fitted through samples
+    # with the minimum and the maximum line count
+    (v_first, v_last) = p_samples
+    v_first_value = v_first[p_name] / v_first['document_count']
+    v_last_value = v_last[p_name] / v_last['document_count']
+
+    if v_last['line_count'] == v_first['line_count']:
+        return {"document": 0.0, "line": v_last_value / v_last['line_count']}
+
+    v_line_value = max((v_last_value - v_first_value) / (v_last['line_count'] - v_first['line_count']), 0.0)
+    return {"document": max(v_first_value - v_line_value * v_first['line_count'], 0.0), "line": v_line_value}
+
+
+# ----------------------------------------------------
+# Get calibration
+# ----------------------------------------------------
+def get_calibration(p_params):
+
+    # the first small file only warms up imports, reference data and slabs
+    get_calibration_sample(dict(p_params, calibratelines=p_params['minlines']), p_params['minlines'])
+    v_samples = (get_calibration_sample(p_params, p_params['minlines']), get_calibration_sample(p_params, p_params['maxlines']))
+
+    return {
+        "size_bytes": get_calibration_model(v_samples, 'size_bytes'),
+        "compressed_bytes": get_calibration_model(v_samples, 'compressed_bytes'),
+        "content_sec": get_calibration_model(v_samples, 'content_sec')
+    }
+
+
+# ----------------------------------------------------
+# Get estimated value
+# ----------------------------------------------------
+def get_estimated_value(p_model, p_document_count, p_line_count):
+    return p_model['document'] * p_document_count + p_model['line'] * p_line_count
+
+
+# ----------------------------------------------------
+# Get plan percentile
+# ----------------------------------------------------
+def get_plan_percentile(p_sorted, p_percentile):
+
+    if len(p_sorted) == 0:
+        return 0
+
+    return p_sorted[min(int(len(p_sorted) * p_percentile / 100), len(p_sorted) - 1)]
+
+
+# ----------------------------------------------------
+# Get plan
+# ----------------------------------------------------
+def get_plan(p_params):
+
+    # files of seeded run and their counts are known before they are generated,
+    # sizes and times are estimated from calibration on this machine
+    v_calibration = get_calibration(p_params)
+    v_files = []
+    v_sizes = []
+    v_document_count = 0
+    v_line_count = 0
+    v_size_bytes = 0.0
+    v_compressed_bytes = 0.0
+    v_content_sec = 0.0
+
+    for v_unit in get_work_units(p_params):
+        (v_file_document_count, v_file_line_count) = get_planned_counts(p_params, v_unit['seed'])
+        v_files.append([v_unit['date'].isoformat(), v_unit['number'], v_unit['files_count'], v_file_document_count, v_file_line_count])
+        v_file_size = get_estimated_value(v_calibration['compressed_bytes'], v_file_document_count, v_file_line_count)
+        v_sizes.append(round(v_file_size))
+        v_document_count = v_document_count + v_file_document_count
+        v_line_count = v_line_count + v_file_line_count
+        v_size_bytes = v_size_bytes + get_estimated_value(v_calibration['size_bytes'], v_file_document_count, v_file_line_count)
+        v_compressed_bytes = v_compressed_bytes + v_file_size
+        v_content_sec = v_content_sec + get_estimated_value(v_calibration['content_sec'], v_file_document_count, v_file_line_count)
+
+    # workers generate files in parallel on at most all cpus, time of
+    # uploads to object storage is not estimated
+    v_sizes.sort()
+    v_parallelism = max(min(p_params['workers'], os.cpu_count() or 1), 1)
+
+    v_estimate = {
+        "file_count": len(v_files),
+        "document_count": v_document_count,
+        "line_count": v_line_count,
+        "size_bytes": round(v_size_bytes),
+        "compressed_size_bytes": round(v_compressed_bytes),
+        "min_file_size_bytes": v_sizes[0] if len(v_sizes) > 0 else 0,
+        "p50_file_size_bytes": get_plan_percentile(v_sizes, 50),
+        "p90_file_size_bytes": get_plan_percentile(v_sizes, 90),
+        "p99_file_size_bytes": get_plan_percentile(v_sizes, 99),
+        "max_file_size_bytes": v_sizes[-1] if len(v_sizes) > 0 else 0,
+        "content_sec": round(v_content_sec, 1),
+        "workers": p_params['workers'],
+        "elapsed_sec": round(v_content_sec / v_parallelism + p_params['sleep'] * len(v_files), 1),
+        "calibration": v_calibration
+    }
+
+    return {"run": get_journal_run(dict(p_params, execute=True)), "seed": p_params['seed'], "estimate": v_estimate, "files": v_files}
+
+
+# ----------------------------------------------------
+# Write plan
+# ----------------------------------------------------
+def write_plan(p_params, p_plan):
+
+    # plan is written to temporary file and renamed, so it is never partial
+    v_temporary_name = p_params['plan'] + '.tmp'
+    with open(v_temporary_name, 'w') as v_file:
+        json.dump(p_plan, v_file)
+    os.replace(v_temporary_name, p_params['plan'])
+
+    g_logger.info ('Plan with {} files written to {}'.format(len(p_plan['files']), p_params['plan']))
+
+
+# ----------------------------------------------------
+# Open plan
+# ----------------------------------------------------
+def open_plan(p_params):
+
+    if p_params['plan'] == None:
+        return None
+
+    # planned run is always seeded, so the executed run generates the
+    # same files with the same counts
+    if not p_params['execute']:
+        if p_params['seed'] == None:
+            p_params['seed'] = uuid.uuid4().hex
+        return None
+
+    try:
+        with open(p_params['plan'], 'r') as v_file:
+            v_plan = json.load(v_file)
+    except (OSError, ValueError) as e:
+        g_logger.error ('Plan {} cannot be read: {}'.format(p_params['plan'], e))
+        sys.exit(2)
+
+    v_run = get_journal_run(p_params)
+    for v_name in g_journal_params:
+        if v_plan['run'][v_name] != v_run[v_name]:
+            g_logger.error ('Parameter "{}" is {}, plan {} was written with {}'.format(v_name, v_run[v_name], p_params['plan'], v_plan['run'][v_name]))
+            sys.exit(2)
+    if p_params['seed'] != None and p_params['seed'] != v_plan['seed']:
+        g_logger.error ('Parameter "seed" is {}, plan {} was written with {}'.format(p_params['seed'], p_params['plan'], v_plan['seed']))
+        sys.exit(2)
+
+    p_params['seed'] = v_plan['seed']
+    g_logger.info ('Executing plan {} with {} files'.format(p_params['plan'], len(v_plan['files'])))
+
+    return {
+        "estimate": v_plan['estimate'],
+        "files": {(v_date, v_number): (v_files_count, v_document_count, v_line_count) for (v_date, v_number, v_files_count, v_document_count, v_line_count) in v_plan['files']},
+        "unplanned_file_count": 0
+    }
+
+
+# ----------------------------------------------------
+# Check planned file
+# ----------------------------------------------------
+def check_planned_file(p_plan, p_unit, p_counters):
+
+    if p_plan == None:
+        return
+
+    v_planned = p_plan['files'].get((p_unit['date'].isoformat(), p_unit['number']))
+    if v_planned != (p_unit['files_count'], p_counters['document_count'], p_counters['line_count']):
+        g_logger.warning ('File {} does not match the plan, planned {}'.format(p_unit['file_name'], v_planned))
+        p_plan['unplanned_file_count'] = p_plan['unplanned_file_count'] + 1
+
+
+# ----------------------------------------------------
+# Get plan results
+# ----------------------------------------------------
+def get_plan_results(p_plan):
+
+    if p_plan == None:
+        return None
+
+    v_results = {v_name: p_plan['estimate'][v_name] for v_name in ('file_count', 'document_count', 'line_count', 'size_bytes', 'compressed_size_bytes', 'elapsed_sec')}
+    v_results['unplanned_file_count'] = p_plan['unplanned_file_count']
+
+    return v_results
+
+
+# ----------------------------------------------------
+# JOURNAL FUNCTIONS
+# ----------------------------------------------------
+
+# ----------------------------------------------------
+# Get journal run
+# ----------------------------------------------------
+def get_journal_run(p_params):
+
+    # parameters are compared as they are stored in journal
+    return json.loads(json.dumps({v_name: p_params[v_name] for v_name in g_journal_params}, default=str))
+
+
+# ----------------------------------------------------
+# Read journal
+# ----------------------------------------------------
+def read_journal(p_file_name):
+
+    # journal has header with the run, followed by one record per written
+    # object, one JSON document per line; the last line cut by failure of the
+    # previous run is ignored, and truncated when the run is resumed
+    v_values = []
+    v_length = 0
+    with open(p_file_name, 'rb') as v_file:
+        for v_line in v_file:
+            try:
+                v_values.append(json.loads(v_line))
+            except ValueError:
+                if v_line.endswith(b'\n') and v_file.read(1) != b'':
+                    g_logger.error ('Journal {} has invalid record at offset {}'.format(p_file_name, v_length))
+                    sys.exit(2)
+                break
+            if not v_line.endswith(b'\n'):
+                v_values.pop()
+                break
+            v_length = v_length + len(v_line)
+
+    if len(v_values) == 0:
+        return (None, [], 0)
+
+    return (v_values[0], v_values[1:], v_length)
 
-    return (v_response, v_content_length)
+
+# ----------------------------------------------------
+# Open journal
+# ----------------------------------------------------
+def open_journal(p_params):
+
+    if p_params['journal'] == None:
+        return None
+
+    v_run = get_journal_run(p_params)
+    v_exists = os.path.exists(p_params['journal'])
+    v_header = None
+    v_records = []
+
+    if v_exists and not p_params['resume']:
+        g_logger.error ('Journal {} already exists, use parameter "resume" to continue the run'.format(p_params['journal']))
+        sys.exit(2)
+
+    if v_exists:
+        (v_header, v_records, v_length) = read_journal(p_params['journal'])
+
+    if v_header != None:
+
+        # resumed run must generate the same files as the journaled run
+        for v_name in g_journal_params:
+            if v_header['run'][v_name] != v_run[v_name]:
+                g_logger.error ('Parameter "{}" is {}, journal {} was written with {}'.format(v_name, v_run[v_name], p_params['journal'], v_header['run'][v_name]))
+                sys.exit(2)
+        if p_params['seed'] != None and p_params['seed'] != v_header['seed']:
+            g_logger.error ('Parameter "seed" is {}, journal {} was written with {}'.format(p_params['seed'], p_params['journal'], v_header['seed']))
+            sys.exit(2)
+
+        p_params['seed'] = v_header['seed']
+        v_file = open(p_params['journal'], 'r+b')
+        v_file.truncate(v_length)
+        v_file.seek(v_length)
+        g_logger.info ('Resuming run from journal {} with {} written objects'.format(p_params['journal'], len(v_records)))
+
+    else:
+
+        # journaled run is always seeded, so resumed run generates the same
+        # number of files and the same object names; with document index, the
+        # header records the index when the run started
+        if p_params['seed'] == None:
+            p_params['seed'] = uuid.uuid4().hex
+        v_header = {"run": v_run, "seed": p_params['seed']}
+        if p_params['docindex'] != None:
+            v_header['document_index'] = {"document_count": get_document_index_count(p_params['docindex']), "object_count": get_document_index_object_count(p_params['docindex'])}
+        v_file = open(p_params['journal'], 'wb')
+        v_file.write((json.dumps(v_header) + '\n').encode('utf-8'))
+        v_file.flush()
+
+    return {
+        "file": v_file,
+        "lock": threading.Lock(),
+        "records": v_records,
+        "completed": set((v_record['date'], v_record['number']) for v_record in v_records),
+        "document_index": v_header.get('document_index')
+    }
+
+
+# ----------------------------------------------------
+# Reconcile document index
+# ----------------------------------------------------
+def reconcile_document_index(p_params, p_journal, p_index):
+
+    # changes of an object are written to the index after its journal record,
+    # so objects journaled but missing in the index after failure are generated
+    # again from their seeds and their changes are written to the index
+    if p_journal == None or p_index == None or len(p_journal['records']) == 0:
+        return
+
+    v_indexed = set(get_document_index_objects(p_params['docindex'], p_journal['document_index']['object_count']))
+    v_missing = dict(((v_record['date'], v_record['number']), v_record['name']) for v_record in p_journal['records'] if v_record['name'] not in v_indexed)
+    if len(v_missing) == 0:
+        return
+
+    for v_unit in get_work_units(p_params, None, p_journal['document_index']['document_count']):
+        v_key = (v_unit['date'].isoformat(), v_unit['number'])
+        if v_key in v_missing:
+            (v_content, v_counters) = get_content(p_params, v_unit['date'], v_unit['seed'], v_unit['changes'])
+            write_document_index(p_index, v_missing[v_key], v_counters['index_changes'])
+
+    g_logger.info ('Document index {} reconciled with journal, {} journaled objects indexed again'.format(p_params['docindex'], len(v_missing)))
+
+
+# ----------------------------------------------------
+# Write journal record
+# ----------------------------------------------------
+def write_journal_record(p_journal, p_record):
+
+    if p_journal == None:
+        return
+
+    # record is written only after the object is written, so resumed run
+    # never skips a missing object
+    with p_journal['lock']:
+        p_journal['file'].write((json.dumps(p_record) + '\n').encode('utf-8'))
+        p_journal['file'].flush()
+
+
+# ----------------------------------------------------
+# Close journal
+# ----------------------------------------------------
+def close_journal(p_journal):
+
+    if p_journal != None:
+        p_journal['file'].close()
 
 
 # ----------------------------------------------------
@@ -534,71 +5526,168 @@ def main(p_argv):
 
     # Initialize
     initialize_logging(p_argv[0], 'INFO');
+
+    # Merge manifests of shards instead of generating
+    if len(p_argv) > 1 and p_argv[1] == 'merge':
+        print(json.dumps(merge_manifests(p_argv[2:])))
+        return
+
+    # Verify objects of manifests in the sink instead of generating
+    if len(p_argv) > 1 and p_argv[1] == 'verify':
+        verify_manifests(p_argv[2:])
+        return
+
+    # Lookup documents in document index instead of generating
+    if len(p_argv) > 2 and p_argv[1] == 'lookup':
+        for v_document in lookup_documents(p_argv[2], p_argv[3:]):
+            print(json.dumps(v_document))
+        return
+
     v_timestamp = {"start_datetime": datetime.datetime.now()}
     v_day_counter = 0
-    v_file_counter = 0
-    v_document_counter = 0
-    v_line_counter = 0
-    v_size_counter = 0
+    v_totals = get_file_totals()
+    v_objects = []
 
     # Get command line parameters
     v_params = get_input_parameters(p_argv)
     g_logger.setLevel(v_params['loglevel'])
     print_input_parameters(v_params)
 
-    # Get object storage client
-    v_oci_object_storage_client = get_object_storage_client()
+    # Compile schema of documents
+    if v_params['schema'] != None:
+        try:
+            get_compiled_schema(v_params['schema'])
+        except SchemaError as e:
+            g_logger.error ('Schema {} is not valid: {}'.format(v_params['schema'], e))
+            sys.exit(2)
 
-    # Loop over dates
-    v_current_date = v_params['fromdate']
-    while v_current_date <= v_params['todate']:
-        g_logger.debug ('Processing date {0}'.format(v_current_date.strftime('%Y%0m%0d')))
+    v_plan = open_plan(v_params)
+    v_journal = open_journal(v_params)
 
-        # Loop over files in the day
-        v_files_count = get_random_integer(v_params['minfiles'], v_params['maxfiles'])
-        for v_current_file in range(1,v_files_count+1):
+    # sized schedule and cdc run draw counts of files before they are generated, so
+    # they are always seeded, with random seed of the run reported in the results
+    if (v_params['schedule'] == 'size' or v_params['scenario'] == 'cdc') and v_params['seed'] == None:
+        v_params['seed'] = uuid.uuid4().hex
+    initialize_seed(v_params)
+    initialize_text_source(v_params)
+    initialize_reference_data(v_params)
 
-            # Get file name
-            v_file_name = get_file_name(v_params,v_current_date,v_files_count,v_current_file)
-            g_logger.debug ('Generating file {0}'.format(v_file_name))
-
-            # Get content
-            (v_content, v_document_count, v_line_count, v_size_bytes) = get_content(v_params, v_current_date)
-
-            # Write content
-            if v_params['scenario'] == 'json':
-                (v_response, v_content_length) = write_file_to_object_storage(
-                     p_content = v_content,
-                     p_client = v_oci_object_storage_client,
-                     p_namespace = v_params['namespace'],
-                     p_bucket = v_params['bucket'],
-                     p_object_name = v_file_name
-                )
+    # Write plan with estimates instead of generating
+    if v_params['plan'] != None and not v_params['execute']:
+        v_plan = get_plan(v_params)
+        write_plan(v_params, v_plan)
+        print(json.dumps(v_plan['estimate']))
+        return
+
+    # Open corpus of replayed documents
+    try:
+        open_corpus(v_params)
+    except (CorpusError, OSError) as e:
+        g_logger.error ('Corpus {} is not valid: {}'.format(v_params['corpus'], e))
+        sys.exit(2)
 
-            # Update statistics
-            v_file_counter = v_file_counter + 1
-            v_document_counter = v_document_counter + v_document_count
-            v_line_counter = v_line_counter + v_line_count
-            v_size_counter = v_size_counter + v_size_bytes
+    # Open document index
+    v_document_index = open_document_index(v_params)
 
-            # Sleep between files
-            time.sleep(v_params['sleep'])
-        
-        # Go to the next day
-        v_current_date = v_current_date + datetime.timedelta(days=1)
-        v_day_counter = v_day_counter + 1
+    # Open sink
+    v_upload_control = get_upload_control(v_params)
+    v_sink = open_sink(v_params, v_upload_control)
+
+    # Write dimensions
+    v_dimensions = write_dimensions(v_params, v_sink)
+
+    # Start metrics
+    v_metrics = get_metrics(v_params, v_upload_control)
+    v_progress_reporter = start_progress_reporter(v_params, v_metrics)
+    v_metrics_server = start_metrics_server(v_params, v_metrics)
+
+    # Start rate control
+    v_rate_control = get_rate_control(v_params)
+
+    # Count files written before resume
+    if v_journal != None:
+        reconcile_document_index(v_params, v_journal, v_document_index)
+        for v_record in v_journal['records']:
+            add_file_totals(v_totals, v_record)
+            if v_params['manifest'] != None:
+                v_objects.append(v_record)
+        v_resumed_file_count = len(v_journal['records'])
+        v_completed = v_journal['completed']
+        v_index_count = v_journal['document_index']['document_count'] if v_journal['document_index'] != None else None
+        v_journal['records'] = None
+    else:
+        v_resumed_file_count = 0
+        v_completed = None
+        v_index_count = None
+
+    # Start upload pipeline
+    if v_params['uploaders'] > 0:
+        v_upload_pipeline = start_upload_pipeline(v_params, v_sink, v_metrics, v_rate_control, v_journal, v_document_index)
+    else:
+        v_upload_pipeline = None
+
+    # Loop over files in all dates
+    for (v_unit, v_content, v_counters) in get_contents(v_params, get_scheduled_units(v_params, v_completed, v_index_count, v_metrics)):
+
+        # Write content, streamed content is written synchronously as it is generated
+        v_streamed = not isinstance(v_content, bytes)
+        if v_params['scenario'] in ('json', 'parquet', 'cdc') and v_upload_pipeline != None and not v_streamed:
+            v_record = get_file_record(v_params, v_unit, v_counters)
+            submit_upload(v_upload_pipeline, v_unit['file_name'], v_content, v_counters['document_count'], v_record, v_counters['index_changes'])
+        elif v_params['scenario'] in ('json', 'parquet', 'cdc'):
+            throttle_file(v_rate_control, v_content, v_counters['document_count'])
+            if v_streamed:
+                v_content = get_throttled_parts(v_rate_control, v_content, v_counters)
+            v_start = time.perf_counter()
+            (v_response, v_content_length) = write_file(v_params, v_content, v_sink, v_unit['file_name'], v_counters)
+            v_upload_sec = time.perf_counter() - v_start
+            # streamed content is generated and throttled while it is written,
+            # and its documents are known only once it is written
+            if v_streamed:
+                v_upload_sec = max(v_upload_sec - v_counters['content_sec'] - v_counters['throttle_sec'], 0.0)
+                acquire_tokens(v_rate_control, 'documents', v_counters['document_count'])
+            record_upload(v_metrics, v_upload_sec, v_content_length)
+            v_record = get_file_record(v_params, v_unit, v_counters)
+            write_journal_record(v_journal, v_record)
+            write_document_index(v_document_index, v_unit['file_name'], v_counters['index_changes'])
+
+        # Update statistics
+        check_planned_file(v_plan, v_unit, v_counters)
+        record_file(v_metrics, v_unit, v_counters)
+        add_file_totals(v_totals, v_record)
+        if v_params['manifest'] != None:
+            v_objects.append(v_record)
+
+        # Sleep between files
+        time.sleep(v_params['sleep'])
+
+    # Wait for remaining uploads
+    if v_upload_pipeline != None:
+        stop_upload_pipeline(v_upload_pipeline)
+
+    # Stop metrics
+    stop_progress_reporter(v_progress_reporter)
+    stop_metrics_server(v_metrics_server)
+    close_journal(v_journal)
+    v_document_index_statistics = close_document_index(v_document_index)
+
+    # Count processed days
+    v_day_counter = max((v_params['todate'] - v_params['fromdate']).days + 1, 0)
 
     # Print statistics
     v_timestamp["end_datetime"] = datetime.datetime.now()
 
-    if v_file_counter > 0:
-        avg_document_size_bytes = round(v_size_counter/v_file_counter,2)
+    if v_totals['file_count'] > 0:
+        avg_document_size_bytes = round(v_totals['size_bytes']/v_totals['file_count'],2)
     else:
         avg_document_size_bytes = 0
 
     v_results = {
         "scenario": v_params["scenario"],
+        "sink": v_params["sink"],
+        "namespace": v_params["namespace"],
         "bucket": v_params["bucket"],
+        "directory": v_params["directory"],
         "pattern": v_params["pattern"],
         "start_datetime": v_timestamp["start_datetime"].strftime('%Y/%0m/%0d %H:%M:%S,%f'),
         "end_datetime": v_timestamp["end_datetime"].strftime('%Y/%0m/%0d %H:%M:%S,%f'),
@@ -606,20 +5695,50 @@ def main(p_argv):
         "from_date": v_params["fromdate"].strftime('%Y/%0m/%0d'),
         "to_date": v_params["todate"].strftime('%Y/%0m/%0d'),
         "day_count": v_day_counter,
-        "file_count": v_file_counter,
-        "document_count": v_document_counter,
-        "line_count": v_line_counter,
-        "size_bytes": v_size_counter,
-        "avg_document_size_bytes": avg_document_size_bytes
+        "file_count": v_totals['file_count'],
+        "document_count": v_totals['document_count'],
+        "line_count": v_totals['line_count'],
+        "size_bytes": v_totals['size_bytes'],
+        "avg_document_size_bytes": avg_document_size_bytes,
+        "compress": v_params["compress"],
+        "compressed_size_bytes": v_totals['compressed_size_bytes'],
+        "min_file_size_bytes": v_totals['min_file_size_bytes'] if v_totals['min_file_size_bytes'] != None else 0,
+        "avg_file_size_bytes": round(v_totals['compressed_size_bytes']/v_totals['file_count'],2) if v_totals['file_count'] > 0 else 0,
+        "max_file_size_bytes": v_totals['max_file_size_bytes'],
+        "target_size_bytes": None,
+        "throttled_sec": get_throttled_sec(v_rate_control),
+        "uploads": get_upload_statistics(v_upload_control),
+        "seed": v_params["seed"],
+        "shard": '{}/{}'.format(v_params['shard'][0], v_params['shard'][1]),
+        "resumed_file_count": v_resumed_file_count,
+        "customer_count": v_params['customers'],
+        "dimensions": v_dimensions,
+        "document_index": v_document_index_statistics,
+        "plan": get_plan_results(v_plan),
+        "checksums": {"md5": v_params['md5'], "hash": v_params['hash']},
+        "stages": get_stage_statistics(v_metrics)
     }
 
+    if v_params['targetsize'] != None:
+        v_results['target_size_bytes'] = {
+            "min": v_params['targetsize'][0],
+            "max": v_params['targetsize'][1],
+            "on_target_file_count": v_totals['on_target_file_count'],
+            "max_deviation_bytes": v_totals['max_deviation_bytes']
+        }
+
     print(json.dumps(v_results))
 
+    # Write manifest
+    if v_params['manifest'] != None:
+        write_manifest(v_params['manifest'], v_results, v_objects)
+
 
 # ----------------------------------------------------
 # Call the main function
 # ----------------------------------------------------
-main(sys.argv)
+if __name__ == '__main__':
+    main(sys.argv)
 
 
 # ----------------------------------------------------
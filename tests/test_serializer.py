@@ -0,0 +1,121 @@
+"""
+Tests of the template serializer of the file generator.
+
+Usage: python -m unittest discover -s tests
+
+Documents written by templates from invoice values must be the same text as json.dumps()
+of the invoice dictionary built from the same values, for the python and numpy engines,
+with default reference data, with customers drawn from pool and for invoices without lines.
+Documents of the compiled invoice schema must be the same text as documents of templates
+drawn from the same random state.
+"""
+
+import datetime
+import importlib.util
+import json
+import os
+import random
+import sys
+import unittest
+
+
+# ----------------------------------------------------
+# Load generator
+# ----------------------------------------------------
+def load_generator():
+
+    v_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'file-gen.py')
+    v_spec = importlib.util.spec_from_file_location('file_gen', v_path)
+    v_module = importlib.util.module_from_spec(v_spec)
+    sys.modules['file_gen'] = v_module
+    v_spec.loader.exec_module(v_module)
+
+    return v_module
+
+
+g_generator = load_generator()
+g_date = datetime.date(2024,9,1)
+
+
+# ----------------------------------------------------
+# Serializer tests
+# ----------------------------------------------------
+class SerializerTest(unittest.TestCase):
+
+    def setUp(self):
+        g_generator.initialize_text_source({'textsource': 'random', 'slabsize': 1, 'slabreuse': 4})
+        g_generator.initialize_reference_data({'products': 2000, 'customers': 0, 'customerskew': 0.0, 'seed': None})
+
+    def tearDown(self):
+        g_generator.initialize_reference_data({'products': 2000, 'customers': 0, 'customerskew': 0.0, 'seed': None})
+
+    def check_values(self, p_engine, p_minlines, p_maxlines):
+
+        # template text, streamed chunks and json.dumps() of the dictionary must be the same text
+        for v_seed in range(10):
+            random.seed(v_seed)
+            v_values = g_generator.get_invoice_values(g_date, p_minlines, p_maxlines, p_engine)
+            v_expected = json.dumps(g_generator.get_invoice_from_values(v_values))
+            self.assertEqual(g_generator.get_invoice_json_from_values(v_values), v_expected, 'seed {}'.format(v_seed))
+            self.assertEqual(''.join(g_generator.get_invoice_json_chunks(v_values, 7)), v_expected, 'seed {}'.format(v_seed))
+
+    def test_python(self):
+        self.check_values('python', 0, 50)
+
+    def test_python_empty_lines(self):
+        self.check_values('python', 0, 0)
+
+    def test_python_customers(self):
+        g_generator.initialize_reference_data({'products': 50, 'customers': 20, 'customerskew': 1.0, 'seed': 'test'})
+        self.check_values('python', 0, 50)
+
+    @unittest.skipIf(importlib.util.find_spec('numpy') == None, 'numpy is not installed')
+    def test_numpy(self):
+        self.check_values('numpy', 0, 50)
+
+    @unittest.skipIf(importlib.util.find_spec('numpy') == None, 'numpy is not installed')
+    def test_numpy_empty_lines(self):
+        self.check_values('numpy', 0, 0)
+
+    @unittest.skipIf(importlib.util.find_spec('numpy') == None, 'numpy is not installed')
+    def test_numpy_customers(self):
+        g_generator.initialize_reference_data({'products': 50, 'customers': 20, 'customerskew': 1.0, 'seed': 'test'})
+        self.check_values('numpy', 0, 50)
+
+
+# ----------------------------------------------------
+# Schema tests
+# ----------------------------------------------------
+class SchemaTest(unittest.TestCase):
+
+    def setUp(self):
+        # document_id is drawn from the random state only in seeded run
+        g_generator.initialize_text_source({'textsource': 'random', 'slabsize': 1, 'slabreuse': 4})
+        g_generator.initialize_reference_data({'products': 2000, 'customers': 0, 'customerskew': 0.0, 'seed': None})
+        g_generator.initialize_seed({'seed': 'test'})
+        self.schema = g_generator.get_compiled_schema(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'schemas', 'invoice.json'))
+
+    def tearDown(self):
+        g_generator.initialize_seed({'seed': None})
+
+    def check_schema(self, p_minlines, p_maxlines):
+
+        # schema document must be the same text as template and json.dumps() documents
+        for v_seed in range(10):
+            random.seed(v_seed)
+            v_values = g_generator.get_invoice_values(g_date, p_minlines, p_maxlines)
+            v_expected = json.dumps(g_generator.get_invoice_from_values(v_values))
+            random.seed(v_seed)
+            (v_schema_values, v_line_count) = self.schema['generate'](g_date, {'minlines': p_minlines, 'maxlines': p_maxlines})
+            self.assertEqual(self.schema['serialize'](v_schema_values), v_expected, 'seed {}'.format(v_seed))
+            self.assertEqual(v_line_count, v_values['line_count'], 'seed {}'.format(v_seed))
+
+    def test_schema(self):
+        self.check_schema(0, 50)
+
+    def test_schema_empty_lines(self):
+        self.check_schema(0, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()